@@ -0,0 +1,127 @@
+"""
+Benchmark: bloque 'hourly' hora a hora (el recorrido que hacía build_document) frente al camino
+columnar (hourly_to_frame). La columna "doc" mide el camino columnar hasta los objetos por hora
+que guarda build_document (hourly_records), frente al recorrido original.
+
+Ejecución:
+    python -m benchmarks.bench_hourly_transform
+"""
+
+import random
+import time
+from datetime import datetime, timedelta
+
+import polars as pl
+
+from scripts_1_7_weather_apis.hourly_transform import (
+    get_weather_translation,
+    hourly_records,
+    hourly_to_frame,
+)
+
+WMO_SAMPLE = [0, 1, 2, 3, 45, 48, 51, 61, 63, 65, 71, 73, 75, 80, 81, 95, 99]
+
+
+def make_raw_response(hours, seed=42):
+    """Respuesta cruda de Open-Meteo (bloques current y hourly) con 'hours' horas aleatorias."""
+    rng = random.Random(seed)
+    start = datetime(2026, 3, 16)
+    return {
+        "current": {
+            "temperature_2m": 16.1,
+            "weather_code": 3,
+            "wind_speed_10m": 8.2,
+            "wind_direction_10m": 151,
+            "precipitation": 0.0,
+            "cloud_cover": 100,
+        },
+        "hourly": {
+            "time": [
+                (start + timedelta(hours=i)).strftime("%Y-%m-%dT%H:%M")
+                for i in range(hours)
+            ],
+            "temperature_2m": [round(rng.uniform(-5, 40), 1) for _ in range(hours)],
+            "relative_humidity_2m": [rng.randint(5, 100) for _ in range(hours)],
+            "apparent_temperature": [round(rng.uniform(-8, 44), 1) for _ in range(hours)],
+            "precipitation": [rng.choice([0.0, 0.0, 0.0, 0.2, 1.5]) for _ in range(hours)],
+            "precipitation_probability": [rng.randint(0, 100) for _ in range(hours)],
+            "weather_code": [rng.choice(WMO_SAMPLE) for _ in range(hours)],
+        },
+    }
+
+
+def hourly_dicts(hourly_raw):
+    """Recorrido original de build_document: un diccionario por hora (solo como referencia)."""
+    hourly_list = []
+    for i in range(len(hourly_raw["time"])):
+        w_code = hourly_raw["weather_code"][i]
+        p_total = float(hourly_raw["precipitation"][i])
+        h_slug, h_summary = get_weather_translation(w_code)
+
+        # Lógica de tipo de precipitación para la franja horaria
+        p_type = "none"
+        if p_total > 0:
+            p_type = "snow" if 71 <= w_code <= 77 else "rain"
+
+        hourly_list.append(
+            {
+                "date": str(hourly_raw["time"][i]),
+                "weather": h_slug,
+                "temperature": float(hourly_raw["temperature_2m"][i]),
+                "humidity": int(hourly_raw["relative_humidity_2m"][i]),
+                "apparent_temp": float(hourly_raw["apparent_temperature"][i]),
+                "precipitation": {"total": p_total, "type": p_type},
+                "precip_prob": int(hourly_raw["precipitation_probability"][i]),
+                "summary": h_summary,
+            }
+        )
+    return hourly_list
+
+
+def dict_path(data):
+    """Camino original: lista de diccionarios por hora y después DataFrame."""
+    return pl.DataFrame(hourly_dicts(data["hourly"]))
+
+
+def columnar_path(data):
+    """Camino columnar: de las listas de la API directamente a un DataFrame."""
+    return hourly_to_frame(data["hourly"])
+
+
+def best_time(func, data, repeat=5):
+    """Mejor tiempo (en segundos) de 'repeat' ejecuciones."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(data)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def run(sizes=(168, 24 * 30, 24 * 365, 24 * 365 * 5)):
+    print(
+        f"{'horas':>10} {'dict (ms)':>12} {'columnar (ms)':>14} {'speedup':>9}"
+        f" {'doc (ms)':>10} {'speedup':>9}"
+    )
+    for hours in sizes:
+        data = make_raw_response(hours)
+
+        # Comprobamos que ambos caminos dan exactamente los mismos valores (también los
+        # objetos por hora que guarda build_document)
+        assert dict_path(data).equals(columnar_path(data)), "Los resultados difieren"
+        assert hourly_dicts(data["hourly"]) == hourly_records(data["hourly"]), (
+            "Los documentos difieren"
+        )
+
+        t_dict = best_time(dict_path, data)
+        t_col = best_time(columnar_path, data)
+        t_ref = best_time(lambda raw: hourly_dicts(raw["hourly"]), data)
+        t_doc = best_time(lambda raw: hourly_records(raw["hourly"]), data)
+        print(
+            f"{hours:>10} {t_dict * 1000:>12.2f} {t_col * 1000:>14.2f} {t_dict / t_col:>8.1f}x"
+            f" {t_doc * 1000:>10.2f} {t_ref / t_doc:>8.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    run()
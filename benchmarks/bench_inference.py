@@ -0,0 +1,62 @@
+"""
+Benchmark: filas por segundo del clasificador del clima (WeatherClassifier.predict) según el
+tamaño de lote y el número de hilos del RandomForest, sobre filas horarias sintéticas.
+
+Ejecución:
+    python -m benchmarks.bench_inference
+"""
+
+import tempfile
+import time
+
+from benchmarks.bench_pipeline import make_history
+from scripts_3_1.data_processor import get_hourly_weather_dataframe
+from scripts_3_3.inference import WeatherClassifier
+from scripts_3_3.feature_store import compute_features
+from scripts_3_3.training import ModelRegistry, train_classifier
+
+
+def make_hourly(n_fetches):
+    """Filas horarias (como la tabla 'Tiempo_por_horas') de 'n_fetches' capturas sintéticas."""
+    df = get_hourly_weather_dataframe(make_history(n_fetches), export=False)
+    return compute_features(df)
+
+
+def best_time(func, repeat=3):
+    """Mejor tiempo (en segundos) de 'repeat' ejecuciones."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def run(n_fetches=300, batch_sizes=(100, 1_000, 10_000, 50_000), n_jobs=(1, -1)):
+    # Entrenamos un clasificador con una parte de los datos en un registro temporal
+    train = make_hourly(50)
+    with tempfile.TemporaryDirectory() as root:
+        result = train_classifier(train, ModelRegistry(root))
+
+    df = make_hourly(n_fetches).drop("weather_clean")
+    print(f"{df.height} filas, {result['model'].n_estimators} árboles")
+    print(f"{'lote':>8} {'n_jobs':>7} {'tiempo (ms)':>12} {'filas/s':>12}")
+    for jobs in n_jobs:
+        classifier = WeatherClassifier(
+            result["scaler"], result["encoder"], result["model"], n_jobs=jobs
+        )
+        for batch_size in batch_sizes:
+            seconds = best_time(lambda: classifier.predict(df, batch_size))
+            print(
+                f"{batch_size:>8} {jobs:>7} {seconds * 1000:>12.1f} {df.height / seconds:>12,.0f}"
+            )
+
+    # Streaming: lotes de Arrow como los de iter_history_batches
+    classifier = WeatherClassifier(result["scaler"], result["encoder"], result["model"])
+    batches = df.to_arrow().to_batches(max_chunksize=5_000)
+    seconds = best_time(lambda: sum(b.height for b in classifier.predict_stream(batches)))
+    print(f"streaming (lotes Arrow de 5000): {df.height / seconds:,.0f} filas/s")
+
+
+if __name__ == "__main__":
+    run()
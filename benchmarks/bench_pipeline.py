@@ -0,0 +1,91 @@
+"""
+Benchmark: las tres funciones de data_processor por separado frente a run_pipeline
+(un solo grafo lazy con collect_all) sobre un histórico sintético de capturas.
+
+Ejecución:
+    python -m benchmarks.bench_pipeline
+"""
+
+import json
+import time
+from datetime import datetime, timedelta
+
+import polars as pl
+from polars.testing import assert_frame_equal
+
+from benchmarks.bench_hourly_transform import make_raw_response
+from scripts_1_7_weather_apis.extract_openmeteo import build_document
+from scripts_3_1.data_processor import (
+    get_current_weather_dataframe,
+    get_hourly_weather_dataframe,
+    get_stats_dataframe,
+    run_pipeline,
+)
+from scripts_3_1.db_connector import get_weather_schema
+
+
+def make_history(n_fetches, hours=168):
+    """
+    DataFrame de capturas con la misma forma que devuelve get_polars_df_from_last_fetch
+    (o scan_history), con 'n_fetches' capturas de 'hours' horas cada una.
+    """
+    start = datetime(2026, 1, 1)
+    rows = []
+    for i in range(n_fetches):
+        timestamp = (start + timedelta(hours=i)).strftime("%Y-%m-%d %H:%M:%S")
+        data = make_raw_response(hours, seed=i)
+        document = build_document(data, "37.3886", "-5.9823", timestamp)
+        rows.append({"id": i + 1, "timestamp": timestamp, "payload": json.dumps(document)})
+
+    return (
+        pl.DataFrame(rows)
+        .with_columns(pl.col("payload").str.json_decode(dtype=get_weather_schema()))
+        .unnest("payload")
+    )
+
+
+def separate(df):
+    """Camino actual: tres funciones, cada una con su propio desanidado y parseo de fechas."""
+    return (
+        get_hourly_weather_dataframe(df, export=False),
+        get_current_weather_dataframe(df, export=False),
+        get_stats_dataframe(df, export=False),
+    )
+
+
+def pipeline(df):
+    """Camino nuevo: un único grafo lazy con la parte común compartida."""
+    return run_pipeline(df, export=False)
+
+
+def best_time(func, df, repeat=3):
+    """Mejor tiempo (en segundos) de 'repeat' ejecuciones."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(df)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def run(sizes=(10, 100, 500, 2000)):
+    print(
+        f"{'capturas':>9} {'filas':>10} {'separado (ms)':>14} {'pipeline (ms)':>14} {'speedup':>9}"
+    )
+    for n_fetches in sizes:
+        df = make_history(n_fetches)
+
+        # Comprobamos que ambos caminos dan los mismos resultados (las sumas en coma flotante
+        # de un group_by en paralelo pueden variar en el último decimal de una ejecución a otra)
+        for a, b in zip(separate(df), pipeline(df)):
+            assert_frame_equal(a, b)
+
+        t_sep = best_time(separate, df)
+        t_pipe = best_time(pipeline, df)
+        print(
+            f"{n_fetches:>9} {n_fetches * 168:>10} {t_sep * 1000:>14.1f} {t_pipe * 1000:>14.1f} {t_sep / t_pipe:>8.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,104 @@
+"""
+Benchmark: tiempo de arranque de cada subcomando de main.py (fetch, process, plot, train).
+
+Para cada subcomando se lanza un intérprete nuevo con 'python -X importtime' que importa
+main.py y los módulos que necesitan sus etapas (STAGE_SPECS["modules"]), y se suma el tiempo
+de carga de todos los módulos. Si algún subcomando supera su presupuesto (IMPORT_BUDGET_MS)
+el script termina con código 1, así que se puede usar como comprobación antes de un commit.
+
+Ejecución:
+    python -m benchmarks.bench_startup [--top 5]
+"""
+
+import argparse
+import subprocess
+import sys
+import time
+
+from main import COMMANDS
+from scripts_1_7_weather_apis.db_connection import BASE_DIR
+from scripts_3_1.pipeline_stages import STAGE_SPECS
+
+# Módulos que carga "main.py train" además de main.py
+TRAIN_MODULES = ["main_3_3", "scripts_3_3.training", "scripts_3_3.clustering"]
+
+# Presupuesto (ms) de carga de módulos de cada subcomando; "help" es solo "import main"
+IMPORT_BUDGET_MS = {
+    "help": 150,
+    "fetch": 300,
+    "process": 700,
+    "plot": 600,
+    "train": 4000,
+}
+
+
+def command_modules(command):
+    """Módulos que importa el subcomando ('help': solo main)."""
+    if command == "help":
+        return ["main"]
+    if command == "train":
+        return ["main", *TRAIN_MODULES]
+    return ["main", *(m for stage in COMMANDS[command] for m in STAGE_SPECS[stage]["modules"])]
+
+
+def parse_importtime(stderr):
+    """
+    Lista de (ms acumulados, módulo) de la salida de -X importtime, solo de los módulos
+    importados directamente (sin sangría), cuya suma es el tiempo total de carga.
+    """
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not name.startswith("  "):
+            modules.append((int(cumulative) / 1000, name.strip()))
+    return modules
+
+
+def measure(command):
+    """(segundos de reloj del proceso, ms de carga de módulos, módulos de primer nivel)."""
+    code = "; ".join(f"import {m}" for m in command_modules(command))
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=BASE_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    wall = time.perf_counter() - start
+    modules = parse_importtime(result.stderr)
+    return wall, sum(ms for ms, _ in modules), modules
+
+
+def run(top=5, repeat=3):
+    failed = []
+    print(f"{'subcomando':>10} {'proceso (ms)':>13} {'imports (ms)':>13} {'límite (ms)':>12}")
+    for command, budget in IMPORT_BUDGET_MS.items():
+        # Mejor de 'repeat' ejecuciones (la primera puede incluir compilar los .pyc)
+        wall, import_ms, modules = min((measure(command) for _ in range(repeat)), key=lambda r: r[1])
+        over = import_ms > budget
+        print(
+            f"{command:>10} {wall * 1000:>13.0f} {import_ms:>13.0f} {budget:>12}"
+            + ("  ❌ supera el límite" if over else "")
+        )
+        for ms, name in sorted(modules, reverse=True)[:top]:
+            print(f"{'':>12}{ms:>8.0f} ms  {name}")
+        if over:
+            failed.append(command)
+
+    if failed:
+        print(f"\n❌ [ERROR] Subcomandos por encima de su presupuesto: {', '.join(failed)}")
+    return not failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tiempo de arranque de los subcomandos de main.py")
+    parser.add_argument("--top", type=int, default=5, help="módulos más lentos que se muestran")
+    args = parser.parse_args(argv)
+    sys.exit(0 if run(args.top) else 1)
+
+
+if __name__ == "__main__":
+    main()
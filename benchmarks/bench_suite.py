@@ -0,0 +1,397 @@
+"""
+Benchmark de todo el proceso sobre históricos sintéticos (synthetic.py) de distintos tamaños.
+
+Para cada escala (localizaciones x días x capturas al día) se mide cada etapa por separado:
+- ingest / ingest_many: guardar los documentos en SQLite con insert_data (uno a uno, como
+  save_documents) o con insert_many (una sola transacción).
+- decode_last / decode_history: get_polars_df_from_last_fetch y scan_history().collect().
+- hourly / current / stats / pipeline: funciones de data_processor sobre todo el histórico.
+- dashboard: plot_combined_dashboard con las tablas calculadas.
+- train_classifier / train_clusters: entrenamiento de los modelos de main_3_3.py.
+
+De cada etapa se guarda el tiempo, las filas procesadas, el rendimiento (filas/s), los bytes
+(base de datos, dataframe o HTML) y el pico de memoria (RSS) durante la etapa. Con varias
+escalas se calcula además la curva de escalado: el exponente b de tiempo ~ filas^b (1 es
+lineal). Todo se guarda en un JSON para poder comparar ejecuciones (--compare).
+
+La base de datos, el dashboard y los modelos se escriben en una carpeta temporal.
+
+Ejecución:
+    python -m benchmarks.bench_suite [--scales 1x30x2 8x30x2 8x90x2] [--stages ...] [--repeat 3]
+        [--output fichero.json] [--compare otro.json]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import polars as pl
+import sklearn
+
+from benchmarks.synthetic import make_documents
+from scripts_1_7_weather_apis import db_connection
+from scripts_1_7_weather_apis.db_connection import BASE_DIR, insert_data, insert_many
+from scripts_1_7_weather_apis.extract_openmeteo import COLLECTION_NAME
+from scripts_3_1 import db_connector, visualizer
+from scripts_3_1.data_processor import (
+    get_current_weather_dataframe,
+    get_hourly_weather_dataframe,
+    get_stats_dataframe,
+    run_pipeline,
+)
+from scripts_3_1.db_connector import get_polars_df_from_last_fetch, scan_history
+from scripts_3_3.clustering import train_online_clusters
+from scripts_3_3.feature_store import compute_features
+from scripts_3_3.training import ModelRegistry, train_classifier
+
+RESULTS_DIR = os.path.join(BASE_DIR, "data_output", "benchmarks")
+DEFAULT_SCALES = ["1x30x2", "8x30x2", "8x90x2"]
+REPEAT = 3
+REPEAT_LIMIT = 2  # Segundos a partir de los cuales una etapa no se repite
+STAGES = [
+    "ingest",
+    "ingest_many",
+    "decode_last",
+    "decode_history",
+    "hourly",
+    "current",
+    "stats",
+    "pipeline",
+    "dashboard",
+    "train_classifier",
+    "train_clusters",
+]
+
+
+def parse_scale(text):
+    """'8x90x2' -> {"locations": 8, "days": 90, "fetches_per_day": 2}."""
+    try:
+        locations, days, fetches_per_day = (int(value) for value in text.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"Escala no válida: '{text}' (formato: localizacionesxdíasxcapturas, p. ej. 8x90x2)"
+        )
+    return {"locations": locations, "days": days, "fetches_per_day": fetches_per_day}
+
+
+def _rss_mb(field):
+    """Campo de memoria de /proc/self/status (VmRSS, VmHWM) en MB, o None si no existe."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def _reset_peak_rss():
+    """
+    Reinicia el pico de memoria del proceso (Linux: escribir 5 en /proc/self/clear_refs).
+    Devuelve False si no se puede; entonces el pico es el de todo el proceso (getrusage).
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_mb():
+    peak = _rss_mb("VmHWM")
+    if peak is not None:
+        return peak
+    # ru_maxrss va en KiB en Linux y en bytes en macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def measure(func):
+    """Ejecuta 'func' sin su salida por pantalla. Devuelve (resultado, segundos, pico RSS MB)."""
+    _reset_peak_rss()
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        result = func()
+        seconds = time.perf_counter() - start
+    return result, seconds, _peak_rss_mb()
+
+
+class SuiteRun:
+    """Etapas de una escala: cada una usa lo que han calculado las anteriores."""
+
+    def __init__(self, documents, workdir, repeat=REPEAT):
+        self.documents = documents
+        self.repeat = repeat
+        self.n_hours = sum(len(document["hourly"]["data"]) for document in documents)
+        self.workdir = workdir
+        self.db_path = os.path.join(workdir, "bench.db")
+        self.history = None
+        self.df_hourly = None
+        self.df_stats = None
+
+    def _use_db(self, fresh):
+        """Apunta get_connection a la base de datos temporal (vacía si 'fresh')."""
+        db_connection.close_connections()
+        if fresh:
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(self.db_path + suffix):
+                    os.remove(self.db_path + suffix)
+        # db_connector importa DB_PATH por nombre (lo usa scan_history en su propia conexión)
+        db_connection.DB_PATH = db_connector.DB_PATH = self.db_path
+
+    def _ensure_db(self):
+        if not os.path.exists(self.db_path):
+            self._use_db(fresh=True)
+            insert_many(COLLECTION_NAME, self.documents)
+
+    def _ensure_history(self):
+        if self.history is None:
+            self._ensure_db()
+            self.history = scan_history(COLLECTION_NAME).collect()
+
+    def _ensure_tables(self):
+        if self.df_hourly is None:
+            self._ensure_history()
+            self.df_hourly, _, self.df_stats = run_pipeline(self.history, export=False)
+
+    # Cada etapa devuelve (filas de entrada, filas de salida, bytes): el rendimiento y el
+    # escalado se calculan con las de entrada (documentos u horas de pronóstico)
+
+    def ingest(self):
+        self._use_db(fresh=True)
+        for document in self.documents:
+            insert_data(COLLECTION_NAME, document)
+        return len(self.documents), len(self.documents), os.path.getsize(self.db_path)
+
+    def ingest_many(self):
+        self._use_db(fresh=True)
+        insert_many(COLLECTION_NAME, self.documents)
+        return len(self.documents), len(self.documents), os.path.getsize(self.db_path)
+
+    def decode_last(self):
+        df = get_polars_df_from_last_fetch(COLLECTION_NAME)
+        return 1, df.height, df.estimated_size()
+
+    def decode_history(self):
+        self.history = scan_history(COLLECTION_NAME).collect()
+        return len(self.documents), self.history.height, self.history.estimated_size()
+
+    def hourly(self):
+        df = get_hourly_weather_dataframe(self.history, export=False)
+        return self.n_hours, df.height, df.estimated_size()
+
+    def current(self):
+        df = get_current_weather_dataframe(self.history, export=False)
+        return len(self.documents), df.height, df.estimated_size()
+
+    def stats(self):
+        df = get_stats_dataframe(self.history, export=False)
+        return self.n_hours, df.height, df.estimated_size()
+
+    def pipeline(self):
+        self.df_hourly, current, self.df_stats = run_pipeline(self.history, export=False)
+        return (
+            self.n_hours,
+            self.df_hourly.height,
+            sum(df.estimated_size() for df in (self.df_hourly, current, self.df_stats)),
+        )
+
+    def dashboard(self):
+        visualizer.OUTPUT_PLOTS_DIR = os.path.join(self.workdir, "docs")
+        visualizer.plot_combined_dashboard(df_hourly=self.df_hourly, df_stats=self.df_stats)
+        html = os.path.join(visualizer.OUTPUT_PLOTS_DIR, "index.html")
+        return self.df_hourly.height, None, os.path.getsize(html)
+
+    def train_classifier(self):
+        df = compute_features(self.df_hourly)
+        train_classifier(df, ModelRegistry(os.path.join(self.workdir, "models")), force=True)
+        return df.height, None, None
+
+    def train_clusters(self):
+        train_online_clusters(
+            self.df_hourly.lazy(), ModelRegistry(os.path.join(self.workdir, "models")), force=True
+        )
+        return self.df_hourly.height, None, None
+
+    def prepare(self, stage):
+        """Prepara fuera de la medición lo que necesita 'stage' si no se ha ejecutado antes."""
+        if stage in ("decode_last", "decode_history"):
+            self._ensure_db()
+        elif stage in ("hourly", "current", "stats", "pipeline"):
+            self._ensure_history()
+        elif stage in ("dashboard", "train_classifier", "train_clusters"):
+            self._ensure_tables()
+
+    def run(self, stage):
+        self.prepare(stage)
+        # Mejor tiempo de 'repeat' ejecuciones (la primera incluye cargar módulos y cachés);
+        # las etapas lentas se miden una sola vez
+        (rows, output_rows, n_bytes), seconds, peak_rss = measure(getattr(self, stage))
+        for _ in range(self.repeat - 1):
+            if seconds > REPEAT_LIMIT:
+                break
+            _, again, peak_again = measure(getattr(self, stage))
+            seconds, peak_rss = min(seconds, again), max(peak_rss, peak_again)
+        return {
+            "stage": stage,
+            "seconds": round(seconds, 4),
+            "rows": rows,
+            "output_rows": output_rows,
+            "rows_per_s": round(rows / seconds, 1) if seconds else None,
+            "bytes": n_bytes,
+            "peak_rss_mb": round(peak_rss, 1),
+        }
+
+
+def scaling_exponents(results):
+    """
+    Exponente b de tiempo ~ filas^b de cada etapa (ajuste por mínimos cuadrados en escala
+    logarítmica), con al menos dos escalas de tamaños distintos.
+    """
+    exponents = {}
+    for stage in STAGES:
+        points = [
+            (math.log(r["rows"]), math.log(r["seconds"]))
+            for r in results
+            if r["stage"] == stage and r["rows"] and r["seconds"] > 0
+        ]
+        if len({x for x, _ in points}) < 2:
+            continue
+        mean_x = sum(x for x, _ in points) / len(points)
+        mean_y = sum(y for _, y in points) / len(points)
+        exponents[stage] = round(
+            sum((x - mean_x) * (y - mean_y) for x, y in points)
+            / sum((x - mean_x) ** 2 for x, _ in points),
+            2,
+        )
+    return exponents
+
+
+def environment():
+    """Datos de la máquina y versiones, para saber qué se está comparando."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BASE_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "polars": pl.__version__,
+        "sklearn": sklearn.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def compare(results, baseline_path):
+    """Imprime la relación de tiempos con otra ejecución (>1: ahora es más lento)."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    previous = {(r["scale"], r["stage"]): r for r in baseline["results"]}
+    print(f"\nComparación con {baseline_path} ({baseline['environment'].get('commit')}):")
+    print(f"{'escala':>10} {'etapa':>17} {'antes (ms)':>11} {'ahora (ms)':>11} {'ratio':>7}")
+    for r in results:
+        old = previous.get((r["scale"], r["stage"]))
+        if old is None or not old["seconds"]:
+            continue
+        print(
+            f"{r['scale']:>10} {r['stage']:>17} {old['seconds'] * 1000:>11.1f}"
+            f" {r['seconds'] * 1000:>11.1f} {r['seconds'] / old['seconds']:>6.2f}x"
+        )
+
+
+def run(scales=DEFAULT_SCALES, stages=STAGES, output=None, baseline=None, repeat=REPEAT):
+    results = []
+    default_db, default_plots = db_connection.DB_PATH, visualizer.OUTPUT_PLOTS_DIR
+    print(
+        f"{'escala':>10} {'etapa':>17} {'tiempo (ms)':>12} {'filas':>9} {'filas/s':>12}"
+        f" {'MB':>8} {'pico RSS (MB)':>14}"
+    )
+    for scale in scales:
+        params = parse_scale(scale)
+        documents = make_documents(
+            params["locations"], params["days"], params["fetches_per_day"]
+        )
+        with tempfile.TemporaryDirectory() as workdir:
+            suite = SuiteRun(documents, workdir, repeat)
+            for stage in (s for s in STAGES if s in stages):
+                result = {"scale": scale, **params, "documents": len(documents), **suite.run(stage)}
+                results.append(result)
+                size = f"{result['bytes'] / 1e6:.1f}" if result["bytes"] is not None else "-"
+                print(
+                    f"{scale:>10} {stage:>17} {result['seconds'] * 1000:>12.1f} {result['rows']:>9}"
+                    f" {result['rows_per_s'] or 0:>12,.0f} {size:>8} {result['peak_rss_mb']:>14.1f}"
+                )
+            db_connection.close_connections()
+        db_connection.DB_PATH = db_connector.DB_PATH = default_db
+        visualizer.OUTPUT_PLOTS_DIR = default_plots
+
+    exponents = scaling_exponents(results)
+    if exponents:
+        print("\nEscalado (tiempo ~ filas^b):")
+        for stage, exponent in exponents.items():
+            print(f"{stage:>17}  b = {exponent}")
+
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(
+            RESULTS_DIR, f"bench_suite_{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+        )
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(
+            {"environment": environment(), "results": results, "scaling": exponents},
+            f,
+            indent=2,
+            ensure_ascii=False,
+        )
+    print(f"\nResultados guardados en: {output}")
+
+    if baseline:
+        compare(results, baseline)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de todas las etapas a varias escalas")
+    parser.add_argument(
+        "--scales",
+        nargs="+",
+        default=DEFAULT_SCALES,
+        help="localizacionesxdíasxcapturas_al_día de cada escala (por defecto: %(default)s)",
+    )
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--output", help=f"fichero JSON de resultados (por defecto, en {RESULTS_DIR})")
+    parser.add_argument("--compare", help="JSON de una ejecución anterior con la que comparar")
+    parser.add_argument(
+        "--repeat", type=int, default=REPEAT, help="ejecuciones de cada etapa (se guarda la mejor)"
+    )
+    args = parser.parse_args(argv)
+    for scale in args.scales:
+        try:
+            parse_scale(scale)
+        except argparse.ArgumentTypeError as e:
+            parser.error(str(e))
+    run(args.scales, args.stages, args.output, args.compare, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Generador de históricos sintéticos de Open-Meteo para los benchmarks.
+
+Los datos de ejemplo del repositorio son una sola captura de 168 horas; para medir el código
+con históricos grandes se generan capturas con la misma forma que devuelve get_open_meteo
+({nombre: documento}, documentos de build_document) para N localizaciones, M días y F capturas
+al día. Cada captura trae el pronóstico de FORECAST_DAYS días desde las 00:00 del día de la
+captura, como la API, así que las capturas se solapan y el mismo día aparece en varias.
+
+Los valores siguen un ciclo diario y estacional con ruido (igual para todas las capturas de
+una misma hora, más un pequeño error de pronóstico por captura): la humedad baja cuando sube
+la temperatura, la lluvia llega en episodios de varias horas y el código WMO es coherente con
+la precipitación, la nubosidad y la temperatura.
+"""
+
+import math
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from scripts_1_7_weather_apis.extract_openmeteo import build_document
+from scripts_1_7_weather_apis.locations import LOCATIONS
+
+FORECAST_DAYS = 7
+START = datetime(2025, 1, 1)
+
+
+def synthetic_locations(n_locations):
+    """
+    Lista de (nombre, lat, lon): las del registro y, si se piden más, localizaciones
+    inventadas cerca de ellas ("Sevilla_2", ...).
+    """
+    registered = list(LOCATIONS.items())
+    locations = []
+    for i in range(n_locations):
+        name, (lat, lon) = registered[i % len(registered)]
+        copy = i // len(registered)
+        if copy:
+            name = f"{name}_{copy + 1}"
+            lat = f"{float(lat) + 0.05 * copy:.4f}"
+            lon = f"{float(lon) + 0.05 * copy:.4f}"
+        locations.append((name, lat, lon))
+    return locations
+
+
+def _climate(n_hours, seed):
+    """Series horarias 'reales' (sin error de pronóstico) de una localización."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(n_hours)
+    day_of_year = (START.timetuple().tm_yday + t / 24) % 365
+    hour = t % 24
+
+    season = -8 * np.cos(2 * math.pi * (day_of_year - 15) / 365)
+    daily = -6 * np.cos(2 * math.pi * (hour - 3) / 24)
+    # Anomalía lenta (varios días) + ruido horario
+    anomaly = np.convolve(rng.normal(0, 1.5, n_hours + 96), np.ones(96) / 12, "valid")[:n_hours]
+    temperature = 18 + season + daily + anomaly + rng.normal(0, 0.6, n_hours)
+
+    # Episodios de lluvia: empiezan al azar y duran unas horas
+    raining = np.zeros(n_hours, dtype=bool)
+    for start in np.flatnonzero(rng.random(n_hours) < 0.012):
+        raining[start : start + rng.integers(2, 12)] = True
+    precipitation = np.where(raining, rng.gamma(1.2, 1.1, n_hours), 0.0)
+
+    humidity = 65 - 1.8 * (temperature - 18) + 25 * raining + rng.normal(0, 6, n_hours)
+    cloud = np.clip(rng.beta(0.9, 1.1, n_hours) + 0.5 * raining, 0, 1)
+    return temperature, humidity, precipitation, cloud
+
+
+def _weather_codes(temperature, humidity, precipitation, cloud):
+    """Código WMO coherente con el resto de variables."""
+    codes = np.select(
+        [cloud < 0.2, cloud < 0.45, cloud < 0.7],
+        [0, 1, 2],
+        default=3,
+    )
+    codes = np.where((humidity > 97) & (precipitation == 0), 45, codes)
+    rain = np.select(
+        [precipitation < 0.5, precipitation < 2.5],
+        [61, 63],
+        default=65,
+    )
+    rain = np.where(precipitation > 4, 81, rain)
+    rain = np.where(temperature < 1, 71, rain)
+    return np.where(precipitation > 0, rain, codes)
+
+
+def _forecast(climate, first_hour, rng, hours):
+    """Respuesta cruda de la API (bloques current y hourly) desde la hora 'first_hour'."""
+    temperature, humidity, precipitation, cloud = (
+        values[first_hour : first_hour + hours] for values in climate
+    )
+    # Error de pronóstico: crece con la distancia a la captura
+    spread = np.linspace(0.2, 1.5, hours)
+    temperature = temperature + rng.normal(0, 1, hours) * spread
+    humidity = np.clip(humidity + rng.normal(0, 3, hours) * spread, 5, 100)
+    precipitation = np.round(
+        np.where(precipitation > 0, np.maximum(precipitation + rng.normal(0, 0.3, hours), 0.1), 0), 1
+    )
+    apparent = temperature - 0.05 * (100 - humidity) + rng.normal(0, 0.5, hours)
+    precip_prob = np.clip(
+        np.where(precipitation > 0, 70, 100 * cloud * 0.4) + rng.normal(0, 10, hours), 0, 100
+    )
+    codes = _weather_codes(temperature, humidity, precipitation, cloud)
+    times = [
+        (START + timedelta(hours=int(first_hour + i))).strftime("%Y-%m-%dT%H:%M")
+        for i in range(hours)
+    ]
+    return {
+        "current": {
+            "temperature_2m": round(float(temperature[0]), 1),
+            "weather_code": int(codes[0]),
+            "wind_speed_10m": round(float(rng.gamma(2, 4)), 1),
+            "wind_direction_10m": int(rng.integers(0, 360)),
+            "precipitation": float(precipitation[0]),
+            "cloud_cover": int(round(cloud[0] * 100)),
+        },
+        "hourly": {
+            "time": times,
+            "temperature_2m": np.round(temperature, 1).tolist(),
+            "relative_humidity_2m": np.round(humidity).astype(int).tolist(),
+            "apparent_temperature": np.round(apparent, 1).tolist(),
+            "precipitation": precipitation.tolist(),
+            "precipitation_probability": np.round(precip_prob).astype(int).tolist(),
+            "weather_code": codes.tolist(),
+        },
+    }
+
+
+def iter_fetches(n_locations, n_days, fetches_per_day=1, seed=42):
+    """
+    Capturas sintéticas en orden cronológico: para cada una devuelve lo mismo que
+    get_open_meteo, un diccionario {nombre: documento} con todas las localizaciones.
+    """
+    locations = synthetic_locations(n_locations)
+    hours = FORECAST_DAYS * 24
+    n_hours = (n_days + FORECAST_DAYS) * 24
+    climates = [_climate(n_hours, seed + i) for i in range(n_locations)]
+    rng = np.random.default_rng(seed)
+    step = 24 / fetches_per_day
+
+    for day in range(n_days):
+        for k in range(fetches_per_day):
+            captured = START + timedelta(days=day, hours=k * step)
+            timestamp = captured.strftime("%Y-%m-%d %H:%M:%S")
+            yield {
+                name: build_document(
+                    _forecast(climate, day * 24, rng, hours), lat, lon, timestamp
+                )
+                for (name, lat, lon), climate in zip(locations, climates)
+            }
+
+
+def make_documents(n_locations, n_days, fetches_per_day=1, seed=42):
+    """Lista de documentos (los de todas las capturas seguidos, como se guardan en la BD)."""
+    return [
+        document
+        for documents in iter_fetches(n_locations, n_days, fetches_per_day, seed)
+        for document in documents.values()
+    ]
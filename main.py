@@ -1,20 +1,34 @@
-from scripts_1_7_weather_apis.extract_openmeteo import get_open_meteo
-from scripts_3_1.db_connector import get_polars_df_from_last_fetch
-from scripts_3_1.data_processor import (
-    get_hourly_weather_dataframe,
-    get_current_weather_dataframe,
-    get_stats_dataframe,
-)
-from scripts_3_1.visualizer import plot_combined_dashboard
+import argparse
+import os
+
+# Solo lo imprescindible al arrancar: cada etapa importa sus librerías (Polars, Plotly,
+# sklearn...) al ejecutarse, así que "python main.py fetch" (por ejemplo desde cron) no las carga.
+# El tiempo de carga de cada subcomando se comprueba con: python -m benchmarks.bench_startup
+from scripts_1_7_weather_apis import metrics
+from scripts_3_1.pipeline_stages import METRICS_DIR, STAGES, run_stages
 
 TABLES = [
     "openmeteo",
 ]
 
+# Formato de las tablas exportadas: "csv", "parquet" o "both" (ver scripts_3_1/parquet_store.py)
+EXPORT_FORMAT = "csv"
+
+# Título de cada etapa (ver scripts_3_1/pipeline_stages.py)
+STEP_TITLES = {
+    "fetch": "Paso 0: EXTRACCIÓN: Pedir nuevos datos a la API de OpenMeteo.",
+    "decode": "Paso 1: CONEXIÓN: Obtener un objeto de Polars con los datos de la tabla 'openmeteo' usando read_database.",
+    "silver": "Pasos 2 y 3: LIMPIEZA Y ESTRUCTURACIÓN CON POLARS: limpiar nulos e inconsistencias, añadir columnas calculadas y agrupaciones.",
+    "dashboard": "Paso 4: ANÁLISIS VISUAL CON PLOTLY.",
+}
 
-def get_new_data():
-    print("\n\n --- Pidiendo nuevos datos a la API de OpenMeteo --- \n\n")
-    get_open_meteo()
+# Subcomandos: etapas que ejecuta cada uno ("train" entrena los modelos de main_3_3.py)
+COMMANDS = {
+    "fetch": ["fetch"],
+    "process": ["decode", "silver"],
+    "plot": ["dashboard"],
+    "train": [],
+}
 
 
 def start_step(description):
@@ -30,52 +44,101 @@ def end_step():
     print("-" * 120)
 
 
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Análisis de datos climáticos por etapas: " + " → ".join(STAGES)
+    )
+    parser.add_argument(
+        "command",
+        nargs="?",
+        choices=list(COMMANDS),
+        help="fetch (pedir datos), process (decode y silver), plot (dashboard) o train "
+        "(modelos de main_3_3.py). Sin subcomando se ejecutan todas las etapas",
+    )
+    parser.add_argument(
+        "--from",
+        dest="start_from",
+        choices=STAGES,
+        help="Empezar en esta etapa (las anteriores no se ejecutan)",
+    )
+    parser.add_argument(
+        "--only", nargs="+", choices=STAGES, help="Ejecutar solo estas etapas"
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Ejecutar las etapas aunque sus entradas no hayan cambiado",
+    )
+    parser.add_argument(
+        "--metrics",
+        action="store_true",
+        help=f"Guardar los eventos (events.jsonl) y las métricas (metrics.prom) en {METRICS_DIR}",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Perfilar cada etapa con cProfile (ficheros .prof en la carpeta de métricas)",
+    )
+    args = parser.parse_args(argv)
+    if args.command and (args.start_from or args.only):
+        parser.error("--from y --only no se pueden combinar con un subcomando")
+    return args
 
-    print("INICIO DEL PROCESO DE ANÁLISIS DE DATOS CLIMÁTICOS\n")
 
-    get_new_data()
+def main(argv=None):
+    args = parse_args(argv)
 
-    start_step(
-        "Paso 1: CONEXIÓN: Obtener un objeto de Polars con los datos de la tabla 'openmeteo' usando read_database."
+    metrics.configure(
+        log_path=os.path.join(METRICS_DIR, "events.jsonl") if args.metrics else None,
+        profile_dir=os.path.join(METRICS_DIR, "profiles") if args.profile else None,
     )
+    try:
+        run(args)
+    finally:
+        if args.metrics:
+            metrics.write_snapshot(os.path.join(METRICS_DIR, "metrics.prom"))
+            print(f"\nMétricas guardadas en: {METRICS_DIR}")
 
-    df = get_polars_df_from_last_fetch("openmeteo")
-    if df is not None:
-        print(df)
 
-    end_step()
+def run(args):
+    if args.command == "train":
+        from main_3_3 import main as train
 
-    start_step(
-        "Pasos 2 y 3: LIMPIEZA Y ESTRUCTURACIÓN CON POLARS: limpiar nulos e inconsistencias, añadir columnas calculadas y agrupaciones."
-    )
+        with metrics.stage("train"):
+            train(force=args.force)
+        return
 
-    if df is not None:
+    print("INICIO DEL PROCESO DE ANÁLISIS DE DATOS CLIMÁTICOS\n")
 
-        df_hourly = get_hourly_weather_dataframe(df)
+    opened = []
+
+    def on_stage(name, description, skipped):
+        if opened:
+            end_step()
+        start_step(STEP_TITLES.get(name, description))
+        opened.append(name)
+
+    # Cada etapa se salta si su entrada no ha cambiado desde la última ejecución, y los
+    # dataframes pasan en memoria de una etapa a la siguiente (hasta el dashboard)
+    ctx = run_stages(
+        start_from=args.start_from,
+        only=COMMANDS[args.command] if args.command else args.only,
+        force=args.force,
+        export_format=EXPORT_FORMAT,
+        on_stage=on_stage,
+    )
+    if opened:
+        end_step()
 
+    if ctx.get("df_hourly") is not None and ctx.get("df_current") is not None:
         print("--- VISTA DEL PRONÓSTICO POR HORAS ---\n")
-        print(df_hourly.head(10))
-
-        df_current = get_current_weather_dataframe(df)
+        print(ctx["df_hourly"].head(10))
 
         print("\n--- VISTA DEL CLIMA ACTUAL ---\n")
-        print(df_current)
-
-        df_stats = get_stats_dataframe(df)
+        print(ctx["df_current"])
 
         print("\n--- VISTA DE ESTADÍSTICAS DIARIAS ---\n")
-        print(df_stats.head(10))
-
-    end_step()
-
-    start_step("Paso 4: ANÁLISIS VISUAL CON PLOTLY.")
-
-    print("Generando dashboard combinado con los tres gráficos...")
-
-    plot_combined_dashboard()
-
-    end_step()
+        print(ctx["df_stats"].head(10))
 
 
 if __name__ == "__main__":
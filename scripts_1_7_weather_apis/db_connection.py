@@ -1,55 +1,267 @@
+import atexit
 import os
 import sqlite3
 import json
+import threading
+from contextlib import contextmanager
+
+from . import metrics
+from .payload_codec import (
+    PAYLOAD_ENCODINGS,
+    decode_payload,
+    encode_payload,
+    register_payload_functions,
+)
 
 # La base de datos está un nivel por encima de este script, en la raíz del proyecto:
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DB_PATH = os.path.join(BASE_DIR, "data.db")
 
+# Ajustes de SQLite que se aplican a cada conexión nueva:
+# - WAL permite leer mientras se escribe y reduce los fsync por commit.
+# - synchronous=NORMAL es seguro con WAL y mucho más rápido que FULL.
+# - cache_size negativo va en KiB (64 MB); mmap_size en bytes (256 MB).
+PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -64000,
+    "mmap_size": 268435456,
+    "temp_store": "MEMORY",
+}
+STATEMENT_CACHE_SIZE = 256  # Sentencias preparadas que sqlite3 guarda por conexión
 
-def insert_data(table_name, data):
-    """Guarda el diccionario 'data' en una tabla SQLite como texto JSON."""
-    try:
-        # Conexión a la base de datos (se crea si no existe)
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+# Una conexión por hilo y por fichero (las conexiones de sqlite3 no se comparten entre hilos)
+_local = threading.local()
+_all_connections = []
+_all_connections_lock = threading.Lock()
+# Tablas que ya sabemos que existen, para no repetir CREATE TABLE en cada inserción
+_known_tables = set()
 
-        # Creamos la tabla si no existe
-        # Guardamos el timestamp y el objeto completo como JSON para mantener la estructura original
-        cursor.execute(
-            f"""
-            CREATE TABLE IF NOT EXISTS {table_name} (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT,
-                payload TEXT
-            )
-        """
+
+def get_connection(db_path=None):
+    """
+    Devuelve la conexión compartida de este hilo a 'db_path' (por defecto, DB_PATH).
+    La primera vez se abre con los PRAGMAS y la caché de sentencias preparadas.
+    """
+    db_path = db_path or DB_PATH
+    connections = _local.__dict__.setdefault("connections", {})
+    conn = connections.get(db_path)
+    if conn is None:
+        # InstrumentedConnection mide el tiempo de cada consulta (ver metrics.py)
+        conn = sqlite3.connect(
+            db_path,
+            cached_statements=STATEMENT_CACHE_SIZE,
+            factory=metrics.InstrumentedConnection,
         )
+        for pragma, value in PRAGMAS.items():
+            conn.execute(f"PRAGMA {pragma}={value}")
+        register_payload_functions(conn)
+        connections[db_path] = conn
+        with _all_connections_lock:
+            _all_connections.append(conn)
+    return conn
 
-        # Insertamos los datos
-        timestamp = data.get("timestamp_captura")
-        payload = json.dumps(data)  # Convertimos el diccionario a string JSON
 
-        cursor.execute(
-            f"INSERT INTO {table_name} (timestamp, payload) VALUES (?, ?)",
-            (timestamp, payload),
-        )
+def close_connections():
+    """Cierra todas las conexiones abiertas por get_connection (de todos los hilos)."""
+    with _all_connections_lock:
+        for conn in _all_connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        _all_connections.clear()
+    _local.__dict__.pop("connections", None)
+    _known_tables.clear()
+
+
+atexit.register(close_connections)
 
+
+@contextmanager
+def transaction(db_path=None, conn=None):
+    """
+    Agrupa varias escrituras en una sola transacción (un único commit/fsync).
+    Se puede anidar: solo la transacción más externa hace commit (o rollback si hay error).
+    La profundidad se lleva por conexión (una por fichero y por hilo), así que anidar
+    transacciones sobre dos bases de datos distintas abre y cierra las dos.
+    'conn' permite usar una conexión concreta en lugar de la compartida de 'db_path'.
+    """
+    conn = conn or get_connection(db_path)
+    depths = _local.__dict__.setdefault("depths", {})
+    depth = depths.get(id(conn), 0)
+    if depth == 0 and not conn.in_transaction:
+        conn.execute("BEGIN")
+    depths[id(conn)] = depth + 1
+    try:
+        yield conn
+    except BaseException:
+        _leave(depths, conn, depth)
+        if depth == 0:
+            conn.rollback()
+            # Las tablas creadas dentro de la transacción ya no existen
+            _known_tables.difference_update(
+                [key for key in _known_tables if key[0] is conn]
+            )
+        raise
+    _leave(depths, conn, depth)
+    if depth == 0:
         conn.commit()
-        conn.close()
+
+
+def _leave(depths, conn, depth):
+    if depth:
+        depths[id(conn)] = depth
+    else:
+        depths.pop(id(conn), None)
+
+
+def in_transaction(db_path=None):
+    """Indica si hay una transacción abierta con transaction() sobre 'db_path' en este hilo."""
+    depths = _local.__dict__.get("depths", {})
+    return depths.get(id(get_connection(db_path)), 0) > 0
+
+
+def ensure_table(conn, table_name):
+    """
+    Creamos la tabla si no existe.
+    Guardamos el timestamp y el objeto completo como JSON para mantener la estructura original.
+    Las coordenadas van también en columnas: con el timestamp forman la clave única de cada
+    captura, así que guardar otra vez la misma captura la sustituye en lugar de duplicarla.
+    """
+    key = (conn, table_name)
+    if key in _known_tables:
+        return
+    conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {table_name} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT,
+            payload TEXT,
+            lat TEXT,
+            lon TEXT
+        )
+    """
+    )
+    columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table_name})")}
+    if "lat" not in columns:
+        upgrade_table(conn, table_name)
+    conn.execute(
+        f"CREATE UNIQUE INDEX IF NOT EXISTS uq_{table_name}_capture "
+        f"ON {table_name} (lat, lon, timestamp)"
+    )
+    _known_tables.add(key)
+
+
+def upgrade_table(conn, table_name):
+    """
+    Tablas anteriores a la clave única: añade lat y lon (sacadas del payload) y borra las
+    capturas repetidas (mismas coordenadas y timestamp), dejando la primera que se guardó.
+    """
+    conn.execute(f"ALTER TABLE {table_name} ADD COLUMN lat TEXT")
+    conn.execute(f"ALTER TABLE {table_name} ADD COLUMN lon TEXT")
+    rows = conn.execute(f"SELECT id, payload FROM {table_name}").fetchall()
+    coordinates = []
+    for row_id, payload in rows:
+        data = decode_payload(payload)
+        coordinates.append((data.get("lat"), data.get("lon"), row_id))
+    conn.executemany(f"UPDATE {table_name} SET lat = ?, lon = ? WHERE id = ?", coordinates)
+    # Las filas sin coordenadas o sin timestamp no chocan en el índice único (NULL es distinto)
+    removed = conn.execute(
+        f"""
+        DELETE FROM {table_name}
+        WHERE lat IS NOT NULL AND lon IS NOT NULL AND timestamp IS NOT NULL
+        AND id NOT IN (SELECT MIN(id) FROM {table_name} GROUP BY lat, lon, timestamp)
+        """
+    ).rowcount
+    if removed:
+        print(f"⚠️  Eliminadas {removed} capturas repetidas de '{table_name}'")
+
+
+# Una captura repetida sustituye el payload de la que ya estaba (y conserva su id)
+UPSERT_DOCUMENT = """
+    INSERT INTO {table_name} (timestamp, lat, lon, payload) VALUES (?, ?, ?, ?)
+    ON CONFLICT (lat, lon, timestamp) DO UPDATE SET payload = excluded.payload
+"""
+
+
+def insert_data(table_name, data, encoding="json"):
+    """
+    Guarda el diccionario 'data' en una tabla SQLite como texto JSON o, según 'encoding',
+    como BLOB comprimido ("zstd-json" o "arrow", ver payload_codec.py). Si ya estaba esa
+    captura (mismas lat, lon y timestamp_captura) se sustituye en lugar de duplicarla.
+    """
+    if encoding not in PAYLOAD_ENCODINGS:
+        raise ValueError(f"encoding debe ser uno de {PAYLOAD_ENCODINGS}")
+    nested = in_transaction()
+    try:
+        with transaction() as conn:
+            ensure_table(conn, table_name)
+
+            # Insertamos los datos
+            timestamp = data.get("timestamp_captura")
+            payload = encode_payload(data, encoding)  # Diccionario a string JSON (o BLOB)
+
+            conn.execute(
+                UPSERT_DOCUMENT.format(table_name=table_name),
+                (timestamp, data.get("lat"), data.get("lon"), payload),
+            )
+
         print(f"Datos guardados exitosamente en: {DB_PATH}")
 
     except sqlite3.Error as e:
+        # Dentro de una transacción externa el error se propaga, para que se deshaga entera
+        # (si no, la transacción externa haría commit de un lote a medias)
+        if nested:
+            raise
+        metrics.record_error("insert_data", e, table=table_name)
         print(f"Error al guardar en SQLite: {e}")
 
 
+def insert_many(table_name, documents, encoding="json"):
+    """
+    Guarda muchos diccionarios en la tabla 'table_name' en UNA sola transacción
+    (refrescos de varias localizaciones o cargas históricas), con el mismo upsert que
+    insert_data. Devuelve cuántos se guardaron.
+    """
+    if encoding not in PAYLOAD_ENCODINGS:
+        raise ValueError(f"encoding debe ser uno de {PAYLOAD_ENCODINGS}")
+    nested = in_transaction()
+    try:
+        with transaction() as conn:
+            ensure_table(conn, table_name)
+            cursor = conn.executemany(
+                UPSERT_DOCUMENT.format(table_name=table_name),
+                (
+                    (
+                        data.get("timestamp_captura"),
+                        data.get("lat"),
+                        data.get("lon"),
+                        encode_payload(data, encoding),
+                    )
+                    for data in documents
+                ),
+            )
+
+        print(f"{cursor.rowcount} documentos guardados exitosamente en: {DB_PATH}")
+        return cursor.rowcount
+
+    except sqlite3.Error as e:
+        # Igual que en insert_data: dentro de otra transacción el error se propaga
+        if nested:
+            raise
+        metrics.record_error("insert_many", e, table=table_name)
+        print(f"Error al guardar en SQLite: {e}")
+        return 0
+
+
 def read_table(table_name):
     """Lee todos los registros de una tabla y los imprime formateados por terminal."""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        # Esto permite acceder a las columnas por nombre como si fuera un diccionario
-        conn.row_factory = sqlite3.Row
+        conn = get_connection()
         cursor = conn.cursor()
+        # Esto permite acceder a las columnas por nombre como si fuera un diccionario
+        cursor.row_factory = sqlite3.Row
 
         # Comprobamos primero si la tabla existe para evitar errores
         cursor.execute(
@@ -64,14 +276,14 @@ def read_table(table_name):
 
         print(f"\n--- CONTENIDO DE LA TABLA: {table_name} ---")
         for row in rows:
-            # Convertimos el string JSON de nuevo a un diccionario de Python
-            payload_dict = json.loads(row["payload"])
+            # Convertimos el string JSON (o el BLOB comprimido) de nuevo a un diccionario
+            payload_dict = decode_payload(row["payload"])
 
             print(f"ID: {row['id']} | Registro: {row['timestamp']}")
             # Usamos json.dumps con indent para que se vea bonito en terminal
             print(json.dumps(payload_dict, indent=4, ensure_ascii=False))
             print("-" * 40)
 
-        conn.close()
     except sqlite3.Error as e:
+        metrics.record_error("read_table", e, table=table_name)
         print(f"Error al leer de SQLite: {e}")
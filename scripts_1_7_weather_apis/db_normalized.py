@@ -0,0 +1,368 @@
+"""
+Esquema normalizado (columnar) de la base de datos.
+
+En lugar de guardar cada captura como un único texto JSON en la tabla 'openmeteo', aquí cada
+captura se reparte en tres tablas con columnas tipadas:
+- fetches: una fila por captura (coordenadas y timestamp_captura).
+- current_obs: el tiempo actual de cada captura (una fila por captura).
+- hourly_obs: una fila por hora de pronóstico de cada captura.
+- hourly_latest: el pronóstico más reciente de cada hora y localización (vista materializada
+  que se actualiza en cada inserción).
+
+Así las lecturas son SELECT normales sobre índices, sin decodificar JSON.
+
+Las inserciones son idempotentes: repetir una captura (mismas coordenadas y timestamp_captura)
+actualiza sus filas en lugar de duplicarlas.
+"""
+
+import sqlite3
+
+from .db_connection import (
+    DB_PATH,
+    _known_tables,
+    get_connection,
+    in_transaction,
+    transaction,
+)
+from .payload_codec import decode_payload
+
+NORMALIZED_SCHEMA = """
+CREATE TABLE IF NOT EXISTS fetches (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    source_id INTEGER UNIQUE,  -- id de la fila original en 'openmeteo' (si viene de la migración)
+    lat TEXT NOT NULL,
+    lon TEXT NOT NULL,
+    timestamp_captura TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS current_obs (
+    fetch_id INTEGER PRIMARY KEY REFERENCES fetches(id),
+    temperature REAL,
+    summary TEXT,
+    icon TEXT,
+    cloud_cover INTEGER,
+    wind_speed REAL,
+    wind_angle INTEGER,
+    wind_dir TEXT,
+    precip_total REAL,
+    precip_type TEXT
+);
+
+CREATE TABLE IF NOT EXISTS hourly_obs (
+    fetch_id INTEGER NOT NULL REFERENCES fetches(id),
+    lat TEXT NOT NULL,
+    lon TEXT NOT NULL,
+    date TEXT NOT NULL,
+    weather TEXT,
+    temperature REAL,
+    humidity INTEGER,
+    apparent_temp REAL,
+    precip_total REAL,
+    precip_type TEXT,
+    precip_prob INTEGER,
+    summary TEXT
+);
+
+CREATE TABLE IF NOT EXISTS hourly_latest (
+    lat TEXT NOT NULL,
+    lon TEXT NOT NULL,
+    date TEXT NOT NULL,
+    fetch_id INTEGER NOT NULL REFERENCES fetches(id),
+    timestamp_captura TEXT NOT NULL,
+    weather TEXT,
+    temperature REAL,
+    humidity INTEGER,
+    apparent_temp REAL,
+    precip_total REAL,
+    precip_type TEXT,
+    precip_prob INTEGER,
+    summary TEXT,
+    PRIMARY KEY (lat, lon, date)
+);
+
+CREATE INDEX IF NOT EXISTS idx_hourly_obs_location_date ON hourly_obs (lat, lon, date);
+CREATE INDEX IF NOT EXISTS idx_hourly_obs_fetch ON hourly_obs (fetch_id);
+DROP INDEX IF EXISTS idx_fetches_location_time;
+CREATE INDEX IF NOT EXISTS idx_hourly_latest_fetch ON hourly_latest (fetch_id);
+"""
+
+# Claves de los upserts. Se crean después de deduplicar las bases de datos anteriores a ellas
+UNIQUE_INDEXES = """
+CREATE UNIQUE INDEX IF NOT EXISTS uq_fetches_location_time ON fetches (lat, lon, timestamp_captura);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_hourly_obs_fetch_date ON hourly_obs (fetch_id, date);
+"""
+
+# Capturas repetidas (mismas coordenadas y timestamp_captura): se queda la de menor id, las
+# filas hijas de las demás pasan a ella y después se quitan las horas repetidas de cada captura
+DEDUPLICATE_FETCHES = """
+CREATE TEMP TABLE fetch_duplicates AS
+    SELECT f.id AS duplicate_id, f.source_id, keep.id AS keep_id
+    FROM fetches f
+    JOIN (
+        SELECT lat, lon, timestamp_captura, MIN(id) AS id FROM fetches
+        GROUP BY lat, lon, timestamp_captura HAVING COUNT(*) > 1
+    ) keep USING (lat, lon, timestamp_captura)
+    WHERE f.id <> keep.id;
+
+UPDATE hourly_obs SET fetch_id = (
+    SELECT keep_id FROM fetch_duplicates WHERE duplicate_id = hourly_obs.fetch_id
+) WHERE fetch_id IN (SELECT duplicate_id FROM fetch_duplicates);
+
+DELETE FROM hourly_obs WHERE rowid NOT IN (
+    SELECT MIN(rowid) FROM hourly_obs GROUP BY fetch_id, date
+);
+
+UPDATE OR IGNORE current_obs SET fetch_id = (
+    SELECT keep_id FROM fetch_duplicates WHERE duplicate_id = current_obs.fetch_id
+) WHERE fetch_id IN (SELECT duplicate_id FROM fetch_duplicates);
+
+DELETE FROM current_obs WHERE fetch_id IN (SELECT duplicate_id FROM fetch_duplicates);
+
+UPDATE hourly_latest SET fetch_id = (
+    SELECT keep_id FROM fetch_duplicates WHERE duplicate_id = hourly_latest.fetch_id
+) WHERE fetch_id IN (SELECT duplicate_id FROM fetch_duplicates);
+
+DELETE FROM fetches WHERE id IN (SELECT duplicate_id FROM fetch_duplicates);
+
+UPDATE fetches SET source_id = (
+    SELECT MIN(source_id) FROM fetch_duplicates WHERE keep_id = fetches.id
+) WHERE source_id IS NULL AND id IN (SELECT keep_id FROM fetch_duplicates);
+
+DROP TABLE fetch_duplicates
+"""
+
+HOURLY_VALUE_COLUMNS = [
+    "weather",
+    "temperature",
+    "humidity",
+    "apparent_temp",
+    "precip_total",
+    "precip_type",
+    "precip_prob",
+    "summary",
+]
+
+# Upserts: una captura repetida actualiza sus filas, y hourly_latest solo se sobrescribe
+# si la captura nueva es igual o más reciente que la que ya tenía esa hora.
+UPSERT_FETCH = """
+    INSERT INTO fetches (source_id, lat, lon, timestamp_captura) VALUES (?, ?, ?, ?)
+    ON CONFLICT (lat, lon, timestamp_captura)
+    DO UPDATE SET source_id = COALESCE(fetches.source_id, excluded.source_id)
+    RETURNING id
+"""
+
+UPSERT_HOURLY_OBS = f"""
+    INSERT INTO hourly_obs (fetch_id, lat, lon, date, {", ".join(HOURLY_VALUE_COLUMNS)})
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (fetch_id, date) DO UPDATE SET
+    {", ".join(f"{col} = excluded.{col}" for col in HOURLY_VALUE_COLUMNS)}
+"""
+
+UPSERT_HOURLY_LATEST = f"""
+    INSERT INTO hourly_latest (lat, lon, date, fetch_id, timestamp_captura,
+        {", ".join(HOURLY_VALUE_COLUMNS)})
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (lat, lon, date) DO UPDATE SET
+    fetch_id = excluded.fetch_id,
+    timestamp_captura = excluded.timestamp_captura,
+    {", ".join(f"{col} = excluded.{col}" for col in HOURLY_VALUE_COLUMNS)}
+    WHERE excluded.timestamp_captura >= hourly_latest.timestamp_captura
+"""
+
+REBUILD_HOURLY_LATEST = f"""
+    INSERT INTO hourly_latest (lat, lon, date, fetch_id, timestamp_captura,
+        {", ".join(HOURLY_VALUE_COLUMNS)})
+    SELECT lat, lon, date, fetch_id, timestamp_captura, {", ".join(HOURLY_VALUE_COLUMNS)}
+    FROM (
+        SELECT h.*, f.timestamp_captura,
+            ROW_NUMBER() OVER (
+                PARTITION BY h.lat, h.lon, h.date
+                ORDER BY f.timestamp_captura DESC, f.id DESC
+            ) AS rn
+        FROM hourly_obs h JOIN fetches f ON f.id = h.fetch_id
+    )
+    WHERE rn = 1
+"""
+
+
+def create_normalized_schema(conn):
+    """Crea las tablas e índices del esquema normalizado si no existen (una vez por conexión)."""
+    key = (conn, "fetches")
+    if key in _known_tables:
+        return
+    # La transacción es sobre 'conn' (que puede ser de otra base de datos que DB_PATH)
+    with transaction(conn=conn):
+        # Sentencia a sentencia (executescript haría commit de cualquier transacción abierta)
+        for statement in NORMALIZED_SCHEMA.split(";"):
+            if statement.strip():
+                conn.execute(statement)
+
+        # Bases de datos anteriores a las claves únicas: pueden tener capturas repetidas
+        has_keys = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'uq_fetches_location_time'"
+        ).fetchone()
+        if has_keys is None:
+            deduplicate_fetches(conn)
+        for statement in UNIQUE_INDEXES.split(";"):
+            if statement.strip():
+                conn.execute(statement)
+
+        # Bases de datos anteriores a hourly_latest: la rellenamos una vez a partir de hourly_obs
+        if conn.execute("SELECT 1 FROM hourly_latest LIMIT 1").fetchone() is None:
+            rebuild_hourly_latest(conn)
+    _known_tables.add(key)
+
+
+def deduplicate_fetches(conn):
+    """Deja una sola fila en 'fetches' (y sus tablas hijas) por cada captura repetida."""
+    before = conn.execute("SELECT COUNT(*) FROM fetches").fetchone()[0]
+    for statement in DEDUPLICATE_FETCHES.split(";"):
+        if statement.strip():
+            conn.execute(statement)
+    removed = before - conn.execute("SELECT COUNT(*) FROM fetches").fetchone()[0]
+    if removed:
+        print(f"⚠️  Eliminadas {removed} capturas repetidas del esquema normalizado")
+
+
+def rebuild_hourly_latest(conn):
+    """
+    Recalcula hourly_latest desde cero a partir de todas las capturas de hourly_obs.
+    Solo hace falta para bases de datos antiguas; en el día a día se mantiene con upserts.
+    """
+    conn.execute("DELETE FROM hourly_latest")
+    conn.execute(REBUILD_HOURLY_LATEST)
+
+
+def insert_document(conn, data, source_id=None):
+    """
+    Inserta (o actualiza, si ya existía esa captura) un documento con la forma que produce
+    get_open_meteo en las tablas normalizadas, sin hacer commit. Devuelve el id de su fila
+    en 'fetches'.
+    """
+    lat, lon = data.get("lat"), data.get("lon")
+    timestamp = data.get("timestamp_captura")
+    fetch_id = conn.execute(UPSERT_FETCH, (source_id, lat, lon, timestamp)).fetchone()[0]
+
+    current = data.get("current")
+    if current:
+        wind = current.get("wind") or {}
+        precip = current.get("precipitation") or {}
+        conn.execute(
+            """
+            INSERT OR REPLACE INTO current_obs (fetch_id, temperature, summary, icon,
+                cloud_cover, wind_speed, wind_angle, wind_dir, precip_total, precip_type)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                fetch_id,
+                current.get("temperature"),
+                current.get("summary"),
+                current.get("icon"),
+                current.get("cloud_cover"),
+                wind.get("speed"),
+                wind.get("angle"),
+                wind.get("dir"),
+                precip.get("total"),
+                precip.get("type"),
+            ),
+        )
+
+    hourly_values = [
+        (
+            hour.get("date"),
+            hour.get("weather"),
+            hour.get("temperature"),
+            hour.get("humidity"),
+            hour.get("apparent_temp"),
+            (hour.get("precipitation") or {}).get("total"),
+            (hour.get("precipitation") or {}).get("type"),
+            hour.get("precip_prob"),
+            hour.get("summary"),
+        )
+        for hour in (data.get("hourly") or {}).get("data") or []
+    ]
+    conn.executemany(
+        UPSERT_HOURLY_OBS,
+        ((fetch_id, lat, lon, *values) for values in hourly_values),
+    )
+    conn.executemany(
+        UPSERT_HOURLY_LATEST,
+        (
+            (lat, lon, date, fetch_id, timestamp, *values)
+            for date, *values in hourly_values
+        ),
+    )
+    return fetch_id
+
+
+def insert_normalized(data):
+    """Guarda el diccionario 'data' en las tablas normalizadas (fetches, current_obs, hourly_obs)."""
+    nested = in_transaction()
+    try:
+        create_normalized_schema(get_connection())
+        with transaction() as conn:
+            insert_document(conn, data)
+        print(f"Datos guardados exitosamente (esquema normalizado) en: {DB_PATH}")
+
+    except sqlite3.Error as e:
+        # Dentro de una transacción externa el error se propaga para que se deshaga entera
+        if nested:
+            raise
+        print(f"Error al guardar en SQLite: {e}")
+
+
+def insert_many_normalized(documents):
+    """Guarda muchos documentos en las tablas normalizadas en UNA sola transacción."""
+    nested = in_transaction()
+    try:
+        create_normalized_schema(get_connection())
+        inserted = 0
+        with transaction() as conn:
+            for data in documents:
+                insert_document(conn, data)
+                inserted += 1
+        print(
+            f"{inserted} documentos guardados exitosamente (esquema normalizado) en: {DB_PATH}"
+        )
+        return inserted
+
+    except sqlite3.Error as e:
+        if nested:
+            raise
+        print(f"Error al guardar en SQLite: {e}")
+        return 0
+
+
+def migrate_openmeteo(table_name="openmeteo"):
+    """
+    Migra las filas JSON de 'table_name' al esquema normalizado.
+    Es idempotente: las filas ya migradas (según fetches.source_id) no se vuelven a insertar.
+    """
+    try:
+        conn = get_connection()
+        create_normalized_schema(conn)
+
+        cursor = conn.execute(
+            f"""
+            SELECT id, payload FROM {table_name}
+            WHERE id NOT IN (SELECT source_id FROM fetches WHERE source_id IS NOT NULL)
+            ORDER BY id
+            """
+        )
+
+        migrated = 0
+        # Todo en una sola transacción: o se migra todo o nada
+        with transaction():
+            for row_id, payload in cursor.fetchall():
+                insert_document(conn, decode_payload(payload), source_id=row_id)
+                migrated += 1
+
+        print(f"Migradas {migrated} capturas de '{table_name}' al esquema normalizado.")
+        return migrated
+
+    except sqlite3.Error as e:
+        print(f"Error al migrar en SQLite: {e}")
+
+
+if __name__ == "__main__":
+    migrate_openmeteo()
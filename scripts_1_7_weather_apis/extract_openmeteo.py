@@ -1,41 +1,25 @@
-import requests
-from datetime import datetime, timezone
-from .db_connection import insert_data
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from .db_connection import insert_data, transaction
+from .db_normalized import insert_normalized
+from . import metrics
+from .hourly_transform import get_weather_translation, hourly_records
+from .http_client import DEFAULT_TIMEOUT, fetch_json, get_session
+from .locations import DEFAULT_LOCATION, LOCATIONS, resolve_locations
+from .payload_codec import PAYLOAD_ENCODINGS
 
-# Sevilla
-LAT = "37.3886"
-LON = "-5.9823"
-
-# Almeria
-# LAT = "36.8340"
-# LON = "-2.4637"
-
-# Cadiz
-# LAT = "36.5271"
-# LON = "-6.2886"
-
-# Cordoba
-# LAT = "37.8882"
-# LON = "-4.7794"
-
-# Granada
-# LAT = "37.1773"
-# LON = "-3.5986"
-
-# Huelva
-# LAT = "37.2614"
-# LON = "-6.9447"
-
-# Jaen
-# LAT = "37.7796"
-# LON = "-3.7849"
-
-# Malaga
-# LAT = "36.7213"
-# LON = "-4.4214"
+# Las coordenadas de cada capital están en el registro de locations.py.
+# Mantenemos LAT/LON como la localización por defecto (Sevilla).
+LAT, LON = LOCATIONS[DEFAULT_LOCATION]
 
 URL = "https://api.open-meteo.com/v1/forecast"
 COLLECTION_NAME = "openmeteo"
+MAX_WORKERS = 8  # Número máximo de peticiones simultáneas a la API
+BATCH_SIZE = 50  # Localizaciones por petición en el modo por lotes
+STORAGE_MODES = ("json", "normalized", "both")  # Ver db_normalized.py
+
+CURRENT_VARS = "temperature_2m,weather_code,wind_speed_10m,wind_direction_10m,precipitation,cloud_cover"
+HOURLY_VARS = "temperature_2m,relative_humidity_2m,apparent_temperature,precipitation,precipitation_probability,weather_code"
 
 
 def get_wind_dir(degrees):
@@ -62,29 +46,6 @@ def get_wind_dir(degrees):
     return dirs[ix % 16]
 
 
-def get_weather_translation(wmo_code):
-
-    # Traduce el código WMO de Open-Meteo al estilo de texto de Meteosource.
-    # Mapeo simplificado para traducir la respuesta.
-    if wmo_code == 0:
-        return "sunny", "Sunny"
-    if wmo_code in [1, 2]:
-        return "partly_sunny", "Partly sunny"
-    if wmo_code == 3:
-        return "overcast", "Overcast"
-    if 45 <= wmo_code <= 48:
-        return "fog", "Fog"
-    if 51 <= wmo_code <= 67:
-        return "rain", "Rain"
-    if 71 <= wmo_code <= 77:
-        return "snow", "Snow"
-    if 80 <= wmo_code <= 82:
-        return "rain_shower", "Rain showers"
-    if 95 <= wmo_code <= 99:
-        return "thunderstorm", "Thunderstorm"
-    return "cloudy", "Cloudy"
-
-
 def get_precip_type(rain_val, snow_val, showers_val):
     """Determina el tipo de precipitación basado en los valores"""
     total = rain_val + snow_val + showers_val
@@ -95,103 +56,244 @@ def get_precip_type(rain_val, snow_val, showers_val):
     return "rain"
 
 
-def get_open_meteo():
-    """
-    Captura datos de Open-Meteo, procesa campos de current y hourly,
-    y guarda la estructura JSON final en la base de datos.
-    """
-    timestamp_actual = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-    # Definimos los parámetros exactos que queremos de la API
-    params = {
-        "latitude": LAT,
-        "longitude": LON,
-        "current": "temperature_2m,weather_code,wind_speed_10m,wind_direction_10m,precipitation,cloud_cover",
-        "hourly": "temperature_2m,relative_humidity_2m,apparent_temperature,precipitation,precipitation_probability,weather_code",
+def build_params(lat, lon):
+    """Parámetros exactos que queremos de la API para unas coordenadas."""
+    return {
+        "latitude": lat,
+        "longitude": lon,
+        "current": CURRENT_VARS,
+        "hourly": HOURLY_VARS,
         "timezone": "auto",
         "forecast_days": 7,
     }
 
+
+def build_document(data, lat, lon, timestamp_actual):
+    """
+    Procesa los campos de current y hourly de una respuesta de Open-Meteo y construye
+    el documento JSON final que se guarda en la base de datos.
+    """
+    # --- 1. PROCESAR CURRENT ---
+    curr_raw = data["current"]
+    w_slug, w_summary = get_weather_translation(curr_raw["weather_code"])
+
+    # Lógica de tipo de precipitación para 'current'
+    curr_precip_type = "none"
+    if curr_raw["precipitation"] > 0:
+        # Si el código WMO es de nieve (71-77), marcamos snow, si no rain
+        curr_precip_type = "snow" if 71 <= curr_raw["weather_code"] <= 77 else "rain"
+
+    current_data = {
+        "temperature": float(curr_raw["temperature_2m"]),
+        "summary": w_summary,
+        "icon": w_slug,
+        "wind": {
+            "speed": float(curr_raw["wind_speed_10m"]),
+            "angle": int(curr_raw["wind_direction_10m"]),
+            "dir": get_wind_dir(curr_raw["wind_direction_10m"]),
+        },
+        "precipitation": {
+            "total": float(curr_raw["precipitation"]),
+            "type": curr_precip_type,
+        },
+        "cloud_cover": int(curr_raw["cloud_cover"]),
+    }
+
+    # --- 2. PROCESAR HOURLY (Capturando todos los campos críticos) ---
+    # Las listas de la API se traducen por columnas (ver hourly_transform.py) y después se
+    # reparten en un objeto por hora
+    hourly_list = hourly_records(data["hourly"])
+
+    # --- 3. CONSTRUCCIÓN DEL JSON FINAL PARA SQLITE ---
+    # Usamos 'lat' y 'lon' para coincidir con tu estructura de DB
+    return {
+        "lat": str(lat),
+        "lon": str(lon),
+        "timestamp_captura": timestamp_actual,
+        "current": current_data,
+        "hourly": {
+            "data": hourly_list  # Aquí metemos la lista de objetos procesados
+        },
+    }
+
+
+def capture_time(response):
+    """
+    timestamp_captura de una respuesta: la hora en que se descargó. Si sale de la caché HTTP
+    es la de la descarga original, así que repetirla no cuenta como una captura nueva.
+    """
+    return datetime.fromtimestamp(response.fetched_at).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def fetch_location(
+    lat, lon, url=URL, session=None, timeout=DEFAULT_TIMEOUT, skip_cached=False
+):
+    """
+    Pide a la API los datos de unas coordenadas y devuelve el documento ya procesado.
+    Con 'skip_cached' devuelve None si la respuesta sale de la caché HTTP (ya se guardó).
+    """
+    response = fetch_json(url, params=build_params(lat, lon), session=session, timeout=timeout)
+    if skip_cached and response.from_cache:
+        return None
+    return build_document(response.data, lat, lon, capture_time(response))
+
+
+def chunked(items, size):
+    """Divide una lista en trozos consecutivos de tamaño 'size' (el último puede ser menor)."""
+    return [items[i : i + size] for i in range(0, len(items), size)]
+
+
+def fetch_batch(locations, url=URL, session=None, timeout=DEFAULT_TIMEOUT, skip_cached=False):
+    """
+    Pide en UNA sola petición los datos de varias localizaciones (lista de tuplas (nombre, lat, lon)).
+    Open-Meteo acepta listas de coordenadas separadas por comas y devuelve una lista de resultados
+    en el mismo orden; la repartimos en un documento por localización con la misma forma
+    que guarda insert_data. Con 'skip_cached' devuelve {} si la respuesta sale de la caché HTTP.
+    """
+    params = build_params(
+        ",".join(lat for _, lat, _ in locations),
+        ",".join(lon for _, _, lon in locations),
+    )
+    response = fetch_json(url, params=params, session=session, timeout=timeout)
+    if skip_cached and response.from_cache:
+        return {}
+    data = response.data
+    timestamp_actual = capture_time(response)
+
+    # Con una sola coordenada la API devuelve un objeto en vez de una lista
+    results = data if isinstance(data, list) else [data]
+    if len(results) != len(locations):
+        raise ValueError(
+            f"La API devolvió {len(results)} resultados para {len(locations)} localizaciones"
+        )
+
+    return {
+        name: build_document(result, lat, lon, timestamp_actual)
+        for (name, lat, lon), result in zip(locations, results)
+    }
+
+
+def fetch_locations(
+    locations,
+    max_workers=MAX_WORKERS,
+    url=URL,
+    session=None,
+    timeout=DEFAULT_TIMEOUT,
+    batch_size=None,
+    skip_cached=False,
+):
+    """
+    Pide en paralelo los datos de varias localizaciones (lista de tuplas (nombre, lat, lon)).
+    Todas las peticiones comparten la misma sesión HTTP y como máximo hay 'max_workers'
+    peticiones en vuelo a la vez, así que el tiempo total se acerca al de una sola petición.
+    Con 'batch_size' se agrupan las localizaciones en trozos de ese tamaño y se hace una sola
+    petición por trozo (fetch_batch), dividiendo el número de peticiones por 'batch_size'.
+    Devuelve un diccionario {nombre: documento}; las localizaciones que fallan no aparecen, y
+    con 'skip_cached' tampoco las que se sirven desde la caché HTTP (ver fetch_location).
+    """
+    session = session or get_session()
+    documents = {}
+    cached = []
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        if batch_size:
+            futures = {
+                executor.submit(
+                    fetch_batch, chunk, url, session, timeout, skip_cached
+                ): chunk
+                for chunk in chunked(locations, batch_size)
+            }
+        else:
+            futures = {
+                executor.submit(
+                    fetch_location, lat, lon, url, session, timeout, skip_cached
+                ): [(name, lat, lon)]
+                for name, lat, lon in locations
+            }
+        for future in as_completed(futures):
+            names = [name for name, _, _ in futures[future]]
+            try:
+                result = future.result()
+                if not result:
+                    cached.extend(names)
+                elif batch_size:
+                    documents.update(result)
+                else:
+                    documents[names[0]] = result
+            except Exception as e:
+                metrics.record_error("fetch_locations", e, locations=names)
+                print(f"❌ [ERROR] Fallo al pedir datos de {', '.join(names)}: {e}")
+
+    if cached:
+        names = [name for name, _, _ in locations if name in cached]
+        print(f"⚠️  [CACHE] Sin datos nuevos (respuesta ya guardada): {', '.join(names)}")
+
+    # Devolvemos los documentos en el mismo orden en que se pidieron
+    return {name: documents[name] for name, _, _ in locations if name in documents}
+
+
+def save_documents(documents, storage="json", encoding="json"):
+    """
+    Guarda los documentos ({nombre: documento}) según 'storage' y 'encoding' (ver
+    get_open_meteo), todos en una sola transacción, con un único commit para todo el refresco.
+    Si falla una inserción se lanza la excepción y no se guarda ninguno.
+    """
+    with transaction():
+        for datos_finales in documents.values():
+            if storage in ("json", "both"):
+                insert_data(COLLECTION_NAME, datos_finales, encoding=encoding)
+            if storage in ("normalized", "both"):
+                insert_normalized(datos_finales)
+    # Se informa al salir de la transacción: si falla un documento no se guarda ninguno
+    for name, datos_finales in documents.items():
+        print(
+            f"✅ [OK] Datos de meteorología guardados ({name}): {datos_finales['timestamp_captura']}"
+        )
+
+
+def get_open_meteo(
+    locations=None,
+    max_workers=MAX_WORKERS,
+    url=URL,
+    batch_size=None,
+    storage="json",
+    encoding="json",
+    skip_cached=True,
+):
+    """
+    Captura datos de Open-Meteo para una o varias localizaciones del registro
+    (por defecto, Sevilla) y guarda cada documento JSON en la base de datos.
+    Con 'batch_size' se piden varias localizaciones por petición (ver fetch_locations).
+    'storage' indica dónde se guarda: tabla JSON ("json"), tablas normalizadas
+    ("normalized") o ambas ("both"). 'encoding' es la codificación del payload en la tabla
+    JSON: texto ("json") o BLOB comprimido ("zstd-json", "arrow"; ver payload_codec.py).
+    Con 'skip_cached' (por defecto) no se guardan las respuestas servidas desde la caché HTTP:
+    ya se guardaron cuando se descargaron y repetirlas no añade una captura nueva.
+    """
+    if storage not in STORAGE_MODES:
+        raise ValueError(f"storage debe ser uno de {STORAGE_MODES}")
+    if encoding not in PAYLOAD_ENCODINGS:
+        raise ValueError(f"encoding debe ser uno de {PAYLOAD_ENCODINGS}")
+
     try:
-        response = requests.get(URL, params=params)
-        response.raise_for_status()
-        data = response.json()
-
-        # --- 1. PROCESAR CURRENT ---
-        curr_raw = data["current"]
-        w_slug, w_summary = get_weather_translation(curr_raw["weather_code"])
-
-        # Lógica de tipo de precipitación para 'current'
-        curr_precip_type = "none"
-        if curr_raw["precipitation"] > 0:
-            # Si el código WMO es de nieve (71-77), marcamos snow, si no rain
-            curr_precip_type = (
-                "snow" if 71 <= curr_raw["weather_code"] <= 77 else "rain"
-            )
-
-        current_data = {
-            "temperature": float(curr_raw["temperature_2m"]),
-            "summary": w_summary,
-            "icon": w_slug,
-            "wind": {
-                "speed": float(curr_raw["wind_speed_10m"]),
-                "angle": int(curr_raw["wind_direction_10m"]),
-                "dir": get_wind_dir(curr_raw["wind_direction_10m"]),
-            },
-            "precipitation": {
-                "total": float(curr_raw["precipitation"]),
-                "type": curr_precip_type,
-            },
-            "cloud_cover": int(curr_raw["cloud_cover"]),
-        }
-
-        # --- 2. PROCESAR HOURLY (Capturando todos los campos críticos) ---
-        hourly_raw = data["hourly"]
-        hourly_list = []
-
-        # Recorremos la lista de 'time' para reconstruir los objetos por hora
-        for i in range(len(hourly_raw["time"])):
-            w_code = hourly_raw["weather_code"][i]
-            p_total = float(hourly_raw["precipitation"][i])
-            h_slug, h_summary = get_weather_translation(w_code)
-
-            # Lógica de tipo de precipitación para la franja horaria
-            p_type = "none"
-            if p_total > 0:
-                p_type = "snow" if 71 <= w_code <= 77 else "rain"
-
-            # Construimos el objeto de la hora con TODOS los datos solicitados
-            hourly_list.append(
-                {
-                    "date": str(hourly_raw["time"][i]),
-                    "weather": h_slug,
-                    "temperature": float(hourly_raw["temperature_2m"][i]),
-                    "humidity": int(hourly_raw["relative_humidity_2m"][i]),
-                    "apparent_temp": float(hourly_raw["apparent_temperature"][i]),
-                    "precipitation": {"total": p_total, "type": p_type},
-                    "precip_prob": int(hourly_raw["precipitation_probability"][i]),
-                    "summary": h_summary,
-                }
-            )
-
-        # --- 3. CONSTRUCCIÓN DEL JSON FINAL PARA SQLITE ---
-        # Usamos 'lat' y 'lon' para coincidir con tu estructura de DB
-        datos_finales = {
-            "lat": str(LAT),
-            "lon": str(LON),
-            "timestamp_captura": timestamp_actual,
-            "current": current_data,
-            "hourly": {
-                "data": hourly_list  # Aquí metemos la lista de objetos procesados
-            },
-        }
-        # Guardar en la base de datos
-        insert_data(COLLECTION_NAME, datos_finales)
-        print(f"✅ [OK] Datos de meteorología guardados: {timestamp_actual}")
+        documents = fetch_locations(
+            resolve_locations(locations),
+            max_workers=max_workers,
+            url=url,
+            batch_size=batch_size,
+            skip_cached=skip_cached,
+        )
+
+        # Las inserciones se hacen desde el hilo principal (la conexión SQLite no se comparte entre hilos)
+        save_documents(documents, storage=storage, encoding=encoding)
+
+        return documents
 
     except Exception as e:
+        metrics.record_error("get_open_meteo", e)
         print(f"❌ [ERROR] Fallo en get_open_meteo: {e}")
 
 
 if __name__ == "__main__":
-    get_open_meteo()
+    # Ejecutado como script, pedimos todas las capitales de provincia a la vez
+    get_open_meteo(list(LOCATIONS), batch_size=BATCH_SIZE)
@@ -0,0 +1,164 @@
+"""
+Transformación columnar del bloque 'hourly' de Open-Meteo.
+
+La API ya devuelve 'hourly' en columnas (una lista por variable), así que en vez de recorrerlo
+hora a hora construyendo diccionarios, lo convertimos directamente en un DataFrame de Polars.
+La traducción de códigos WMO y el tipo de precipitación se hacen con tablas de búsqueda de 100
+posiciones (una por código WMO) en lugar de cadenas de if.
+
+build_document (extract_openmeteo.py) construye 'hourly.data' a partir de hourly_to_frame; el
+recorrido hora a hora original se conserva como referencia en
+benchmarks/bench_hourly_transform.py, que comprueba que ambos dan los mismos valores.
+"""
+
+import polars as pl
+
+def get_weather_translation(wmo_code):
+
+    # Traduce el código WMO de Open-Meteo al estilo de texto de Meteosource.
+    # Mapeo simplificado para traducir la respuesta.
+    if wmo_code == 0:
+        return "sunny", "Sunny"
+    if wmo_code in [1, 2]:
+        return "partly_sunny", "Partly sunny"
+    if wmo_code == 3:
+        return "overcast", "Overcast"
+    if 45 <= wmo_code <= 48:
+        return "fog", "Fog"
+    if 51 <= wmo_code <= 67:
+        return "rain", "Rain"
+    if 71 <= wmo_code <= 77:
+        return "snow", "Snow"
+    if 80 <= wmo_code <= 82:
+        return "rain_shower", "Rain showers"
+    if 95 <= wmo_code <= 99:
+        return "thunderstorm", "Thunderstorm"
+    return "cloudy", "Cloudy"
+
+
+WMO_CODES = 100  # Los códigos WMO van de 0 a 99
+OUT_OF_RANGE = WMO_CODES  # Posición extra de las tablas para códigos fuera de rango
+
+# Tablas de búsqueda generadas a partir de get_weather_translation para que ambos caminos
+# den siempre el mismo resultado. La última posición es el valor por defecto ("cloudy").
+_TRANSLATIONS = [get_weather_translation(code) for code in range(WMO_CODES)] + [
+    get_weather_translation(-1)
+]
+WMO_SLUGS = pl.Series("weather", [slug for slug, _ in _TRANSLATIONS], dtype=pl.String)
+WMO_SUMMARIES = pl.Series(
+    "summary", [summary for _, summary in _TRANSLATIONS], dtype=pl.String
+)
+WMO_IS_SNOW = pl.Series(
+    "is_snow", [71 <= code <= 77 for code in range(WMO_CODES)] + [False]
+)
+
+# Columnas de la API y tipo de cada una en la tabla final
+HOURLY_COLUMNS = {
+    "time": ("date", pl.String),
+    "weather_code": ("weather_code", pl.Int64),
+    "temperature_2m": ("temperature", pl.Float64),
+    "relative_humidity_2m": ("humidity", pl.Int64),
+    "apparent_temperature": ("apparent_temp", pl.Float64),
+    "precipitation": ("precip_total", pl.Float64),
+    "precipitation_probability": ("precip_prob", pl.Int64),
+}
+
+
+def wmo_index(code_col="weather_code"):
+    """Expresión que convierte el código WMO en su posición dentro de las tablas de búsqueda."""
+    code = pl.col(code_col)
+    return (
+        pl.when(code.is_between(0, WMO_CODES - 1))
+        .then(code)
+        .otherwise(OUT_OF_RANGE)
+        .cast(pl.UInt32)
+    )
+
+
+def hourly_to_frame(hourly_raw):
+    """
+    Convierte el bloque 'hourly' crudo de la API en un DataFrame de Polars con las columnas
+    date, weather, temperature, humidity, apparent_temp, precipitation {total, type},
+    precip_prob y summary (las mismas que cada objeto de 'hourly.data').
+    Las variables que no trae la respuesta (por ejemplo precipitation_probability en la API
+    histórica) quedan como columnas nulas.
+    """
+    missing = [None] * len(hourly_raw["time"])
+    df = pl.DataFrame(
+        [
+            pl.Series(name, hourly_raw.get(key, missing), strict=False).cast(
+                dtype, strict=False
+            )
+            for key, (name, dtype) in HOURLY_COLUMNS.items()
+        ]
+    )
+
+    idx = wmo_index()
+    precip_type = (
+        pl.when(pl.col("precip_total") > 0)
+        .then(
+            pl.when(pl.lit(WMO_IS_SNOW).gather(idx)).then(pl.lit("snow")).otherwise(
+                pl.lit("rain")
+            )
+        )
+        .otherwise(pl.lit("none"))
+    )
+
+    return df.select(
+        pl.col("date"),
+        pl.lit(WMO_SLUGS).gather(idx).alias("weather"),
+        pl.col("temperature"),
+        pl.col("humidity"),
+        pl.col("apparent_temp"),
+        pl.struct(
+            pl.col("precip_total").alias("total"), precip_type.alias("type")
+        ).alias("precipitation"),
+        pl.col("precip_prob"),
+        pl.lit(WMO_SUMMARIES).gather(idx).alias("summary"),
+    )
+
+
+def hourly_records(hourly_raw):
+    """
+    Objetos por hora de 'hourly.data' (los que guarda build_document) a partir de
+    hourly_to_frame. Se construyen desde las columnas ya traducidas, que es más rápido que
+    Polars to_dicts (sobre todo por el struct de precipitación).
+    """
+    df = hourly_to_frame(hourly_raw).unnest("precipitation")
+    columns = [
+        df.get_column(name).to_list()
+        for name in (
+            "date",
+            "weather",
+            "temperature",
+            "humidity",
+            "apparent_temp",
+            "total",
+            "type",
+            "precip_prob",
+            "summary",
+        )
+    ]
+    return [
+        {
+            "date": date,
+            "weather": weather,
+            "temperature": temperature,
+            "humidity": humidity,
+            "apparent_temp": apparent_temp,
+            "precipitation": {"total": total, "type": precip_type},
+            "precip_prob": precip_prob,
+            "summary": summary,
+        }
+        for (
+            date,
+            weather,
+            temperature,
+            humidity,
+            apparent_temp,
+            total,
+            precip_type,
+            precip_prob,
+            summary,
+        ) in zip(*columns)
+    ]
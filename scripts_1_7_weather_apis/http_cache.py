@@ -0,0 +1,241 @@
+"""
+Caché en disco de las respuestas HTTP de las APIs del tiempo.
+
+Open-Meteo solo actualiza sus modelos cada cierto tiempo, así que repetir la misma petición a
+los pocos minutos devuelve los mismos datos. Guardamos cada respuesta en un fichero SQLite
+(http_cache.db) con la clave (endpoint, parámetros normalizados) y:
+- Mientras no caduca (TTL según las variables pedidas, ver TTL_BY_VARIABLES) se sirve desde
+  disco sin ir a la red.
+- Cuando caduca, si la respuesta traía ETag o Last-Modified, se revalida con una petición
+  condicional (If-None-Match / If-Modified-Since); un 304 renueva la entrada sin descargar nada.
+- El tamaño está acotado (MAX_ENTRIES, MAX_BYTES): se eliminan las entradas usadas hace más
+  tiempo (LRU).
+- En modo sin conexión (set_offline) se sirve siempre desde la caché, aunque haya caducado.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import requests
+
+from .db_connection import BASE_DIR, PRAGMAS
+
+CACHE_PATH = os.path.join(BASE_DIR, "http_cache.db")
+CACHE_ENABLED = True
+
+DEFAULT_TTL = 60 * 60  # segundos
+# TTL según el bloque de variables pedido (se usa el menor de los bloques que aparezcan)
+TTL_BY_VARIABLES = {
+    "current": 10 * 60,
+    "minutely_15": 15 * 60,
+    "hourly": 60 * 60,
+    "daily": 3 * 60 * 60,
+}
+ARCHIVE_TTL = 24 * 60 * 60  # Peticiones con start_date/end_date (datos históricos)
+
+MAX_ENTRIES = 500
+MAX_BYTES = 100 * 1024 * 1024
+
+CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS http_cache (
+    key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    params TEXT NOT NULL,
+    body BLOB NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    stored_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    last_access REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_http_cache_access ON http_cache (last_access);
+"""
+
+# Borra las entradas menos usadas recientemente que quedan fuera de los límites
+EVICT = """
+    DELETE FROM http_cache WHERE key IN (
+        SELECT key FROM (
+            SELECT key,
+                ROW_NUMBER() OVER (ORDER BY last_access DESC) AS rn,
+                SUM(size) OVER (ORDER BY last_access DESC ROWS UNBOUNDED PRECEDING) AS total
+            FROM http_cache
+        )
+        WHERE rn > ? OR total > ?
+    )
+"""
+
+# Una sola conexión para todos los hilos (protegida con un lock): las peticiones se hacen
+# desde hilos del ThreadPoolExecutor que cambian en cada refresco
+_conn = None
+_conn_path = None
+_lock = threading.Lock()
+_offline = False
+
+
+class OfflineCacheMiss(requests.ConnectionError):
+    """En modo sin conexión, la petición no está en la caché."""
+
+
+def set_offline(offline=True):
+    """Activa (o desactiva) el modo sin conexión: todas las respuestas salen de la caché."""
+    global _offline
+    _offline = offline
+
+
+def is_offline():
+    return _offline
+
+
+def _get_conn():
+    """Conexión a CACHE_PATH (se abre y se crea el esquema la primera vez). Llamar con _lock."""
+    global _conn, _conn_path
+    if _conn is None or _conn_path != CACHE_PATH:
+        if _conn is not None:
+            _conn.close()
+        _conn = sqlite3.connect(CACHE_PATH, check_same_thread=False)
+        for pragma, value in PRAGMAS.items():
+            _conn.execute(f"PRAGMA {pragma}={value}")
+        with _conn:
+            for statement in CACHE_SCHEMA.split(";"):
+                if statement.strip():
+                    _conn.execute(statement)
+        _conn_path = CACHE_PATH
+    return _conn
+
+
+def normalize_params(params):
+    """Parámetros ordenados por nombre y con los valores como texto (las listas, con comas)."""
+    normalized = []
+    for name, value in sorted((params or {}).items()):
+        if isinstance(value, (list, tuple)):
+            value = ",".join(str(item) for item in value)
+        normalized.append([name, str(value)])
+    return normalized
+
+
+def cache_key(url, params):
+    """Clave de la caché: hash del endpoint y los parámetros normalizados."""
+    raw = json.dumps([url, normalize_params(params)], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def ttl_for(params):
+    """Segundos que vale una respuesta según las variables pedidas."""
+    params = params or {}
+    if "start_date" in params or "end_date" in params:
+        return ARCHIVE_TTL
+    ttls = [ttl for block, ttl in TTL_BY_VARIABLES.items() if params.get(block)]
+    return min(ttls, default=DEFAULT_TTL)
+
+
+def lookup(url, params):
+    """Devuelve la entrada guardada (diccionario) o None, y la marca como usada."""
+    key = cache_key(url, params)
+    try:
+        with _lock:
+            conn = _get_conn()
+            row = conn.execute(
+                "SELECT body, etag, last_modified, stored_at, expires_at FROM http_cache "
+                "WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            with conn:
+                conn.execute(
+                    "UPDATE http_cache SET last_access = ? WHERE key = ?", (time.time(), key)
+                )
+    except sqlite3.Error as e:
+        print(f"⚠️  [CACHE] Error al leer la caché HTTP: {e}")
+        return None
+
+    body, etag, last_modified, stored_at, expires_at = row
+    return {
+        "key": key,
+        "body": body,
+        "etag": etag,
+        "last_modified": last_modified,
+        "stored_at": stored_at,
+        "expires_at": expires_at,
+    }
+
+
+def is_fresh(entry, now=None):
+    """Indica si una entrada todavía no ha caducado."""
+    return entry["expires_at"] > (now or time.time())
+
+
+def validators(entry):
+    """Cabeceras para revalidar una entrada caducada con una petición condicional."""
+    headers = {}
+    if entry is not None and entry["etag"]:
+        headers["If-None-Match"] = entry["etag"]
+    if entry is not None and entry["last_modified"]:
+        headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
+
+
+def store(url, params, body, etag=None, last_modified=None, ttl=None, stored_at=None):
+    """
+    Guarda (o sustituye) una respuesta y elimina las entradas que sobran. 'stored_at' es la
+    hora de la descarga (por defecto, ahora); es la que devuelve lookup.
+    """
+    now = time.time()
+    stored_at = now if stored_at is None else stored_at
+    ttl = ttl_for(params) if ttl is None else ttl
+    try:
+        with _lock:
+            conn = _get_conn()
+            with conn:
+                conn.execute(
+                    """
+                    INSERT OR REPLACE INTO http_cache (key, url, params, body, etag,
+                        last_modified, stored_at, expires_at, last_access, size)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (
+                        cache_key(url, params),
+                        url,
+                        json.dumps(normalize_params(params), ensure_ascii=False),
+                        body,
+                        etag,
+                        last_modified,
+                        stored_at,
+                        now + ttl,
+                        now,
+                        len(body),
+                    ),
+                )
+                conn.execute(EVICT, (MAX_ENTRIES, MAX_BYTES))
+    except sqlite3.Error as e:
+        print(f"⚠️  [CACHE] Error al guardar en la caché HTTP: {e}")
+
+
+def refresh(entry, params, ttl=None):
+    """Renueva una entrada que el servidor ha dado por válida (respuesta 304)."""
+    now = time.time()
+    ttl = ttl_for(params) if ttl is None else ttl
+    try:
+        with _lock:
+            conn = _get_conn()
+            with conn:
+                conn.execute(
+                    "UPDATE http_cache SET expires_at = ?, last_access = ? WHERE key = ?",
+                    (now + ttl, now, entry["key"]),
+                )
+    except sqlite3.Error as e:
+        print(f"⚠️  [CACHE] Error al actualizar la caché HTTP: {e}")
+
+
+def clear_cache():
+    """Vacía la caché HTTP."""
+    with _lock:
+        conn = _get_conn()
+        with conn:
+            conn.execute("DELETE FROM http_cache")
@@ -0,0 +1,162 @@
+"""
+Cliente HTTP compartido para las peticiones a las APIs del tiempo.
+
+Usamos una única requests.Session con un pool de conexiones para reutilizar las conexiones
+TCP/TLS entre peticiones (y entre hilos), con timeout por petición y reintentos con espera
+exponencial (backoff) ante errores de red o respuestas 429/5xx.
+Las respuestas se guardan en la caché en disco de http_cache.py.
+La latencia de cada intento, los reintentos y los aciertos de caché se registran en metrics.py.
+"""
+
+import json
+import threading
+import time
+from typing import NamedTuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import http_cache, metrics
+
+DEFAULT_TIMEOUT = 10  # segundos por petición
+MAX_RETRIES = 3
+BACKOFF_FACTOR = 0.5  # espera = BACKOFF_FACTOR * 2 ** intento
+RETRY_STATUS = (429, 500, 502, 503, 504)
+POOL_SIZE = 16
+
+
+class JSONResponse(NamedTuple):
+    """JSON de una respuesta, con la hora (epoch) en que se descargó y si salió de la caché."""
+
+    data: object
+    fetched_at: float
+    from_cache: bool
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def create_session(pool_size=POOL_SIZE):
+    """Crea una sesión HTTP con un pool de conexiones del tamaño indicado."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_session():
+    """Devuelve la sesión compartida por todo el proceso (se crea la primera vez)."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = create_session()
+        return _session
+
+
+def get_json(
+    url,
+    params=None,
+    session=None,
+    timeout=DEFAULT_TIMEOUT,
+    retries=MAX_RETRIES,
+    backoff=BACKOFF_FACTOR,
+    cache=None,
+):
+    """Hace un GET y devuelve el JSON de la respuesta (ver fetch_json)."""
+    return fetch_json(url, params, session, timeout, retries, backoff, cache).data
+
+
+def fetch_json(
+    url,
+    params=None,
+    session=None,
+    timeout=DEFAULT_TIMEOUT,
+    retries=MAX_RETRIES,
+    backoff=BACKOFF_FACTOR,
+    cache=None,
+):
+    """
+    Hace un GET y devuelve un JSONResponse con el JSON de la respuesta.
+    Reintenta ante errores de conexión, timeouts y códigos RETRY_STATUS; el resto de errores
+    HTTP se lanzan directamente con raise_for_status.
+    Con 'cache' (por defecto, http_cache.CACHE_ENABLED) las respuestas que no han caducado se
+    sirven desde disco y las caducadas se revalidan con una petición condicional; en modo sin
+    conexión solo se usa la caché (OfflineCacheMiss si la petición no está guardada).
+    Las respuestas servidas desde la caché (también tras un 304) llevan from_cache=True y, en
+    fetched_at, la hora en que se descargaron por primera vez, no la de ahora.
+    """
+    cache = http_cache.CACHE_ENABLED if cache is None else cache
+    host = urlsplit(url).netloc
+    entry = http_cache.lookup(url, params) if cache else None
+    if entry is not None and (http_cache.is_offline() or http_cache.is_fresh(entry)):
+        metrics.inc(
+            "http_cache_total", host=host, result="offline" if http_cache.is_offline() else "fresh"
+        )
+        return JSONResponse(json.loads(entry["body"]), entry["stored_at"], True)
+    if cache and http_cache.is_offline():
+        raise http_cache.OfflineCacheMiss(
+            f"Modo sin conexión y sin respuesta en caché para {url}"
+        )
+
+    session = session or get_session()
+    headers = http_cache.validators(entry)
+
+    for attempt in range(retries + 1):
+        try:
+            fetched_at = time.time()
+            start = time.perf_counter()
+            try:
+                response = session.get(url, params=params, timeout=timeout, headers=headers)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                metrics.observe(
+                    "http_request_seconds",
+                    time.perf_counter() - start,
+                    host=host,
+                    status=type(e).__name__,
+                )
+                raise
+            metrics.observe(
+                "http_request_seconds",
+                time.perf_counter() - start,
+                host=host,
+                status=response.status_code,
+            )
+            if response.status_code == 304 and entry is not None:
+                # Los datos no han cambiado: renovamos la entrada y la devolvemos
+                metrics.inc("http_cache_total", host=host, result="revalidated")
+                http_cache.refresh(entry, params)
+                return JSONResponse(json.loads(entry["body"]), entry["stored_at"], True)
+            if response.status_code in RETRY_STATUS and attempt < retries:
+                raise requests.HTTPError(
+                    f"{response.status_code} reintentable", response=response
+                )
+            response.raise_for_status()
+            data = response.json()
+            if cache:
+                http_cache.store(
+                    url,
+                    params,
+                    response.content,
+                    etag=response.headers.get("ETag"),
+                    last_modified=response.headers.get("Last-Modified"),
+                    stored_at=fetched_at,
+                )
+            return JSONResponse(data, fetched_at, False)
+        except (requests.ConnectionError, requests.Timeout, requests.HTTPError) as e:
+            retryable = not isinstance(e, requests.HTTPError) or (
+                e.response is not None and e.response.status_code in RETRY_STATUS
+            )
+            if not retryable or attempt >= retries:
+                raise
+            wait = backoff * 2**attempt
+            metrics.inc("http_retries_total", host=host)
+            metrics.log_event(
+                "http_retry", url=url, attempt=attempt + 1, error=str(e), wait=wait
+            )
+            print(
+                f"⚠️  [RETRY] {url} ({e}); reintento {attempt + 1}/{retries} en {wait:.2f}s"
+            )
+            time.sleep(wait)
@@ -0,0 +1,307 @@
+"""
+Servicio de ingesta continua de Open-Meteo.
+
+En lugar de pedir datos nuevos cada vez que se ejecuta main.py, este proceso se queda en marcha
+y refresca cada localización por su cuenta:
+- Planificador: cada localización tiene su intervalo (INTERVALS, o DEFAULT_INTERVAL) con una
+  variación aleatoria (JITTER) para no lanzar todas las peticiones a la vez.
+- Las peticiones se hacen en un pool de hilos (fetch_location, con la sesión HTTP compartida y
+  la caché de http_cache.py) y los documentos pasan por una cola acotada (QUEUE_SIZE): si el
+  escritor se retrasa, los hilos de petición se bloquean en vez de acumular memoria.
+- Un único hilo escritor saca los documentos de la cola y los guarda por lotes
+  (WRITE_BATCH_SIZE documentos o cada FLUSH_INTERVAL segundos) en una sola transacción.
+- Después de cada lote guardado se llama a 'on_flush' (si se indica) con los documentos del
+  lote, desde el hilo escritor; por ejemplo, para etiquetar las horas nuevas con el
+  clasificador (scripts_3_3/inference.py).
+- Si el contenido de una captura es igual al de la última guardada de esa localización
+  (mismo hash, sin contar timestamp_captura), no se vuelve a guardar.
+- stop() (o Ctrl+C / SIGTERM con run_forever) deja de planificar, espera a las peticiones en
+  curso y guarda todo lo que quede en la cola antes de terminar.
+
+Ejecución:
+    python -m scripts_1_7_weather_apis.ingestion_daemon
+"""
+
+import hashlib
+import heapq
+import json
+import queue
+import random
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from . import metrics
+from .db_connection import close_connections, get_connection, transaction
+from .extract_openmeteo import (
+    MAX_WORKERS,
+    STORAGE_MODES,
+    URL,
+    fetch_location,
+    save_documents,
+)
+from .http_client import DEFAULT_TIMEOUT, get_session
+from .locations import LOCATIONS, resolve_locations
+from .payload_codec import PAYLOAD_ENCODINGS
+
+DEFAULT_INTERVAL = 15 * 60  # segundos entre refrescos de una misma localización
+INTERVALS = {}  # Intervalos propios por nombre de localización, p. ej. {"Sevilla": 5 * 60}
+JITTER = 0.1  # Variación aleatoria del intervalo (±10 %)
+QUEUE_SIZE = 64
+WRITE_BATCH_SIZE = 16
+FLUSH_INTERVAL = 5  # segundos máximos que un documento espera en el lote antes de guardarse
+
+INGEST_STATE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ingest_state (
+    lat TEXT NOT NULL,
+    lon TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    timestamp_captura TEXT,
+    PRIMARY KEY (lat, lon)
+)
+"""
+
+
+def content_hash(document):
+    """Hash del contenido de un documento sin contar timestamp_captura."""
+    content = {
+        key: value for key, value in document.items() if key != "timestamp_captura"
+    }
+    raw = json.dumps(content, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def load_ingest_state():
+    """Último hash guardado de cada localización: {(lat, lon): hash}."""
+    conn = get_connection()
+    with transaction():
+        conn.execute(INGEST_STATE_SCHEMA)
+    rows = conn.execute("SELECT lat, lon, content_hash FROM ingest_state").fetchall()
+    return {(lat, lon): digest for lat, lon, digest in rows}
+
+
+class IngestionDaemon:
+    """Planificador, pool de peticiones y escritor por lotes (ver el docstring del módulo)."""
+
+    def __init__(
+        self,
+        locations=None,
+        intervals=None,
+        jitter=JITTER,
+        max_workers=MAX_WORKERS,
+        queue_size=QUEUE_SIZE,
+        batch_size=WRITE_BATCH_SIZE,
+        flush_interval=FLUSH_INTERVAL,
+        url=URL,
+        timeout=DEFAULT_TIMEOUT,
+        storage="json",
+        encoding="json",
+        on_flush=None,
+    ):
+        if storage not in STORAGE_MODES:
+            raise ValueError(f"storage debe ser uno de {STORAGE_MODES}")
+        if encoding not in PAYLOAD_ENCODINGS:
+            raise ValueError(f"encoding debe ser uno de {PAYLOAD_ENCODINGS}")
+
+        self.locations = resolve_locations(
+            list(LOCATIONS) if locations is None else locations
+        )
+        self.intervals = {**INTERVALS, **(intervals or {})}
+        self.jitter = jitter
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.url = url
+        self.timeout = timeout
+        self.storage = storage
+        self.encoding = encoding
+        self.on_flush = on_flush
+
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.stats = {"fetched": 0, "written": 0, "skipped": 0, "errors": 0}
+        self._stats_lock = threading.Lock()
+
+        self._stop = threading.Event()
+        self._in_flight = set()
+        self._in_flight_lock = threading.Lock()
+        self._executor = None
+        self._threads = []
+
+    def next_delay(self, name):
+        """Segundos hasta el siguiente refresco de 'name' (su intervalo ± jitter)."""
+        interval = self.intervals.get(name, DEFAULT_INTERVAL)
+        return interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def _count(self, key, n=1):
+        with self._stats_lock:
+            self.stats[key] += n
+
+    # --- Planificador y peticiones ---
+
+    def _schedule_loop(self):
+        now = time.monotonic()
+        # Repartimos las primeras peticiones dentro del jitter para no lanzarlas todas a la vez
+        heap = [
+            (now + self.jitter * self.next_delay(name) * random.random(), name, lat, lon)
+            for name, lat, lon in self.locations
+        ]
+        heapq.heapify(heap)
+
+        while not self._stop.is_set():
+            due, name, lat, lon = heap[0]
+            wait = due - time.monotonic()
+            if wait > 0:
+                self._stop.wait(wait)
+                continue
+
+            heapq.heapreplace(heap, (due + self.next_delay(name), name, lat, lon))
+            with self._in_flight_lock:
+                if name in self._in_flight:
+                    # La petición anterior todavía no ha terminado: nos saltamos este turno
+                    continue
+                self._in_flight.add(name)
+            self._executor.submit(self._fetch, name, lat, lon)
+
+    def _fetch(self, name, lat, lon):
+        try:
+            document = fetch_location(lat, lon, self.url, get_session(), self.timeout)
+            self._count("fetched")
+            # Si la cola está llena esperamos (backpressure), salvo que estemos parando
+            while True:
+                try:
+                    self.queue.put((name, document), timeout=0.5)
+                    break
+                except queue.Full:
+                    if self._stop.is_set() and self._writer_stopped():
+                        return
+        except Exception as e:
+            self._count("errors")
+            print(f"❌ [ERROR] Fallo al pedir datos de {name}: {e}")
+        finally:
+            with self._in_flight_lock:
+                self._in_flight.discard(name)
+
+    # --- Escritor por lotes ---
+
+    def _writer_stopped(self):
+        return not self._threads[1].is_alive()
+
+    def _fetchers_done(self):
+        """Indica si ya no se va a encolar nada más (planificador parado y sin peticiones)."""
+        with self._in_flight_lock:
+            return not self._threads[0].is_alive() and not self._in_flight
+
+    def _write_loop(self):
+        last_hashes = load_ingest_state()
+        batch = []
+        deadline = None
+
+        while True:
+            wait = 0.5 if deadline is None else min(max(deadline - time.monotonic(), 0), 0.5)
+            try:
+                batch.append(self.queue.get(timeout=wait))
+                deadline = deadline or time.monotonic() + self.flush_interval
+            except queue.Empty:
+                if self._stop.is_set() and self._fetchers_done() and self.queue.empty():
+                    break
+
+            if batch and (len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                self._flush(batch, last_hashes)
+                batch, deadline = [], None
+
+        # Parada: guardamos lo que quede en el lote
+        if batch:
+            self._flush(batch, last_hashes)
+
+    def _flush(self, batch, last_hashes):
+        """Guarda un lote de documentos en una transacción, saltando los que no han cambiado."""
+        documents = {}
+        new_hashes = {}
+        for name, document in batch:
+            key = (document["lat"], document["lon"])
+            digest = content_hash(document)
+            if last_hashes.get(key) == digest or new_hashes.get(key, (None,))[0] == digest:
+                self._count("skipped")
+                continue
+            # Si en el lote hay dos capturas de la misma localización, se guarda la última
+            documents[name] = document
+            new_hashes[key] = (digest, document["timestamp_captura"])
+
+        if not documents:
+            return
+
+        try:
+            with transaction() as conn:
+                save_documents(documents, storage=self.storage, encoding=self.encoding)
+                conn.executemany(
+                    """
+                    INSERT INTO ingest_state (lat, lon, content_hash, timestamp_captura)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT (lat, lon) DO UPDATE SET
+                    content_hash = excluded.content_hash,
+                    timestamp_captura = excluded.timestamp_captura
+                    """,
+                    [(lat, lon, *values) for (lat, lon), values in new_hashes.items()],
+                )
+            last_hashes.update({key: values[0] for key, values in new_hashes.items()})
+            self._count("written", len(documents))
+        except Exception as e:
+            # La transacción se ha deshecho entera (documentos y hashes): el lote no cuenta
+            # como guardado y esas capturas se volverán a guardar en el siguiente refresco
+            self._count("errors")
+            metrics.record_error("ingest_flush", e, locations=list(documents))
+            print(f"❌ [ERROR] Fallo al guardar el lote: {e}")
+            return
+
+        if self.on_flush is not None:
+            try:
+                self.on_flush(documents)
+            except Exception as e:
+                print(f"❌ [ERROR] Fallo al procesar el lote guardado: {e}")
+
+    # --- Arranque y parada ---
+
+    def start(self):
+        """Arranca el planificador, el pool de peticiones y el escritor (en segundo plano)."""
+        self._stop.clear()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        self._threads = [
+            threading.Thread(target=self._schedule_loop, name="ingest-scheduler"),
+            threading.Thread(target=self._write_loop, name="ingest-writer"),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        """
+        Parada ordenada: deja de planificar, espera a las peticiones en curso y guarda
+        todo lo pendiente antes de volver.
+        """
+        self._stop.set()
+        self._threads[0].join()
+        self._executor.shutdown(wait=True)
+        self._threads[1].join()
+        print(
+            "Ingesta detenida: "
+            + ", ".join(f"{key}={value}" for key, value in self.stats.items())
+        )
+
+    def run_forever(self):
+        """Ejecuta el servicio hasta recibir Ctrl+C o SIGTERM."""
+        stop_requested = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: stop_requested.set())
+
+        self.start()
+        print(
+            f"Ingesta en marcha para {len(self.locations)} localizaciones "
+            "(Ctrl+C para parar)."
+        )
+        stop_requested.wait()
+        self.stop()
+        close_connections()
+
+
+if __name__ == "__main__":
+    IngestionDaemon().run_forever()
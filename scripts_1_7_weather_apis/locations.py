@@ -0,0 +1,50 @@
+"""
+Registro de localizaciones disponibles para la extracción.
+
+Antes las coordenadas estaban como constantes LAT/LON en extract_openmeteo.py y había que
+comentar/descomentar cada capital a mano. Ahora todas las capitales de provincia de Andalucía
+están registradas aquí por nombre y se pueden pedir todas a la vez.
+"""
+
+# Guardamos latitud y longitud como texto para que coincidan con lo que ya se guarda en la BD.
+LOCATIONS = {
+    "Sevilla": ("37.3886", "-5.9823"),
+    "Almeria": ("36.8340", "-2.4637"),
+    "Cadiz": ("36.5271", "-6.2886"),
+    "Cordoba": ("37.8882", "-4.7794"),
+    "Granada": ("37.1773", "-3.5986"),
+    "Huelva": ("37.2614", "-6.9447"),
+    "Jaen": ("37.7796", "-3.7849"),
+    "Malaga": ("36.7213", "-4.4214"),
+}
+
+DEFAULT_LOCATION = "Sevilla"
+
+
+def resolve_locations(names=None):
+    """
+    Devuelve una lista de tuplas (nombre, lat, lon) a partir de una lista de nombres.
+    Si no se indica ninguno, devuelve la localización por defecto.
+    """
+    if names is None:
+        names = [DEFAULT_LOCATION]
+    elif isinstance(names, str):
+        names = [names]
+
+    resolved = []
+    for name in names:
+        if name not in LOCATIONS:
+            raise KeyError(
+                f"Localización desconocida: '{name}'. Disponibles: {', '.join(LOCATIONS)}"
+            )
+        lat, lon = LOCATIONS[name]
+        resolved.append((name, lat, lon))
+    return resolved
+
+
+def location_name(lat, lon):
+    """Busca el nombre registrado para unas coordenadas (o None si no están registradas)."""
+    for name, coords in LOCATIONS.items():
+        if coords == (str(lat), str(lon)):
+            return name
+    return None
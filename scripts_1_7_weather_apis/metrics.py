@@ -0,0 +1,339 @@
+"""
+Instrumentación del proceso: métricas, eventos estructurados y perfilado por etapa.
+
+Hasta ahora el progreso solo se veía en las cabeceras y los print de main.py, y los errores que
+se capturan (en get_open_meteo, insert_data...) se imprimían y se perdían. Este módulo guarda
+en memoria, para todo el proceso y de forma segura entre hilos:
+- Contadores (inc), valores (set_gauge) y resúmenes (observe: número, suma y máximo), con
+  etiquetas. snapshot() los devuelve como diccionario y render_prometheus() en el formato de
+  texto de Prometheus (write_snapshot los guarda en un fichero .prom).
+- Eventos estructurados (log_event): una línea JSON por evento en el fichero configurado
+  (configure(log_path=...)); sin fichero no se escribe nada. record_error cuenta y registra
+  los errores que se capturan sin relanzarlos.
+- stage(nombre): mide una etapa (tiempo, filas de entrada y salida que indique quien la llama,
+  bytes leídos y escritos según /proc/self/io) y, con configure(profile_dir=...), la ejecuta
+  con cProfile, guarda el perfil (<etapa>.prof) e imprime las funciones más costosas.
+- InstrumentedConnection: conexión de sqlite3 que mide el tiempo de cada consulta (execute,
+  executemany y fetch*) por tipo de sentencia (select, insert...). Se usa como 'factory' en
+  sqlite3.connect.
+
+Solo usa la biblioteca estándar (cProfile se importa al perfilar) para no afectar al
+arranque de los subcomandos.
+"""
+
+import contextlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+PREFIX = "weather_"
+PROFILE_TOP = 15  # Funciones que se imprimen de cada perfil
+
+# Descripción y tipo de cada métrica (para las líneas # HELP / # TYPE de Prometheus)
+METRICS = {
+    "stage_seconds": ("summary", "Tiempo de reloj de cada etapa"),
+    "stage_runs_total": ("counter", "Ejecuciones de cada etapa por resultado"),
+    "stage_load_seconds": ("summary", "Tiempo de reconstruir la salida de una etapa saltada"),
+    "stage_rows_in": ("gauge", "Filas de entrada de la última ejecución de la etapa"),
+    "stage_rows_out": ("gauge", "Filas de salida de la última ejecución de la etapa"),
+    "stage_bytes_read_total": ("counter", "Bytes leídos durante la etapa (/proc/self/io)"),
+    "stage_bytes_written_total": ("counter", "Bytes escritos durante la etapa (/proc/self/io)"),
+    "http_request_seconds": ("summary", "Latencia de cada intento de petición HTTP"),
+    "http_retries_total": ("counter", "Reintentos de peticiones HTTP"),
+    "http_cache_total": ("counter", "Respuestas servidas desde la caché HTTP"),
+    "sqlite_query_seconds": ("summary", "Tiempo de las consultas a SQLite (incluye fetch)"),
+    "errors_total": ("counter", "Errores capturados (sin relanzar) por lugar y tipo"),
+    "dashboard_request_seconds": ("summary", "Tiempo de respuesta del servidor del dashboard"),
+    "dashboard_cache_hits_total": ("counter", "Aciertos de la caché de consultas del dashboard"),
+    "dashboard_cache_misses_total": ("counter", "Fallos de la caché de consultas del dashboard"),
+}
+
+_lock = threading.Lock()
+_counters = {}  # (nombre, etiquetas) -> valor
+_gauges = {}
+_summaries = {}  # (nombre, etiquetas) -> [número, suma, máximo]
+_config = {"log_path": None, "profile_dir": None}
+
+
+def configure(log_path=None, profile_dir=None):
+    """Fichero de eventos (JSON por líneas) y carpeta de perfiles (None: desactivados)."""
+    _config.update(log_path=log_path, profile_dir=profile_dir)
+
+
+def reset():
+    """Borra todas las métricas acumuladas."""
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _summaries.clear()
+
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name, value=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def set_gauge(name, value, **labels):
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def observe(name, value, **labels):
+    key = _key(name, labels)
+    with _lock:
+        summary = _summaries.setdefault(key, [0, 0.0, value])
+        summary[0] += 1
+        summary[1] += value
+        summary[2] = max(summary[2], value)
+
+
+@contextlib.contextmanager
+def timer(name, **labels):
+    """Mide en segundos el bloque y lo añade al resumen 'name'."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+def log_event(event, **fields):
+    """Escribe el evento como una línea JSON en el fichero configurado (si lo hay)."""
+    path = _config["log_path"]
+    if path is None:
+        return
+    record = {"ts": datetime.now().isoformat(timespec="milliseconds"), "event": event, **fields}
+    line = json.dumps(record, ensure_ascii=False, default=str)
+    with _lock:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+def record_error(where, error, **fields):
+    """Cuenta y registra un error que se ha capturado (el llamador decide qué imprimir)."""
+    inc("errors_total", where=where, type=type(error).__name__)
+    log_event("error", where=where, type=type(error).__name__, message=str(error), **fields)
+
+
+def snapshot():
+    """Copia de todas las métricas: {"counters"|"gauges"|"summaries": [{name, labels, ...}]}."""
+    with _lock:
+        return {
+            "counters": [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in _counters.items()
+            ],
+            "gauges": [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in _gauges.items()
+            ],
+            "summaries": [
+                {"name": name, "labels": dict(labels), "count": c, "sum": s, "max": m}
+                for (name, labels), (c, s, m) in _summaries.items()
+            ],
+        }
+
+
+def _labels_text(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in labels
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+def render_prometheus():
+    """Métricas en el formato de texto de Prometheus (cada resumen con _count, _sum y _max)."""
+    with _lock:
+        series = {}
+        for (name, labels), value in _counters.items():
+            series.setdefault(name, []).append(f"{PREFIX}{name}{_labels_text(labels)} {value}")
+        for (name, labels), value in _gauges.items():
+            series.setdefault(name, []).append(f"{PREFIX}{name}{_labels_text(labels)} {value}")
+        for (name, labels), (count, total, maximum) in _summaries.items():
+            text = _labels_text(labels)
+            series.setdefault(name, []).extend(
+                [f"{PREFIX}{name}_count{text} {count}", f"{PREFIX}{name}_sum{text} {total:.6f}"]
+            )
+            # Un resumen solo admite _count y _sum: el máximo va como gauge aparte
+            series.setdefault(f"{name}_max", []).append(
+                f"{PREFIX}{name}_max{text} {maximum:.6f}"
+            )
+
+    lines = []
+    for name in sorted(series):
+        if name.endswith("_max") and name[: -len("_max")] in METRICS:
+            kind, description = "gauge", METRICS[name[: -len("_max")]][1] + " (máximo)"
+        else:
+            kind, description = METRICS.get(name, ("untyped", name))
+        lines.append(f"# HELP {PREFIX}{name} {description}")
+        lines.append(f"# TYPE {PREFIX}{name} {kind}")
+        lines.extend(sorted(series[name]))
+    return "\n".join(lines) + "\n"
+
+
+def write_snapshot(path):
+    """Guarda las métricas en 'path' en formato Prometheus (se sustituye el fichero)."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(render_prometheus())
+    os.replace(tmp_path, path)
+
+
+def io_counters():
+    """Bytes leídos y escritos por el proceso hasta ahora (rchar/wchar), o None si no hay /proc."""
+    try:
+        with open("/proc/self/io") as f:
+            values = dict(line.split(":") for line in f if ":" in line)
+        return int(values["rchar"]), int(values["wchar"])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+@contextlib.contextmanager
+def _profiled(name):
+    """Ejecuta el bloque con cProfile si hay carpeta de perfiles configurada."""
+    profile_dir = _config["profile_dir"]
+    if profile_dir is None:
+        yield None
+        return
+
+    import cProfile
+    import pstats
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        os.makedirs(profile_dir, exist_ok=True)
+        path = os.path.join(profile_dir, f"{name}.prof")
+        profiler.dump_stats(path)
+        print(f"\n--- PERFIL DE LA ETAPA '{name}' ({path}) ---")
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(PROFILE_TOP)
+        log_event("profile", stage=name, path=path)
+
+
+@contextlib.contextmanager
+def stage(name):
+    """
+    Mide una etapa. Devuelve un diccionario en el que el llamador puede dejar 'rows_in' y
+    'rows_out'; al terminar se registran las métricas y el evento 'stage' con el resultado.
+    """
+    info = {"rows_in": None, "rows_out": None}
+    io_start = io_counters()
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        with _profiled(name):
+            yield info
+    except BaseException as e:
+        status = "error"
+        record_error(f"stage:{name}", e)
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        io_end = io_counters()
+        read = written = None
+        if io_start is not None and io_end is not None:
+            read, written = io_end[0] - io_start[0], io_end[1] - io_start[1]
+            inc("stage_bytes_read_total", read, stage=name)
+            inc("stage_bytes_written_total", written, stage=name)
+        observe("stage_seconds", seconds, stage=name)
+        inc("stage_runs_total", stage=name, status=status)
+        for field in ("rows_in", "rows_out"):
+            if info[field] is not None:
+                set_gauge(f"stage_{field}", info[field], stage=name)
+        log_event(
+            "stage",
+            stage=name,
+            status=status,
+            seconds=round(seconds, 6),
+            rows_in=info["rows_in"],
+            rows_out=info["rows_out"],
+            bytes_read=read,
+            bytes_written=written,
+        )
+
+
+def skip_stage(name):
+    """Registra una etapa que se ha saltado (sin cambios en su entrada)."""
+    inc("stage_runs_total", stage=name, status="skipped")
+    log_event("stage", stage=name, status="skipped")
+
+
+# --- SQLite ---
+
+
+def _operation(sql):
+    """Tipo de sentencia (primera palabra en minúsculas: select, insert, create...)."""
+    words = sql.lstrip().split(None, 1)
+    return words[0].lower() if words else "other"
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor que añade a 'sqlite_query_seconds' el tiempo de execute y de los fetch."""
+
+    _operation = "other"
+
+    def execute(self, sql, parameters=()):
+        self._operation = _operation(sql)
+        with timer("sqlite_query_seconds", op=self._operation):
+            return super().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._operation = _operation(sql)
+        with timer("sqlite_query_seconds", op=self._operation):
+            return super().executemany(sql, seq_of_parameters)
+
+    # Los fetch se suman al tiempo de la consulta pero no cuentan como consultas nuevas
+    def _timed_fetch(self, fetch, *args):
+        start = time.perf_counter()
+        try:
+            return fetch(*args)
+        finally:
+            key = _key("sqlite_query_seconds", {"op": self._operation})
+            elapsed = time.perf_counter() - start
+            with _lock:
+                summary = _summaries.setdefault(key, [0, 0.0, 0.0])
+                summary[1] += elapsed
+
+    def fetchone(self):
+        return self._timed_fetch(super().fetchone)
+
+    def fetchmany(self, size=None):
+        if size is None:
+            return self._timed_fetch(super().fetchmany)
+        return self._timed_fetch(super().fetchmany, size)
+
+    def fetchall(self):
+        return self._timed_fetch(super().fetchall)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """
+    Conexión cuyos cursores son InstrumentedCursor. Connection.execute no pasa por cursor(),
+    así que se redefinen también los atajos execute y executemany.
+    """
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
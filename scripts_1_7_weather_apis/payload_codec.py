@@ -0,0 +1,197 @@
+"""
+Codificación de los payloads que se guardan en la tabla JSON ('openmeteo').
+
+Cada captura repite literalmente las claves de sus ~168 objetos horarios ("date", "weather",
+"apparent_temp", "precipitation": {"total", "type"}, ...). Además del texto JSON de siempre,
+insert_data puede guardar el payload como BLOB binario:
+- "zstd-json": el mismo JSON comprimido con zstd.
+- "arrow": las horas como tabla Arrow IPC (columnas tipadas, 'weather' y 'summary' codificadas
+  como diccionario y compresión zstd) y el resto del documento como metadatos.
+
+Con 400 capturas sintéticas la base de datos pasa de ~13,5 MB en JSON a ~1,6 MB con
+"zstd-json" y ~2,4 MB con "arrow" (cada BLOB lleva su propio esquema). "zstd-json" además se
+lee igual de rápido que el texto; "arrow" es más lento de leer porque hay que volver a JSON.
+
+Los BLOB empiezan por una cabecera de 4 bytes (ENCODING_MAGIC) que identifica la codificación,
+así que los lectores la detectan solos: decode_payload devuelve el diccionario y payload_json el
+texto JSON (también registrado como función SQL 'payload_json' en las conexiones de SQLite).
+
+pyarrow y Polars solo se importan al codificar o decodificar un BLOB: quien solo guarda o lee
+texto JSON (por ejemplo, una ejecución de "main.py fetch") no paga su tiempo de carga.
+"""
+
+import functools
+import json
+import struct
+import threading
+
+PAYLOAD_ENCODINGS = ("json", "zstd-json", "arrow")
+ENCODING_MAGIC = {"zstd-json": b"ZJS1", "arrow": b"ARW1"}
+ZSTD_LEVEL = 9
+
+# Último BLOB decodificado por payload_json en cada hilo: en una consulta SQL se llama una vez
+# por cada campo que se extrae de la misma fila
+_last_decoded = threading.local()
+
+
+@functools.cache
+def _codec():
+    import pyarrow as pa
+
+    return pa.Codec("zstd", compression_level=ZSTD_LEVEL)
+
+
+@functools.cache
+def hourly_arrow_schema():
+    """Esquema de cada objeto de 'hourly.data' (en el mismo orden que build_document)."""
+    import pyarrow as pa
+
+    precip_type = pa.struct([("total", pa.float64()), ("type", pa.string())])
+    return pa.schema(
+        [
+            ("date", pa.string()),
+            ("weather", pa.dictionary(pa.int16(), pa.string())),
+            ("temperature", pa.float64()),
+            ("humidity", pa.int64()),
+            ("apparent_temp", pa.float64()),
+            ("precipitation", precip_type),
+            ("precip_prob", pa.int64()),
+            ("summary", pa.dictionary(pa.int16(), pa.string())),
+        ]
+    )
+
+
+def _encode_zstd_json(data):
+    raw = json.dumps(data).encode("utf-8")
+    # El tamaño sin comprimir va en la cabecera (pyarrow lo necesita para descomprimir)
+    return (
+        ENCODING_MAGIC["zstd-json"]
+        + struct.pack("<Q", len(raw))
+        + _codec().compress(raw, asbytes=True)
+    )
+
+
+def _decode_zstd_json(blob):
+    (size,) = struct.unpack_from("<Q", blob, 4)
+    return (
+        _codec().decompress(blob[12:], decompressed_size=size, asbytes=True).decode("utf-8")
+    )
+
+
+def _encode_arrow(data):
+    import pyarrow as pa
+
+    hourly = data.get("hourly")
+    rows = hourly.get("data") if isinstance(hourly, dict) else None
+    if not isinstance(rows, list) or set(hourly) != {"data"}:
+        # Documento sin la forma habitual: lo guardamos como JSON comprimido
+        return _encode_zstd_json(data)
+
+    try:
+        table = pa.Table.from_pylist(rows, schema=hourly_arrow_schema())
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return _encode_zstd_json(data)
+    if table.to_pylist() != rows:
+        # Alguna hora trae campos de más o de menos: no se podría reconstruir igual
+        return _encode_zstd_json(data)
+
+    document = {key: value for key, value in data.items() if key != "hourly"}
+    # Posición de 'hourly' entre las claves, para reconstruir el documento en el mismo orden
+    position = list(data).index("hourly")
+    table = table.replace_schema_metadata(
+        {"document": json.dumps(document), "hourly_position": str(position)}
+    )
+
+    sink = pa.BufferOutputStream()
+    options = pa.ipc.IpcWriteOptions(compression="zstd")
+    with pa.ipc.new_stream(sink, table.schema, options=options) as writer:
+        writer.write_table(table)
+    return ENCODING_MAGIC["arrow"] + sink.getvalue().to_pybytes()
+
+
+def _read_arrow(blob):
+    import pyarrow as pa
+
+    table = pa.ipc.open_stream(blob[4:]).read_all()
+    metadata = table.schema.metadata
+    return (
+        table,
+        list(json.loads(metadata[b"document"]).items()),
+        int(metadata[b"hourly_position"]),
+    )
+
+
+def _decode_arrow(blob):
+    table, items, position = _read_arrow(blob)
+    items.insert(position, ("hourly", {"data": table.to_pylist()}))
+    return dict(items)
+
+
+def _arrow_to_json(blob):
+    """Texto JSON de un payload "arrow" (las horas se serializan con Polars, sin pasar por dicts)."""
+    import polars as pl
+
+    table, items, position = _read_arrow(blob)
+    parts = [f"{json.dumps(key)}: {json.dumps(value)}" for key, value in items]
+    rows = pl.from_arrow(table).write_ndjson().splitlines()
+    parts.insert(position, f'"hourly": {{"data": [{", ".join(rows)}]}}')
+    return "{" + ", ".join(parts) + "}"
+
+
+def encode_payload(data, encoding="json"):
+    """Codifica el diccionario 'data': texto JSON ("json") o BLOB ("zstd-json", "arrow")."""
+    if encoding == "json":
+        return json.dumps(data)
+    if encoding == "zstd-json":
+        return _encode_zstd_json(data)
+    if encoding == "arrow":
+        return _encode_arrow(data)
+    raise ValueError(f"encoding debe ser uno de {PAYLOAD_ENCODINGS}")
+
+
+def payload_encoding(payload):
+    """Codificación de un payload leído de la base de datos."""
+    if isinstance(payload, str):
+        return "json"
+    for encoding, magic in ENCODING_MAGIC.items():
+        if payload[:4] == magic:
+            return encoding
+    raise ValueError("Payload con codificación desconocida")
+
+
+def decode_payload(payload):
+    """Devuelve el diccionario de un payload, sea cual sea su codificación."""
+    encoding = payload_encoding(payload)
+    if encoding == "json":
+        return json.loads(payload)
+    if encoding == "zstd-json":
+        return json.loads(_decode_zstd_json(payload))
+    return _decode_arrow(payload)
+
+
+def payload_json(payload):
+    """Devuelve el texto JSON de un payload, sea cual sea su codificación."""
+    if payload is None:
+        return None
+    encoding = payload_encoding(payload)
+    if encoding == "json":
+        return payload
+    if getattr(_last_decoded, "blob", None) == payload:
+        return _last_decoded.text
+
+    if encoding == "zstd-json":
+        text = _decode_zstd_json(payload)
+    else:
+        text = _arrow_to_json(payload)
+    _last_decoded.blob, _last_decoded.text = payload, text
+    return text
+
+
+# Expresión SQL con el texto JSON del payload: los textos se dejan tal cual y solo los BLOB
+# pasan por payload_json (registrada en cada conexión con register_payload_functions)
+PAYLOAD_SQL = "CASE WHEN typeof(payload) = 'blob' THEN payload_json(payload) ELSE payload END"
+
+
+def register_payload_functions(conn):
+    """Registra la función SQL payload_json(payload) en una conexión de SQLite."""
+    conn.create_function("payload_json", 1, payload_json, deterministic=True)
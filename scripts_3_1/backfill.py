@@ -0,0 +1,284 @@
+"""
+Relleno del histórico (backfill) con la API histórica de Open-Meteo.
+
+get_open_meteo solo trae el pronóstico de los próximos días; para tener años de datos por
+horas se piden las observaciones a la API 'archive' (ARCHIVE_URL). El rango de fechas se
+divide, para cada localización, en tramos de CHUNK_DAYS días que se piden en paralelo con la
+sesión HTTP compartida (y sus reintentos, ver http_client.py). Como mucho hay 2 * max_workers
+tramos en vuelo: según llegan se convierten con hourly_to_frame y se escriben por lotes de
+BATCH_CHUNKS tramos en la capa silver en Parquet (Tiempo_por_horas, particionada por
+localización y día), así que el rango completo nunca está en memoria.
+
+Los tramos ya escritos se apuntan en un checkpoint (CHECKPOINT_PATH) después de cada lote;
+si el proceso se interrumpe, al volver a lanzarlo solo se piden los que faltan (como mucho se
+repiten los del lote que no llegó a escribirse). Los tramos que fallan tampoco se apuntan y se
+vuelven a pedir en la siguiente ejecución.
+
+Los tramos empiezan y terminan en días completos, así que cada partición (localización, día)
+sale de un único tramo; las horas observadas sustituyen al pronóstico que hubiera de esos días.
+
+La API histórica no tiene probabilidad de precipitación, así que precip_prob queda nula en
+estas horas. No se sustituye por la precipitación observada: precip_prob es una probabilidad
+de pronóstico y el clima que predice el clasificador ya depende de si llovió. Lo observado
+está en precip_mm. El RandomForest admite los nulos; el clustering descarta estas filas.
+
+Ejecución:
+    python -m scripts_3_1.backfill --start 2020-01-01 [--end 2025-12-31] [--locations Sevilla Malaga]
+"""
+
+import argparse
+import json
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import date, timedelta
+from itertools import islice
+
+import polars as pl
+from scripts_1_7_weather_apis import metrics
+from scripts_1_7_weather_apis.db_connection import BASE_DIR
+from scripts_1_7_weather_apis.hourly_transform import hourly_to_frame
+from scripts_1_7_weather_apis.http_client import get_json, get_session
+from scripts_1_7_weather_apis.locations import LOCATIONS, resolve_locations
+
+from .data_processor import HOURLY_FIELDS, hourly_plan, parse_hourly_dates
+from .parquet_store import export_to_parquet
+
+ARCHIVE_URL = "https://archive-api.open-meteo.com/v1/archive"
+# La API histórica no tiene probabilidad de precipitación: precip_prob queda nula
+ARCHIVE_HOURLY_VARS = "temperature_2m,relative_humidity_2m,apparent_temperature,precipitation,weather_code"
+ARCHIVE_DELAY_DAYS = 5  # La API histórica va unos días por detrás de hoy
+ARCHIVE_TIMEOUT = 60  # segundos por petición (cada tramo son miles de horas)
+CHUNK_DAYS = 90  # Días por petición
+MAX_WORKERS = 4  # Peticiones simultáneas a la API
+BATCH_CHUNKS = 16  # Tramos por escritura en Parquet (y por actualización del checkpoint)
+TABLE_NAME = "Tiempo_por_horas"
+CHECKPOINT_PATH = os.path.join(BASE_DIR, "data_output", "backfill_checkpoint.json")
+
+
+def date_chunks(start, end, days=CHUNK_DAYS):
+    """Divide el rango [start, end] (ambos incluidos) en tramos de 'days' días: lista de (inicio, fin)."""
+    chunks = []
+    while start <= end:
+        chunk_end = min(start + timedelta(days=days - 1), end)
+        chunks.append((start, chunk_end))
+        start = chunk_end + timedelta(days=1)
+    return chunks
+
+
+def chunk_key(lat, lon, start, end):
+    """Clave de un tramo en el checkpoint ("lat,lon:inicio:fin")."""
+    return f"{lat},{lon}:{start.isoformat()}:{end.isoformat()}"
+
+
+def load_checkpoint(path=None):
+    """Conjunto de claves de los tramos ya guardados."""
+    path = path or CHECKPOINT_PATH
+    if not os.path.exists(path):
+        return set()
+    with open(path, encoding="utf-8") as f:
+        return set(json.load(f)["done"])
+
+
+def save_checkpoint(done, path=None):
+    """
+    Guarda el checkpoint. Se escribe en un fichero temporal y se renombra, para que una
+    interrupción a mitad no deje un checkpoint corrupto.
+    """
+    path = path or CHECKPOINT_PATH
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"done": sorted(done)}, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def build_archive_params(lat, lon, start, end):
+    """Parámetros de la API histórica para unas coordenadas y un tramo de días."""
+    return {
+        "latitude": lat,
+        "longitude": lon,
+        "start_date": start.isoformat(),
+        "end_date": end.isoformat(),
+        "hourly": ARCHIVE_HOURLY_VARS,
+        "timezone": "auto",
+    }
+
+
+def archive_frame(hourly_raw, lat, lon):
+    """
+    Filas de Tiempo_por_horas a partir del bloque 'hourly' de la API histórica, con las
+    mismas columnas y tipos que exporta get_hourly_weather_dataframe (precip_prob, nula).
+    """
+    rows = hourly_to_frame(hourly_raw).with_columns(
+        pl.lit(str(lat)).alias("lat"), pl.lit(str(lon)).alias("lon")
+    )
+    rows = rows.select(["lat", "lon", *HOURLY_FIELDS])
+    return hourly_plan(parse_hourly_dates(rows)).drop("precipitation")
+
+
+def fetch_chunk(lat, lon, start, end, url=ARCHIVE_URL, session=None, timeout=ARCHIVE_TIMEOUT):
+    """Pide un tramo a la API histórica y lo devuelve como filas de Tiempo_por_horas."""
+    # Sin la caché HTTP: son respuestas grandes que no se vuelven a pedir
+    data = get_json(
+        url,
+        params=build_archive_params(lat, lon, start, end),
+        session=session,
+        timeout=timeout,
+        cache=False,
+    )
+    return archive_frame(data["hourly"], lat, lon)
+
+
+def store_batch(frames, keys, done, checkpoint_path):
+    """Escribe un lote de tramos en Parquet y después los apunta en el checkpoint."""
+    if not frames:
+        return 0
+    df = pl.concat(frames)
+    export_to_parquet(df, TABLE_NAME)
+    done.update(keys)
+    save_checkpoint(done, checkpoint_path)
+    metrics.inc("backfill_chunks_total", len(keys), status="ok")
+    frames.clear()
+    keys.clear()
+    return df.height
+
+
+def backfill(
+    start,
+    end=None,
+    locations=None,
+    chunk_days=CHUNK_DAYS,
+    max_workers=MAX_WORKERS,
+    batch_chunks=BATCH_CHUNKS,
+    url=ARCHIVE_URL,
+    checkpoint_path=None,
+    restart=False,
+):
+    """
+    Rellena Tiempo_por_horas con las horas observadas entre 'start' y 'end' (fechas, ambas
+    incluidas; por defecto 'end' es hoy menos ARCHIVE_DELAY_DAYS) de las localizaciones
+    indicadas (por defecto, todas las del registro). Continúa desde el checkpoint salvo que
+    se indique 'restart'. Devuelve (filas escritas, lista de tramos fallidos).
+    """
+    end = end or date.today() - timedelta(days=ARCHIVE_DELAY_DAYS)
+    if start > end:
+        raise ValueError(f"El inicio ({start}) es posterior al final ({end})")
+    checkpoint_path = checkpoint_path or CHECKPOINT_PATH
+    if restart and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+    done = load_checkpoint(checkpoint_path)
+    chunks = [
+        (name, lat, lon, chunk_start, chunk_end)
+        for name, lat, lon in resolve_locations(list(LOCATIONS) if locations is None else locations)
+        for chunk_start, chunk_end in date_chunks(start, end, chunk_days)
+    ]
+    pending = [c for c in chunks if chunk_key(*c[1:]) not in done]
+    print(
+        f"Backfill {start} → {end}: {len(pending)} tramos pendientes de {len(chunks)} "
+        f"({len(chunks) - len(pending)} ya guardados)"
+    )
+
+    session = get_session()
+    frames, keys, failed = [], [], []
+    rows = 0
+    todo = iter(pending)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+
+        def submit(chunk):
+            _, lat, lon, chunk_start, chunk_end = chunk
+            futures[
+                executor.submit(fetch_chunk, lat, lon, chunk_start, chunk_end, url, session)
+            ] = chunk
+
+        # Solo 2 * max_workers tramos en vuelo: el siguiente se pide cuando termina uno
+        futures = {}
+        for chunk in islice(todo, 2 * max_workers):
+            submit(chunk)
+
+        while futures:
+            finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in finished:
+                chunk = futures.pop(future)
+                name, lat, lon, chunk_start, chunk_end = chunk
+                try:
+                    frames.append(future.result())
+                    keys.append(chunk_key(lat, lon, chunk_start, chunk_end))
+                except Exception as e:
+                    metrics.inc("backfill_chunks_total", status="error")
+                    metrics.record_error(
+                        "backfill",
+                        e,
+                        location=name,
+                        start=chunk_start.isoformat(),
+                        end=chunk_end.isoformat(),
+                    )
+                    print(f"❌ [ERROR] Fallo al pedir {name} ({chunk_start} → {chunk_end}): {e}")
+                    failed.append(chunk)
+                next_chunk = next(todo, None)
+                if next_chunk is not None:
+                    submit(next_chunk)
+
+            if len(frames) >= batch_chunks:
+                rows += store_batch(frames, keys, done, checkpoint_path)
+
+    rows += store_batch(frames, keys, done, checkpoint_path)
+
+    print(f"✅ [OK] Backfill: {rows} horas guardadas en {TABLE_NAME}")
+    if failed:
+        print(
+            f"⚠️ {len(failed)} tramos han fallado; se volverán a pedir al relanzar el backfill"
+        )
+    return rows, failed
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Rellenar el histórico por horas con la API histórica de Open-Meteo"
+    )
+    parser.add_argument(
+        "--start", type=date.fromisoformat, required=True, help="primer día (AAAA-MM-DD)"
+    )
+    parser.add_argument(
+        "--end",
+        type=date.fromisoformat,
+        help=f"último día (por defecto, hoy menos {ARCHIVE_DELAY_DAYS} días)",
+    )
+    parser.add_argument(
+        "--locations",
+        nargs="+",
+        choices=list(LOCATIONS),
+        help="localizaciones (por defecto, todas las del registro)",
+    )
+    parser.add_argument("--chunk-days", type=int, default=CHUNK_DAYS, help="días por petición")
+    parser.add_argument(
+        "--workers", type=int, default=MAX_WORKERS, help="peticiones simultáneas"
+    )
+    parser.add_argument("--url", default=ARCHIVE_URL, help="URL de la API histórica")
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="Ignorar el checkpoint y pedir de nuevo todos los tramos",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with metrics.stage("backfill") as info:
+        rows, failed = backfill(
+            args.start,
+            args.end,
+            locations=args.locations,
+            chunk_days=args.chunk_days,
+            max_workers=args.workers,
+            url=args.url,
+            restart=args.restart,
+        )
+        info["rows_out"] = rows
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,223 @@
+"""
+Capa de datos del dashboard: agregación y reducción de puntos antes de dibujar.
+
+Con meses de histórico de varias localizaciones, pasar todas las filas horarias a Plotly hace
+que el HTML crezca sin límite (cada punto va escrito en el fichero) y que el navegador se
+atasque. Aquí se prepara en Polars lo que de verdad se dibuja, con un tamaño acotado:
+- Heatmap: media de temperatura por día y hora (una celda por día × 24 horas, en lugar de
+  una fila por hora y localización). Con más de MAX_HEATMAP_COLUMNS días, cada columna agrupa
+  varios días seguidos.
+- Humedad vs. sensación térmica: por debajo de MAX_SCATTER_POINTS se dibujan los puntos tal
+  cual; por encima se agrupan en celdas (HUMIDITY_BIN × APPARENT_TEMP_BIN) con la temperatura
+  y la lluvia medias, y el tamaño del marcador indica cuántas horas caen en cada celda.
+- Serie diaria: si hay más de MAX_SERIES_POINTS días, la temperatura media se reduce con LTTB
+  (Largest-Triangle-Three-Buckets, conserva la forma de la curva) y la lluvia se suma por
+  periodos de varios días.
+- Por encima de WEBGL_THRESHOLD puntos las trazas de dispersión se dibujan con Scattergl.
+"""
+
+import math
+
+import numpy as np
+import polars as pl
+import plotly.graph_objects as go
+
+MAX_SCATTER_POINTS = 5_000
+MAX_SERIES_POINTS = 500
+MAX_HEATMAP_COLUMNS = 180
+WEBGL_THRESHOLD = 1_000
+
+HUMIDITY_BIN = 2  # % de humedad relativa por celda
+APPARENT_TEMP_BIN = 0.5  # °C de sensación térmica por celda
+
+
+def heatmap_grid(df_h, max_columns=MAX_HEATMAP_COLUMNS):
+    """
+    Media de temperatura por día y hora: devuelve (días, horas, matriz, días por columna)
+    listos para go.Heatmap. Las celdas sin datos quedan a None.
+    """
+    df_h = df_h.drop_nulls(["date", "temperature"])
+    n_days = df_h["date"].dt.date().n_unique()
+    days_per_column = max(math.ceil(n_days / max_columns), 1)
+    day = pl.col("date").dt.date()
+    if days_per_column > 1:
+        # Cada columna empieza en el primer día de su grupo
+        day = day.dt.truncate(f"{days_per_column}d")
+
+    grid = (
+        df_h.lazy()
+        .group_by(day.alias("dia"), pl.col("date").dt.hour().alias("hora"))
+        .agg(pl.col("temperature").mean().round(2))
+        .collect()
+        .pivot(on="dia", index="hora", values="temperature", sort_columns=True)
+        .sort("hora")
+    )
+    days = grid.columns[1:]
+    hours = grid["hora"].to_list()
+    z = grid.select(days).to_numpy().tolist()
+    # NaN → None para que Plotly deje la celda vacía
+    z = [[None if v is None or math.isnan(v) else v for v in row] for row in z]
+    return days, hours, z, days_per_column
+
+
+def binned_scatter(df_h, humidity_bin=HUMIDITY_BIN, apparent_bin=APPARENT_TEMP_BIN):
+    """
+    Agrupa los puntos humedad/sensación térmica en celdas. Cada celda trae el centro, el número
+    de horas ('n') y las medias de temperatura y lluvia.
+    """
+    return (
+        df_h.lazy()
+        .drop_nulls(["humidity", "apparent_temp"])
+        .with_columns(
+            ((pl.col("humidity") / humidity_bin).floor() * humidity_bin + humidity_bin / 2)
+            .alias("humidity"),
+            (
+                (pl.col("apparent_temp") / apparent_bin).floor() * apparent_bin
+                + apparent_bin / 2
+            ).alias("apparent_temp"),
+        )
+        .group_by("humidity", "apparent_temp")
+        .agg(
+            pl.len().alias("n"),
+            pl.col("temperature").mean().round(2),
+            pl.col("precip_mm").fill_null(0).mean().round(2),
+        )
+        .sort("humidity", "apparent_temp")
+        .collect()
+    )
+
+
+def lttb(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets: índices de los 'n_out' puntos de (x, y) que mejor
+    conservan la forma de la serie. Siempre incluye el primero y el último.
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # Cubos intermedios (el primer y el último punto van solos)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        # Punto medio del cubo siguiente (o el último punto, para el último cubo)
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        # Área del triángulo entre el punto elegido anterior, cada candidato y la media
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def daily_series(df_d, max_points=MAX_SERIES_POINTS):
+    """
+    Serie diaria para el gráfico dual: devuelve (temperatura, lluvia, días por barra).
+    La temperatura media se reduce con LTTB y la lluvia se suma por periodos si hay
+    más de 'max_points' días.
+    """
+    df_d = df_d.drop_nulls("date_no_time").sort("date_no_time")
+    if df_d.height <= max_points:
+        return df_d.select("date_no_time", "temp_avg"), df_d.select(
+            "date_no_time", "precip_total_diaria"
+        ), 1
+
+    temp = df_d.select("date_no_time", "temp_avg").drop_nulls("temp_avg")
+    x = temp["date_no_time"].cast(pl.Int64).to_numpy()
+    temp = temp[lttb(x, temp["temp_avg"].to_numpy(), max_points)]
+
+    days_per_bar = math.ceil(df_d.height / max_points)
+    precip = (
+        df_d.group_by_dynamic("date_no_time", every=f"{days_per_bar}d")
+        .agg(pl.col("precip_total_diaria").fill_null(0).sum().round(2))
+    )
+    return temp, precip, days_per_bar
+
+
+def heatmap_trace(df_h, max_columns=MAX_HEATMAP_COLUMNS):
+    """Traza go.Heatmap con la temperatura media por día y hora."""
+    days, hours, temps, days_per_column = heatmap_grid(df_h, max_columns)
+    label = "Día" if days_per_column == 1 else f"Desde (grupos de {days_per_column} días)"
+    return go.Heatmap(
+        x=days,
+        y=hours,
+        z=temps,
+        colorscale="RdYlBu_r",
+        colorbar=dict(title="Temp (°C)", len=0.3, y=0.87),
+        hovertemplate=label + ": %{x}<br>Hora: %{y}<br>Temp. media: %{z} °C<extra></extra>",
+    )
+
+
+def daily_traces(df_d, max_points=MAX_SERIES_POINTS):
+    """Trazas del gráfico dual: barras de lluvia y línea de temperatura media."""
+    temp_series, precip_series, days_per_bar = daily_series(df_d, max_points)
+    bars = go.Bar(
+        x=precip_series["date_no_time"],
+        y=precip_series["precip_total_diaria"],
+        name="Lluvia (mm)" if days_per_bar == 1 else f"Lluvia (mm / {days_per_bar} días)",
+        marker_color="rgba(52, 152, 219, 0.6)",
+    )
+    line = go.Scatter(
+        x=temp_series["date_no_time"],
+        y=temp_series["temp_avg"],
+        name="Temp. Media (°C)",
+        line=dict(color="#e74c3c", width=4),
+    )
+    return bars, line
+
+
+def scatter_trace_class(n_points, threshold=WEBGL_THRESHOLD):
+    """go.Scattergl (WebGL) si hay muchos puntos; go.Scatter (SVG) si no."""
+    return go.Scattergl if n_points > threshold else go.Scatter
+
+
+def humidity_scatter_trace(df_h, max_points=MAX_SCATTER_POINTS):
+    """Traza humedad vs. sensación térmica (puntos originales o agrupados en celdas)."""
+    points = df_h.drop_nulls(["humidity", "apparent_temp"])
+    marker = dict(colorscale="RdYlBu_r", colorbar=dict(title="Temp (°C)", len=0.3, y=0.5))
+
+    if points.height <= max_points:
+        size = points["precip_mm"].fill_null(0)
+        trace_class = scatter_trace_class(points.height)
+        return trace_class(
+            x=points["humidity"],
+            y=points["apparent_temp"],
+            mode="markers",
+            name="Horas",
+            marker=dict(
+                marker,
+                color=points["temperature"],
+                size=(4 + 4 * size.sqrt()).to_list(),
+            ),
+            customdata=size.to_list(),
+            hovertemplate="Humedad: %{x}%<br>Sensación: %{y} °C<br>Lluvia: %{customdata} mm",
+        )
+
+    cells = binned_scatter(points)
+    trace_class = scatter_trace_class(cells.height)
+    return trace_class(
+        x=cells["humidity"],
+        y=cells["apparent_temp"],
+        mode="markers",
+        name=f"Horas (agrupadas, {points.height} puntos)",
+        marker=dict(
+            marker,
+            color=cells["temperature"],
+            # El tamaño crece con el número de horas de la celda (escala logarítmica)
+            size=(3 + 2 * cells["n"].log1p()).to_list(),
+        ),
+        customdata=cells.select("n", "precip_mm").to_numpy(),
+        hovertemplate=(
+            "Humedad: %{x}%<br>Sensación: %{y} °C<br>Horas: %{customdata[0]}"
+            "<br>Lluvia media: %{customdata[1]} mm"
+        ),
+    )
@@ -0,0 +1,559 @@
+"""
+Servidor local del dashboard.
+
+En lugar de regenerar docs/index.html cada vez que se quiere mirar otra localización u otro
+rango de fechas, este servicio sirve los tres paneles del dashboard por separado a partir de
+las tablas silver/gold (load_table, las mismas que usa plot_combined_dashboard):
+
+    GET /                         página con los tres paneles y los filtros
+    GET /api/<panel>              panel = heatmap | scatter | daily
+        ?location=Sevilla&location=Malaga   (opcional, varias veces)
+        &start=2026-03-01&end=2026-04-01    (opcional, start <= día < end)
+        &resolution=low|medium|high         (límites de puntos, ver RESOLUTIONS)
+        &format=figure|json                 (figura de Plotly o solo los datos)
+    GET /api/locations            localizaciones con datos
+    GET /api/version              versión actual de los datos
+    GET /api/events               eventos (Server-Sent Events) con cada versión nueva
+    GET /metrics                  métricas del proceso en formato Prometheus (metrics.py)
+
+Las respuestas se guardan en una caché de consultas (QUERY_CACHE_SIZE entradas, LRU) asociada a
+la versión de los datos. Un hilo vigila cada POLL_INTERVAL segundos la base de datos y las
+tablas exportadas; cuando llegan capturas nuevas (del servicio de ingesta o de main.py),
+opcionalmente actualiza las tablas (etapas decode y silver de pipeline_stages, con refresh=True),
+vacía la caché y avisa a las páginas abiertas, que vuelven a pedir solo sus paneles y los
+actualizan con Plotly.react sin recargar.
+
+Ejecución:
+    python -m scripts_3_1.dashboard_server [--port 8050] [--refresh]
+"""
+
+import argparse
+import json
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import polars as pl
+import plotly.graph_objects as go
+from plotly.offline import get_plotlyjs
+from plotly.subplots import make_subplots
+
+from scripts_1_7_weather_apis import metrics
+
+from .dashboard_data import (
+    MAX_HEATMAP_COLUMNS,
+    MAX_SCATTER_POINTS,
+    MAX_SERIES_POINTS,
+    binned_scatter,
+    daily_series,
+    daily_traces,
+    heatmap_grid,
+    heatmap_trace,
+    humidity_scatter_trace,
+)
+from .data_processor import stats_plan
+from .parquet_store import has_parquet, load_table, table_dir, with_location
+from .pipeline_stages import database_fingerprint, hash_values, run_stages
+from .visualizer import DIRS
+
+HOST = "127.0.0.1"
+PORT = 8050
+POLL_INTERVAL = 5  # segundos entre comprobaciones de datos nuevos
+QUERY_CACHE_SIZE = 256
+
+PANELS = ("heatmap", "scatter", "daily")
+# Rutas fijas (las de los paneles son /api/<panel>), para etiquetar las métricas por ruta
+ROUTES = ("/", "/plotly.min.js", "/api/version", "/api/locations", "/metrics")
+FORMATS = ("figure", "json")
+# Límites de puntos de cada panel según la resolución pedida
+RESOLUTIONS = {
+    "low": {"heatmap_columns": 60, "scatter_points": 1_000, "series_points": 120},
+    "medium": {
+        "heatmap_columns": MAX_HEATMAP_COLUMNS,
+        "scatter_points": MAX_SCATTER_POINTS,
+        "series_points": MAX_SERIES_POINTS,
+    },
+    "high": {"heatmap_columns": 730, "scatter_points": 50_000, "series_points": 5_000},
+}
+
+
+def data_version():
+    """
+    Versión de los datos: cambia cuando llegan capturas nuevas a la base de datos o cuando se
+    reescriben las tablas silver/gold.
+    """
+    files = []
+    for filename, csv_path in (
+        ("Tiempo_por_horas", DIRS["HOURLY_WEATHER"]),
+        ("Estadísticas_diarias", DIRS["DAILY_STATS"]),
+    ):
+        paths = [csv_path, *table_dir(filename).rglob("*.parquet")]
+        files += sorted(
+            (str(path), path.stat().st_mtime_ns, path.stat().st_size)
+            for path in paths
+            if path.exists()
+        )
+    return hash_values(database_fingerprint(), files)[:16]
+
+
+class QueryCache:
+    """Caché LRU de respuestas, vaciada cada vez que cambia la versión de los datos."""
+
+    def __init__(self, max_entries=QUERY_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, compute):
+        with self._lock:
+            version = self.version
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        # El cálculo se hace fuera del lock para no bloquear las demás consultas
+        value = compute()
+        with self._lock:
+            if self.version == version:
+                self._entries[key] = value
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, version):
+        with self._lock:
+            self.version = version
+            self._entries.clear()
+
+
+# --- Consultas ---
+
+
+def parse_query(query):
+    """Convierte los parámetros de la URL en los filtros de una consulta (valida los valores)."""
+    params = parse_qs(query)
+    resolution = params.get("resolution", ["medium"])[-1]
+    output = params.get("format", ["figure"])[-1]
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"resolution debe ser uno de {tuple(RESOLUTIONS)}")
+    if output not in FORMATS:
+        raise ValueError(f"format debe ser uno de {FORMATS}")
+    return {
+        "locations": tuple(sorted(params.get("location", []))),
+        "start": params.get("start", [None])[-1] or None,
+        "end": params.get("end", [None])[-1] or None,
+        "resolution": resolution,
+        "format": output,
+    }
+
+
+def load_hourly(locations=(), start=None, end=None):
+    return load_table(
+        "Tiempo_por_horas", DIRS["HOURLY_WEATHER"], start, end, locations
+    ).collect()
+
+
+def load_daily(locations=(), start=None, end=None):
+    """
+    Estadísticas diarias: las de la tabla gold si no se filtra por localización y, si se
+    filtra, calculadas con stats_plan a partir de las horas de esas localizaciones.
+    """
+    if not locations:
+        return load_table(
+            "Estadísticas_diarias", DIRS["DAILY_STATS"], start, end
+        ).collect()
+    rows = load_hourly(locations, start, end).with_columns(
+        pl.struct(total=pl.col("precip_mm")).alias("precipitation")
+    )
+    return stats_plan(rows.lazy()).collect()
+
+
+def _panel_layout(title, **axes):
+    return go.Layout(
+        title_text=f"<b>{title}</b>",
+        template="plotly_white",
+        margin=dict(t=50, b=40),
+        **axes,
+    )
+
+
+def panel_figure(panel, limits, locations=(), start=None, end=None):
+    """Figura de Plotly de un panel (como en plot_combined_dashboard, pero por separado)."""
+    if panel == "heatmap":
+        fig = go.Figure(
+            heatmap_trace(load_hourly(locations, start, end), limits["heatmap_columns"]),
+            _panel_layout(
+                "Intensidad Térmica Horaria",
+                xaxis_title="Día",
+                yaxis_title="Hora (24h)",
+            ),
+        )
+        fig.update_traces(colorbar=dict(len=1, y=0.5))
+        return fig
+
+    if panel == "scatter":
+        trace = humidity_scatter_trace(
+            load_hourly(locations, start, end), limits["scatter_points"]
+        )
+        fig = go.Figure(
+            trace,
+            _panel_layout(
+                "Impacto de Humedad en Sensación Térmica",
+                xaxis_title="Humedad Relativa (%)",
+                yaxis_title="Sensación Térmica (°C)",
+            ),
+        )
+        fig.update_traces(marker_colorbar=dict(len=1, y=0.5))
+        return fig
+
+    bars, line = daily_traces(load_daily(locations, start, end), limits["series_points"])
+    fig = make_subplots(specs=[[{"secondary_y": True}]])
+    fig.add_trace(bars, secondary_y=False)
+    fig.add_trace(line, secondary_y=True)
+    fig.update_layout(
+        _panel_layout("Relación Lluvia vs. Temperatura Media", xaxis_title="Día")
+    )
+    fig.update_yaxes(title_text="Precipitación (mm)", secondary_y=False)
+    fig.update_yaxes(title_text="Temp (°C)", secondary_y=True)
+    return fig
+
+
+def panel_data(panel, limits, locations=(), start=None, end=None):
+    """Datos (ya agregados) de un panel, como diccionario serializable en JSON."""
+    if panel == "heatmap":
+        days, hours, temps, days_per_column = heatmap_grid(
+            load_hourly(locations, start, end), limits["heatmap_columns"]
+        )
+        return {"days": days, "hours": hours, "z": temps, "days_per_column": days_per_column}
+
+    if panel == "scatter":
+        points = load_hourly(locations, start, end).drop_nulls(["humidity", "apparent_temp"])
+        if points.height <= limits["scatter_points"]:
+            columns = ["humidity", "apparent_temp", "temperature", "precip_mm"]
+            return {"binned": False, "points": points.select(columns).to_dicts()}
+        return {"binned": True, "points": binned_scatter(points).to_dicts()}
+
+    temp, precip, days_per_bar = daily_series(
+        load_daily(locations, start, end), limits["series_points"]
+    )
+    return {
+        "temp_avg": temp.with_columns(pl.col("date_no_time").cast(pl.String)).to_dicts(),
+        "precip": precip.with_columns(pl.col("date_no_time").cast(pl.String)).to_dicts(),
+        "days_per_bar": days_per_bar,
+    }
+
+
+def query_panel(panel, query):
+    """Respuesta (texto JSON) de un panel para los filtros de 'query' (ver parse_query)."""
+    limits = RESOLUTIONS[query["resolution"]]
+    args = (panel, limits, query["locations"], query["start"], query["end"])
+    if query["format"] == "figure":
+        return panel_figure(*args).to_json()
+    return json.dumps(panel_data(*args), default=str)
+
+
+def available_locations():
+    """Nombres de las localizaciones que aparecen en la tabla por horas."""
+    lf = load_table("Tiempo_por_horas", DIRS["HOURLY_WEATHER"])
+    if "location" not in lf.collect_schema().names():
+        lf = with_location(lf)
+    return sorted(lf.select(pl.col("location").unique()).collect()["location"].to_list())
+
+
+# --- Servidor ---
+
+
+class DashboardServer:
+    """Servidor HTTP, caché de consultas y vigilancia de datos nuevos."""
+
+    def __init__(self, host=HOST, port=PORT, poll_interval=POLL_INTERVAL, refresh=False):
+        self.poll_interval = poll_interval
+        self.refresh = refresh
+        self.cache = QueryCache()
+        self.cache.invalidate(data_version())
+        self._db_fingerprint = database_fingerprint()
+        self._changed = threading.Condition()
+        self._stop = threading.Event()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self._threads = []
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def check_for_updates(self):
+        """
+        Comprueba si hay datos nuevos; si los hay (y refresh=True) actualiza las tablas silver,
+        vacía la caché y avisa a los clientes. Devuelve True si ha cambiado la versión.
+        """
+        if self.refresh:
+            fingerprint = database_fingerprint()
+            if fingerprint != self._db_fingerprint:
+                self._db_fingerprint = fingerprint
+                # Se actualizan las tablas en el mismo formato que ya usa el dashboard
+                export_format = "parquet" if has_parquet("Tiempo_por_horas") else "csv"
+                try:
+                    run_stages(only=["decode", "silver"], export_format=export_format)
+                except Exception as e:
+                    print(f"❌ [ERROR] Fallo al actualizar las tablas del dashboard: {e}")
+
+        version = data_version()
+        if version == self.cache.version:
+            return False
+        self.cache.invalidate(version)
+        with self._changed:
+            self._changed.notify_all()
+        print(f"Datos nuevos en el dashboard (versión {version}).")
+        return True
+
+    def _watch_loop(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.check_for_updates()
+            except Exception as e:
+                print(f"❌ [ERROR] Fallo al comprobar datos nuevos: {e}")
+
+    def wait_for_change(self, version, timeout):
+        """Espera hasta que cambie la versión (o pase 'timeout'); devuelve la versión actual."""
+        with self._changed:
+            self._changed.wait_for(
+                lambda: self.cache.version != version or self._stop.is_set(), timeout
+            )
+        return self.cache.version
+
+    def start(self):
+        """Arranca el servidor HTTP y la vigilancia de datos (en segundo plano)."""
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self.httpd.serve_forever, name="dashboard-http"),
+            threading.Thread(target=self._watch_loop, name="dashboard-watch"),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self._stop.set()
+        with self._changed:
+            self._changed.notify_all()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        for thread in self._threads:
+            thread.join()
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(DashboardRequestHandler):
+            dashboard = server
+
+        return Handler
+
+
+class DashboardRequestHandler(BaseHTTPRequestHandler):
+    dashboard = None  # DashboardServer, se asigna en DashboardServer._handler_class
+    _plotly_js = None
+
+    def log_message(self, format, *args):
+        pass  # Sin una línea por petición en la consola
+
+    def _send(self, status, body, content_type="application/json", cache_control="no-cache"):
+        body = body.encode("utf-8") if isinstance(body, str) else body
+        self.send_response(status)
+        self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", cache_control)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status, message):
+        self._send(status, json.dumps({"error": message}, ensure_ascii=False))
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        path = url.path.rstrip("/") or "/"
+        cache = self.dashboard.cache
+
+        start = time.perf_counter()
+        try:
+            if path == "/":
+                self._send(200, PAGE, "text/html")
+            elif path == "/metrics":
+                metrics.set_gauge("dashboard_cache_hits_total", cache.hits)
+                metrics.set_gauge("dashboard_cache_misses_total", cache.misses)
+                self._send(200, metrics.render_prometheus(), "text/plain; version=0.0.4")
+            elif path == "/plotly.min.js":
+                if DashboardRequestHandler._plotly_js is None:
+                    DashboardRequestHandler._plotly_js = get_plotlyjs().encode("utf-8")
+                self._send(
+                    200,
+                    DashboardRequestHandler._plotly_js,
+                    "application/javascript",
+                    "max-age=86400",
+                )
+            elif path == "/api/version":
+                self._send(200, json.dumps({"version": cache.version}))
+            elif path == "/api/locations":
+                body = cache.get(("locations",), lambda: json.dumps(available_locations()))
+                self._send(200, body)
+            elif path == "/api/events":
+                self._events()
+            elif path.startswith("/api/") and path[5:] in PANELS:
+                query = parse_query(url.query)
+                key = (path[5:], *sorted(query.items()))
+                body = cache.get(key, lambda: query_panel(path[5:], query))
+                self._send(200, body)
+            else:
+                self._error(404, f"Ruta desconocida: {path}")
+        except ValueError as e:
+            self._error(400, str(e))
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        except Exception as e:
+            metrics.record_error("dashboard_server", e, path=self.path)
+            print(f"❌ [ERROR] Fallo al responder a {self.path}: {e}")
+            self._error(500, str(e))
+        finally:
+            if path != "/api/events":
+                panel = path.startswith("/api/") and path[5:] in PANELS
+                route = path if path in ROUTES or panel else "other"
+                metrics.observe(
+                    "dashboard_request_seconds", time.perf_counter() - start, path=route
+                )
+
+    def _events(self):
+        """Server-Sent Events: envía la versión actual y cada versión nueva que llegue."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        version = None
+        while not self.dashboard._stop.is_set():
+            current = self.dashboard.wait_for_change(version, timeout=15)
+            # Sin cambios, un comentario mantiene viva la conexión
+            message = f"data: {current}\n\n" if current != version else ": ping\n\n"
+            self.wfile.write(message.encode("utf-8"))
+            self.wfile.flush()
+            version = current
+
+
+PAGE = """<!DOCTYPE html>
+<html lang="es">
+<head>
+<meta charset="utf-8">
+<title>Dashboard Meteorológico</title>
+<script src="/plotly.min.js"></script>
+<style>
+  body { font-family: sans-serif; margin: 1em 2em; }
+  form { display: flex; gap: 1em; align-items: end; flex-wrap: wrap; }
+  label { display: flex; flex-direction: column; font-size: 0.9em; }
+  .panel { height: 420px; }
+  #status { color: #888; font-size: 0.8em; }
+</style>
+</head>
+<body>
+<h2>Dashboard Meteorológico Consolidado</h2>
+<form id="filters">
+  <label>Localizaciones <select id="location" multiple size="3"></select></label>
+  <label>Desde <input type="date" id="start"></label>
+  <label>Hasta <input type="date" id="end"></label>
+  <label>Resolución
+    <select id="resolution">
+      <option value="low">Baja</option>
+      <option value="medium" selected>Media</option>
+      <option value="high">Alta</option>
+    </select>
+  </label>
+  <button type="submit">Aplicar</button>
+  <span id="status"></span>
+</form>
+<div id="heatmap" class="panel"></div>
+<div id="scatter" class="panel"></div>
+<div id="daily" class="panel"></div>
+<script>
+const panels = ["heatmap", "scatter", "daily"];
+
+function query() {
+  const params = new URLSearchParams();
+  for (const option of document.getElementById("location").selectedOptions) {
+    params.append("location", option.value);
+  }
+  for (const name of ["start", "end", "resolution"]) {
+    const value = document.getElementById(name).value;
+    if (value) params.set(name, value);
+  }
+  return params.toString();
+}
+
+async function loadPanels() {
+  const started = performance.now();
+  const params = query();
+  await Promise.all(panels.map(async (panel) => {
+    const response = await fetch(`/api/${panel}?${params}`);
+    const figure = await response.json();
+    if (figure.error) { document.getElementById(panel).textContent = figure.error; return; }
+    // Plotly.react solo actualiza lo que ha cambiado en el gráfico
+    Plotly.react(panel, figure.data, figure.layout, {responsive: true});
+  }));
+  document.getElementById("status").textContent =
+    `Actualizado en ${Math.round(performance.now() - started)} ms`;
+}
+
+async function loadLocations() {
+  const names = await (await fetch("/api/locations")).json();
+  const select = document.getElementById("location");
+  const selected = new Set([...select.selectedOptions].map((o) => o.value));
+  select.innerHTML = "";
+  for (const name of names) select.add(new Option(name, name, false, selected.has(name)));
+}
+
+document.getElementById("filters").addEventListener("submit", (event) => {
+  event.preventDefault();
+  loadPanels();
+});
+
+// Cada versión nueva de los datos vuelve a pedir los paneles (sin recargar la página)
+new EventSource("/api/events").onmessage = async () => {
+  await loadLocations();
+  await loadPanels();
+};
+</script>
+</body>
+</html>
+"""
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servidor local del dashboard meteorológico")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--poll", type=float, default=POLL_INTERVAL, help="segundos")
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="actualizar las tablas silver cuando lleguen capturas nuevas a la base de datos",
+    )
+    args = parser.parse_args(argv)
+
+    server = DashboardServer(args.host, args.port, args.poll, args.refresh)
+    server.start()
+    print(f"Dashboard en {server.url} (Ctrl+C para parar)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
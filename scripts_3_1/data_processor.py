@@ -2,6 +2,7 @@ import os
 import polars as pl
 from scripts_1_7_weather_apis.db_connection import BASE_DIR
 from .db_connector import get_polars_df_from_last_fetch
+from .parquet_store import export_to_parquet
 
 """
 # Utilizando Polars:
@@ -29,6 +30,46 @@ def clean_nulls(df):
 """
 
 
+# Campos de cada objeto de 'hourly.data' (y columnas de la tabla normalizada 'hourly_obs')
+HOURLY_FIELDS = [
+    "date",
+    "weather",
+    "temperature",
+    "humidity",
+    "apparent_temp",
+    "precipitation",
+    "precip_prob",
+    "summary",
+]
+
+
+def hourly_rows(df, keys=("lat", "lon")):
+    """
+    Devuelve una fila por hora de pronóstico con las columnas 'keys' + HOURLY_FIELDS.
+    Acepta tanto el dataframe de capturas con la columna 'hourly' anidada (JSON decodificado)
+    como las filas ya planas que se leen de la tabla normalizada 'hourly_obs'.
+    """
+    if "hourly" in df.collect_schema().names():
+        return (
+            df.select([*keys, "hourly"])
+            .drop_nulls("hourly")  # LIMPIEZA: Eliminar filas donde 'hourly' es nulo.
+            .unnest("hourly")
+            .explode("data")
+            .unnest("data")
+        )
+    return df.select([*keys, *HOURLY_FIELDS])
+
+
+def collect(df):
+    """
+    Materializa un LazyFrame con el motor streaming de Polars (procesa los datos por lotes,
+    sin cargar todo el histórico en memoria). Los DataFrame se devuelven tal cual.
+    """
+    if isinstance(df, pl.LazyFrame):
+        return df.collect(engine="streaming")
+    return df
+
+
 def export_to_csv(df, filename):
     """Exportar un DataFrame de Polars a CSV."""
     output_dir = (
@@ -42,26 +83,33 @@ def export_to_csv(df, filename):
     print(f"Archivo exportado correctamente: {full_path}")
 
 
-def get_hourly_weather_dataframe(df):
+EXPORT_FORMATS = ("csv", "parquet", "both")
+
+
+def export_table(df, filename, export_format="csv"):
+    """Exportar un DataFrame a CSV, a Parquet particionado (ver parquet_store.py) o a ambos."""
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"export_format debe ser uno de {EXPORT_FORMATS}")
+    if export_format in ("csv", "both"):
+        export_to_csv(df, filename)
+    if export_format in ("parquet", "both"):
+        export_to_parquet(df, filename)
+
+
+def parse_hourly_dates(rows):
     """
-    Datos del tiempo extraídos por franja horaria.
-    Se corrige el error de parseo de fecha adaptándose al formato ISO T.
+    Convierte el string 'date' de las filas horarias a datetime.
+    Usamos strict=False para evitar que el programa se interrumpa si una fecha falla
+    y no forzamos la zona horaria aquí para que acepte el formato "T".
     """
-    # 1. Selección y desanidado
-    df_hourly = (
-        df.select(["lat", "lon", "hourly"])
-        .drop_nulls("hourly")
-        .unnest("hourly")
-        .explode("data")
-        .unnest("data")
-    )
+    return rows.with_columns(pl.col("date").str.to_datetime(strict=False))
 
+
+def hourly_plan(rows):
+    """Transformación y filtrado de las filas horarias (con 'date' ya convertida a datetime)."""
     # 2. TRANSFORMACIÓN
-    df_hourly = df_hourly.with_columns(
+    rows = rows.with_columns(
         [
-            # Usamos strict=False para evitar que el programa se interrumpa si una fecha falla
-            # y no forzamos la zona horaria aquí para que acepte el formato "T"
-            pl.col("date").str.to_datetime(strict=False),
             # Aplanamos el struct de precipitación
             pl.col("precipitation").struct.field("total").alias("precip_mm"),
             pl.col("precipitation").struct.field("type").alias("precip_tipo"),
@@ -70,22 +118,13 @@ def get_hourly_weather_dataframe(df):
         ]
     )
 
-    # 3. FILTRO Y EXPORTACIÓN
-    df_hourly = df_hourly.drop_nulls("date")
+    # 3. FILTRO
+    return rows.drop_nulls("date").filter(pl.col("temperature").is_between(-60, 60))
 
-    df_hourly = df_hourly.filter(pl.col("temperature").is_between(-60, 60))
 
-    # Exportamos el CSV
-    df_final_csv = df_hourly.drop("precipitation")
-    export_to_csv(df_final_csv, "Tiempo_por_horas")
-
-    return df_hourly
-
-
-def get_current_weather_dataframe(df):
-    """Datos del tiempo actual."""
-    df = clean_nulls(df)
-    df_current = (
+def current_plan(df):
+    """Selección del registro más reciente con 'current' y aplanado de sus structs."""
+    return (
         df.sort("id", descending=True)
         .filter(
             pl.col("current").is_not_null()
@@ -115,60 +154,144 @@ def get_current_weather_dataframe(df):
         .drop(["precipitation", "wind"])
     )
     # El sort de arriba es para obtener el registro más reciente, ya que ID es incremental.
-    export_to_csv(df_current, "Tiempo_actual")
-    return df_current
 
 
-def get_stats_dataframe(df):
+def daily_partials_plan(rows):
     """
-    Estadísticas por día (máximo, mínimo, promedio de temperatura y total de precipitación diaria). Aquí se crean columnas nuevas,
-    agrupando por día para obtener estadísticas diarias.
+    Agregados parciales por localización y día (con 'date' ya convertida a datetime):
+    número de horas, suma, mínimo y máximo de temperatura y suma de precipitación.
+    Se pueden combinar entre sí (merge_partials_plan), así que no hace falta recalcularlos
+    cuando llegan horas de otros días (ver incremental_stats.py).
+
+    Las sumas se hacen sobre los valores ordenados: así el resultado es exactamente el mismo
+    sea cual sea el orden de las filas o cómo las reparta Polars entre hilos.
     """
-    df = clean_nulls(df)
-    df_stats = (
-        df.select(["hourly"])
-        .drop_nulls("hourly")  # LIMPIEZA: Eliminar filas donde 'hourly' es nulo.
-        .unnest("hourly")
-        .explode("data")
-        .unnest("data")
-        # 1. Convertimos el string 'date' a datetime y luego extraemos solo la fecha (Date)
-        .with_columns(
-            pl.col("date")
-            .str.to_datetime(time_unit="ms", time_zone="UTC")
-            .dt.date()
-            .alias("date_no_time")
-        )
+    return (
+        # 1. Extraemos solo la fecha (Date) del datetime
+        rows.with_columns(pl.col("date").dt.date().alias("date_no_time"))
         # LIMPIEZA: Antes de agrupar, eliminamos filas con temperaturas nulas.
         .filter(pl.col("temperature").is_not_null())
-        .group_by("date_no_time")
+        .group_by(["lat", "lon", "date_no_time"])
+        .agg(
+            [
+                pl.len().alias("n_hours"),
+                pl.col("temperature").sort().sum().alias("temp_sum"),
+                pl.col("temperature").min().alias("temp_min"),
+                pl.col("temperature").max().alias("temp_max"),
+                # LIMPIEZA: sum() maneja nulls como 0 si usamos fill_null antes
+                pl.col("precipitation")
+                .struct.field("total")
+                .fill_null(0)
+                .sort()
+                .sum()
+                .alias("precip_sum"),
+            ]
+        )
+    )
+
+
+def merge_partials_plan(partials):
+    """Combina los agregados parciales de todas las localizaciones en las estadísticas de cada día."""
+    return (
+        partials.group_by("date_no_time")
         .agg(
             [
-                pl.col("temperature")
+                pl.col("temp_max")
                 .max()
                 .alias("temp_max"),  # Columna calculada para la temperatura máxima.
-                pl.col("temperature")
+                pl.col("temp_min")
                 .min()
                 .alias("temp_min"),  # Columna calculada para la temperatura mínima.
-                pl.col("temperature")
-                .mean()
+                (pl.col("temp_sum").sort().sum() / pl.col("n_hours").sum())
                 .round(2)
                 .alias("temp_avg"),  # Columna calculada para la temperatura promedio.
-                # LIMPIEZA: sum() maneja nulls como 0 si usamos fill_null antes
-                pl.col("precipitation")
-                .struct.field("total")
-                .fill_null(0)
-                .sum()
-                .alias("precip_total_diaria"),
+                pl.col("precip_sum").sort().sum().alias("precip_total_diaria"),
             ]
         )
         .sort("date_no_time")
     )
 
-    export_to_csv(df_stats, "Estadísticas_diarias")
+
+def stats_plan(rows):
+    """Agregación diaria de las filas horarias (con 'date' ya convertida a datetime)."""
+    return merge_partials_plan(daily_partials_plan(rows))
+
+
+def get_hourly_weather_dataframe(df, export=True, export_format="csv"):
+    """
+    Datos del tiempo extraídos por franja horaria.
+    Se corrige el error de parseo de fecha adaptándose al formato ISO T.
+    Acepta un DataFrame o un LazyFrame (por ejemplo, el histórico de scan_history).
+    """
+    # 1. Selección, desanidado y fechas
+    df_hourly = collect(hourly_plan(parse_hourly_dates(hourly_rows(df))))
+
+    # Exportamos el CSV
+    if export:
+        export_table(df_hourly.drop("precipitation"), "Tiempo_por_horas", export_format)
+
+    return df_hourly
+
+
+def get_current_weather_dataframe(df, export=True, export_format="csv"):
+    """Datos del tiempo actual. Acepta un DataFrame o un LazyFrame."""
+    df_current = collect(current_plan(clean_nulls(df)))
+    if export:
+        export_table(df_current, "Tiempo_actual", export_format)
+    return df_current
+
+
+def get_stats_dataframe(df, export=True, export_format="csv"):
+    """
+    Estadísticas por día (máximo, mínimo, promedio de temperatura y total de precipitación diaria). Aquí se crean columnas nuevas,
+    agrupando por día para obtener estadísticas diarias.
+    Acepta un DataFrame o un LazyFrame.
+    """
+    rows = hourly_rows(clean_nulls(df))
+    df_stats = collect(stats_plan(parse_hourly_dates(rows)))
+
+    if export:
+        export_table(df_stats, "Estadísticas_diarias", export_format)
 
     return df_stats
 
 
+def run_pipeline(df, export=True, export_format="csv"):
+    """
+    Calcula los tres dataframes (por horas, actual y estadísticas diarias) en una sola pasada.
+    Se construye un único grafo lazy en el que el desanidado de 'hourly' y la conversión de
+    fechas se hacen una vez, y pl.collect_all deja que Polars comparta esa parte común entre
+    las tres salidas. Devuelve (df_hourly, df_current, df_stats) y exporta las tres tablas
+    (CSV, Parquet o ambos según 'export_format').
+    """
+    lf = df.lazy()
+
+    # Parte común: una fila por hora, con las claves que necesitan las dos ramas horarias.
+    # cache() hace que se calcule una sola vez y las dos ramas lean el mismo resultado
+    # (si no, el optimizador empuja filtros y proyecciones distintos en cada rama).
+    rows = parse_hourly_dates(
+        hourly_rows(lf, keys=("id", "timestamp_captura", "lat", "lon"))
+    ).cache()
+
+    hourly = hourly_plan(rows.drop(["id", "timestamp_captura"]))
+    current = current_plan(clean_nulls(lf))
+    stats = stats_plan(clean_nulls(rows))
+
+    # Igual que collect(): streaming para los LazyFrame (histórico) y en memoria para los
+    # DataFrame, para que los resultados coincidan exactamente con las funciones por separado
+    engine = "streaming" if isinstance(df, pl.LazyFrame) else "in-memory"
+    df_hourly, df_current, df_stats = pl.collect_all(
+        [hourly, current, stats], engine=engine
+    )
+
+    if export:
+        export_table(df_hourly.drop("precipitation"), "Tiempo_por_horas", export_format)
+        export_table(df_current, "Tiempo_actual", export_format)
+        export_table(df_stats, "Estadísticas_diarias", export_format)
+
+    return df_hourly, df_current, df_stats
+
+
 if __name__ == "__main__":
 
     df = get_polars_df_from_last_fetch("openmeteo")
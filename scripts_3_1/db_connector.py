@@ -1,6 +1,22 @@
-import polars as pl
+import io
 import sqlite3
-from scripts_1_7_weather_apis.db_connection import DB_PATH
+from datetime import datetime
+
+import polars as pl
+import pyarrow as pa
+import pyarrow.json as pa_json
+import pyarrow.parquet as pq
+from polars.io.plugins import register_io_source
+from scripts_1_7_weather_apis import metrics
+from scripts_1_7_weather_apis.db_connection import DB_PATH, get_connection
+from scripts_1_7_weather_apis.locations import LOCATIONS
+from scripts_1_7_weather_apis.payload_codec import (
+    PAYLOAD_SQL,
+    payload_json,
+    register_payload_functions,
+)
+
+HISTORY_BATCH_SIZE = 500  # Capturas que se leen y decodifican de cada vez
 
 
 def get_weather_schema():
@@ -67,15 +83,36 @@ def get_weather_schema():
     )
 
 
+# Tipos de las columnas de 'hourly_obs' (los mismos que el esquema JSON de get_weather_schema)
+HOURLY_OBS_SCHEMA = {
+    "id": pl.Int64,
+    "timestamp_captura": pl.String,
+    "lat": pl.String,
+    "lon": pl.String,
+    "date": pl.String,
+    "weather": pl.String,
+    "temperature": pl.Float64,
+    "humidity": pl.Int64,
+    "apparent_temp": pl.Float64,
+    "precip_total": pl.Float64,
+    "precip_type": pl.String,
+    "precip_prob": pl.Int64,
+    "summary": pl.String,
+}
+
+
 def get_polars_df_from_last_fetch(table_name):
     """
     Obtener un DataFrame de Polars a partir de una tabla en SQLite, decodificando el JSON con un esquema manual.
     """
-    query = f"SELECT * FROM {table_name} ORDER BY id DESC LIMIT 1"
+    # PAYLOAD_SQL devuelve el texto JSON también para los payloads guardados como BLOB
+    query = f"""
+        SELECT id, timestamp, {PAYLOAD_SQL} AS payload
+        FROM {table_name} ORDER BY id DESC LIMIT 1
+    """
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_connection()
         df = pl.read_database(query=query, connection=conn)
-        conn.close()
 
         if not df.is_empty():
             schema = get_weather_schema()
@@ -86,6 +123,366 @@ def get_polars_df_from_last_fetch(table_name):
             return df
         return df
     except Exception as e:
+        metrics.record_error("get_polars_df_from_last_fetch", e)
+        print(f"Error: {e}")
+        return None
+
+
+def get_history_schema():
+    """Esquema del dataframe de capturas: columnas de la tabla + campos del JSON desanidados."""
+    return {"id": pl.Int64, "timestamp": pl.String, **get_weather_schema().to_schema()}
+
+
+def _history_where(start, end, locations, fetch_ids):
+    """Construye el WHERE (y sus parámetros) para los filtros de scan_history."""
+    conditions, params = [], []
+
+    if start is not None:
+        conditions.append("timestamp >= ?")
+        params.append(_as_timestamp(start))
+    if end is not None:
+        conditions.append("timestamp < ?")
+        params.append(_as_timestamp(end))
+
+    if locations:
+        location_conditions = []
+        for location in locations:
+            lat, lon = LOCATIONS[location] if isinstance(location, str) else location
+            location_conditions.append(
+                f"(json_extract({PAYLOAD_SQL}, '$.lat') = ?"
+                f" AND json_extract({PAYLOAD_SQL}, '$.lon') = ?)"
+            )
+            params += [str(lat), str(lon)]
+        conditions.append(f"({' OR '.join(location_conditions)})")
+
+    if fetch_ids is not None:
+        first_id, last_id = fetch_ids
+        if first_id is not None:
+            conditions.append("id >= ?")
+            params.append(first_id)
+        if last_id is not None:
+            conditions.append("id <= ?")
+            params.append(last_id)
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    return where, params
+
+
+def _as_timestamp(value):
+    """Convierte un datetime/date al formato de 'timestamp_captura' (los textos se dejan igual)."""
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    return str(value)
+
+
+def scan_history(
+    table_name="openmeteo",
+    start=None,
+    end=None,
+    locations=None,
+    fetch_ids=None,
+    batch_size=HISTORY_BATCH_SIZE,
+):
+    """
+    Devuelve un LazyFrame de Polars sobre TODAS las capturas guardadas (no solo la última),
+    con las mismas columnas que get_polars_df_from_last_fetch.
+
+    Los filtros se resuelven en la consulta SQL:
+    - start / end: rango de fechas de captura (start <= timestamp < end).
+    - locations: nombres del registro de localizaciones o tuplas (lat, lon).
+    - fetch_ids: rango (primer_id, último_id), ambos incluidos (cualquiera puede ser None).
+
+    Las columnas que no se usan tampoco se leen: solo se extrae del JSON (json_extract) la parte
+    que se pide, y las filas se leen y decodifican por lotes de 'batch_size', así que los datos
+    no tienen que caber en memoria de una vez si se recogen con collect(engine="streaming").
+    """
+    schema = get_history_schema()
+    where, params = _history_where(start, end, locations, fetch_ids)
+    payload_fields = get_weather_schema().to_schema()
+
+    def source(with_columns, predicate, n_rows, batch_size_hint):
+        columns = with_columns or list(schema)
+        # El predicado se aplica después de decodificar, así que necesitamos también sus columnas
+        needed = set(columns) | (
+            set(predicate.meta.root_names()) if predicate is not None else set()
+        )
+        select = [
+            f"json_extract({PAYLOAD_SQL}, '$.{col}') AS {col}"
+            if col in payload_fields
+            else col
+            for col in schema
+            if col in needed
+        ]
+        query = f"SELECT {', '.join(select)} FROM {table_name} {where} ORDER BY id"
+
+        # El generador puede consumirse desde otro hilo, así que usa su propia conexión
+        conn = sqlite3.connect(
+            DB_PATH, check_same_thread=False, factory=metrics.InstrumentedConnection
+        )
+        register_payload_functions(conn)
+        try:
+            cursor = conn.execute(query, params)
+            names = [description[0] for description in cursor.description]
+            remaining = n_rows
+            while remaining is None or remaining > 0:
+                size = batch_size_hint or batch_size
+                if remaining is not None:
+                    size = min(size, remaining)
+                rows = cursor.fetchmany(size)
+                if not rows:
+                    break
+
+                df = pl.DataFrame(
+                    rows,
+                    schema={
+                        name: pl.String if name in payload_fields else schema[name]
+                        for name in names
+                    },
+                    orient="row",
+                )
+                # Decodificamos solo los campos anidados que se han pedido
+                df = df.with_columns(
+                    pl.col(name).str.json_decode(dtype=payload_fields[name])
+                    for name in names
+                    if isinstance(payload_fields.get(name), pl.Struct)
+                )
+                if predicate is not None:
+                    df = df.filter(predicate)
+                if with_columns is not None:
+                    df = df.select(with_columns)
+
+                if remaining is not None:
+                    remaining -= df.height
+                yield df
+        finally:
+            conn.close()
+
+    return register_io_source(io_source=source, schema=schema)
+
+
+def _arrow_type(dtype):
+    """
+    Tipo de Arrow equivalente a un tipo de Polars, con string/list normales (el lector JSON de
+    Arrow no admite los large_string/large_list que usa Polars).
+    """
+    if isinstance(dtype, pl.Struct):
+        return pa.struct(
+            [pa.field(field.name, _arrow_type(field.dtype)) for field in dtype.fields]
+        )
+    if isinstance(dtype, pl.List):
+        return pa.list_(_arrow_type(dtype.inner))
+    if dtype == pl.String:
+        return pa.string()
+    if dtype == pl.Int64:
+        return pa.int64()
+    if dtype == pl.Float64:
+        return pa.float64()
+    raise TypeError(f"Tipo no soportado: {dtype}")
+
+
+def get_history_arrow_schema():
+    """Esquema Arrow de las capturas (mismas columnas que get_history_schema)."""
+    return pa.schema(
+        [
+            pa.field(name, _arrow_type(dtype))
+            for name, dtype in get_history_schema().items()
+        ]
+    )
+
+
+def decode_payload_batch(ids, timestamps, payloads, schema=None):
+    """
+    Decodifica un lote de payloads JSON directamente a un RecordBatch de Arrow con el esquema
+    fijo (los campos que no están en el esquema se ignoran), sin pasar por una columna de texto.
+    """
+    schema = schema or get_history_arrow_schema()
+    payload_schema = pa.schema([schema.field(name) for name in schema.names[2:]])
+
+    # Los payloads son JSON de una sola línea, así que el lote se puede leer como NDJSON
+    table = pa_json.read_json(
+        io.BytesIO("\n".join(payloads).encode("utf-8")),
+        parse_options=pa_json.ParseOptions(
+            explicit_schema=payload_schema, unexpected_field_behavior="ignore"
+        ),
+    )
+    return pa.RecordBatch.from_arrays(
+        [
+            pa.array(ids, type=pa.int64()),
+            pa.array(timestamps, type=pa.string()),
+            *(column.combine_chunks() for column in table.columns),
+        ],
+        schema=schema,
+    )
+
+
+def iter_history_batches(
+    table_name="openmeteo",
+    start=None,
+    end=None,
+    locations=None,
+    fetch_ids=None,
+    batch_size=HISTORY_BATCH_SIZE,
+):
+    """
+    Recorre las capturas de 'table_name' (con los mismos filtros que scan_history) y devuelve
+    un RecordBatch de Arrow por cada 'batch_size' filas. Como solo hay un lote en memoria a la
+    vez, la memoria no crece con el tamaño de la tabla.
+    """
+    schema = get_history_arrow_schema()
+    where, params = _history_where(start, end, locations, fetch_ids)
+
+    conn = sqlite3.connect(
+        DB_PATH, check_same_thread=False, factory=metrics.InstrumentedConnection
+    )
+    register_payload_functions(conn)
+    try:
+        cursor = conn.execute(
+            f"SELECT id, timestamp, payload FROM {table_name} {where} ORDER BY id", params
+        )
+        while rows := cursor.fetchmany(batch_size):
+            ids, timestamps, payloads = zip(*rows)
+            # Los payloads comprimidos (BLOB) se pasan a texto JSON antes de decodificar
+            payloads = [payload_json(payload) for payload in payloads]
+            yield decode_payload_batch(ids, timestamps, payloads, schema)
+    finally:
+        conn.close()
+
+
+def write_history_parquet(
+    path, table_name="openmeteo", batch_size=HISTORY_BATCH_SIZE, **filters
+):
+    """
+    Escribe las capturas de 'table_name' en un fichero Parquet lote a lote (ver
+    iter_history_batches). Devuelve el número de filas escritas.
+    """
+    written = 0
+    with pq.ParquetWriter(path, get_history_arrow_schema(), compression="zstd") as writer:
+        for batch in iter_history_batches(table_name, batch_size=batch_size, **filters):
+            writer.write_batch(batch)
+            written += batch.num_rows
+    return written
+
+
+def _fetch_filter(fetch_id):
+    """Condición WHERE para una captura concreta o, si no se indica, la última."""
+    if fetch_id is None:
+        return "f.id = (SELECT MAX(id) FROM fetches)", []
+    return "f.id = ?", [fetch_id]
+
+
+def _read_hourly_rows(query, params):
+    """
+    Ejecuta una consulta sobre las tablas horarias normalizadas y devuelve las mismas columnas
+    que 'hourly.data' tras desanidar el JSON (con 'precipitation' como struct).
+    """
+    df = pl.read_database(
+        query=query,
+        connection=get_connection(),
+        execute_options={"parameters": params},
+        schema_overrides=HOURLY_OBS_SCHEMA,
+    )
+
+    # Reconstruimos el struct de precipitación y dejamos el mismo orden de columnas que el JSON
+    return df.select(
+        "id",
+        "timestamp_captura",
+        "lat",
+        "lon",
+        "date",
+        "weather",
+        "temperature",
+        "humidity",
+        "apparent_temp",
+        pl.struct(
+            pl.col("precip_total").alias("total"),
+            pl.col("precip_type").alias("type"),
+        ).alias("precipitation"),
+        "precip_prob",
+        "summary",
+    )
+
+
+def get_polars_hourly_from_normalized(fetch_id=None):
+    """
+    Obtener las filas horarias de una captura (por defecto, la última) desde la tabla normalizada
+    'hourly_obs'. Sirve de entrada a data_processor sin json_decode.
+    """
+    where, params = _fetch_filter(fetch_id)
+    query = f"""
+        SELECT h.fetch_id AS id, f.timestamp_captura, h.lat, h.lon, h.date, h.weather,
+               h.temperature, h.humidity, h.apparent_temp, h.precip_total, h.precip_type,
+               h.precip_prob, h.summary
+        FROM hourly_obs h JOIN fetches f ON f.id = h.fetch_id
+        WHERE {where}
+        ORDER BY h.lat, h.lon, h.date
+    """
+    try:
+        return _read_hourly_rows(query, params)
+    except Exception as e:
+        metrics.record_error("get_polars_hourly_from_normalized", e)
+        print(f"Error: {e}")
+        return None
+
+
+def get_polars_hourly_latest(lat=None, lon=None, start=None, end=None):
+    """
+    Obtener el pronóstico más reciente de cada hora (tabla 'hourly_latest'), sin duplicados
+    aunque la misma hora se haya capturado varias veces. Opcionalmente filtrado por
+    coordenadas y por rango de fechas ('start' <= date < 'end', en formato ISO).
+    """
+    conditions, params = [], []
+    if lat is not None and lon is not None:
+        conditions.append("lat = ? AND lon = ?")
+        params += [str(lat), str(lon)]
+    if start is not None:
+        conditions.append("date >= ?")
+        params.append(start)
+    if end is not None:
+        conditions.append("date < ?")
+        params.append(end)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    query = f"""
+        SELECT fetch_id AS id, timestamp_captura, lat, lon, date, weather, temperature,
+               humidity, apparent_temp, precip_total, precip_type, precip_prob, summary
+        FROM hourly_latest
+        {where}
+        ORDER BY lat, lon, date
+    """
+    try:
+        return _read_hourly_rows(query, params)
+    except Exception as e:
+        metrics.record_error("get_polars_hourly_latest", e)
+        print(f"Error: {e}")
+        return None
+
+
+def get_polars_current_from_normalized(fetch_id=None):
+    """
+    Obtener el tiempo actual de una captura (por defecto, la última) desde 'current_obs',
+    ya con las columnas planas que exporta get_current_weather_dataframe.
+    """
+    where, params = _fetch_filter(fetch_id)
+    query = f"""
+        SELECT f.timestamp_captura, c.temperature, c.summary, c.icon, c.cloud_cover,
+               COALESCE(c.precip_total, 0) AS precip_total,
+               COALESCE(c.precip_type, 'unknown') AS precip_type,
+               COALESCE(c.wind_speed, 0) AS wind_speed,
+               COALESCE(c.wind_angle, 0) AS wind_angle,
+               COALESCE(c.wind_dir, 'unknown') AS wind_dir
+        FROM current_obs c JOIN fetches f ON f.id = c.fetch_id
+        WHERE {where}
+    """
+    try:
+        conn = get_connection()
+        df = pl.read_database(
+            query=query,
+            connection=conn,
+            execute_options={"parameters": params},
+        )
+        return df
+    except Exception as e:
+        metrics.record_error("get_polars_current_from_normalized", e)
         print(f"Error: {e}")
         return None
 
@@ -0,0 +1,247 @@
+"""
+Estadísticas diarias incrementales.
+
+get_stats_dataframe recalcula todas las estadísticas a partir de todas las filas horarias. Aquí
+guardamos en SQLite, por localización y día, los agregados parciales de daily_partials_plan
+(número de horas, suma/mínimo/máximo de temperatura y suma de precipitación), que se pueden
+combinar entre sí. En cada actualización:
+- Buscamos los días con alguna hora de 'hourly_latest' que ha cambiado desde la última
+  actualización. Unos triggers sobre 'hourly_latest' apuntan en 'stats_changed_days' el día
+  de cada fila insertada, actualizada o borrada: horas nuevas, horas que un pronóstico más
+  reciente ha sustituido y capturas repetidas que se han vuelto a guardar (mismo id en
+  'fetches'). También se incluyen los días de las capturas con id mayor que la marca de
+  'stats_watermark', por si se guardaron antes de que existieran los triggers.
+- Recalculamos solo los parciales de esos días y localizaciones; el resto se quedan como estaban.
+- Combinamos todos los parciales con merge_partials_plan.
+
+El resultado es exactamente el mismo que get_stats_dataframe(get_polars_hourly_latest()).
+"""
+
+import sqlite3
+
+import polars as pl
+from scripts_1_7_weather_apis.db_connection import get_connection, transaction
+from scripts_1_7_weather_apis.db_normalized import create_normalized_schema
+
+from .data_processor import (
+    daily_partials_plan,
+    export_table,
+    merge_partials_plan,
+    parse_hourly_dates,
+)
+from .db_connector import _read_hourly_rows
+
+PARTIALS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS daily_partials (
+    lat TEXT NOT NULL,
+    lon TEXT NOT NULL,
+    day TEXT NOT NULL,
+    n_hours INTEGER NOT NULL,
+    temp_sum REAL,
+    temp_min REAL,
+    temp_max REAL,
+    precip_sum REAL,
+    PRIMARY KEY (lat, lon, day)
+);
+
+CREATE TABLE IF NOT EXISTS stats_watermark (
+    name TEXT PRIMARY KEY,
+    fetch_id INTEGER NOT NULL  -- última captura ya incluida en los agregados
+);
+
+CREATE TABLE IF NOT EXISTS stats_changed_days (
+    lat TEXT NOT NULL,
+    lon TEXT NOT NULL,
+    day TEXT NOT NULL,
+    PRIMARY KEY (lat, lon, day)
+);
+"""
+
+# Triggers que apuntan los días cambiados de hourly_latest (van aparte porque su cuerpo
+# lleva ';' y PARTIALS_SCHEMA se ejecuta sentencia a sentencia). No se usa INSERT OR IGNORE:
+# dentro de un trigger, el ON CONFLICT del upsert que lo dispara sustituye a ese OR IGNORE.
+_MARK_DAY = """
+    INSERT INTO stats_changed_days (lat, lon, day)
+    SELECT {row}.lat, {row}.lon, substr({row}.date, 1, 10)
+    WHERE NOT EXISTS (
+        SELECT 1 FROM stats_changed_days
+        WHERE lat = {row}.lat AND lon = {row}.lon AND day = substr({row}.date, 1, 10)
+    );"""
+CHANGE_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_hourly_latest_insert AFTER INSERT ON hourly_latest
+    BEGIN {_MARK_DAY.format(row="NEW")} END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_hourly_latest_update AFTER UPDATE ON hourly_latest
+    BEGIN {_MARK_DAY.format(row="OLD")} {_MARK_DAY.format(row="NEW")} END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_hourly_latest_delete AFTER DELETE ON hourly_latest
+    BEGIN {_MARK_DAY.format(row="OLD")} END
+    """,
+]
+
+WATERMARK_NAME = "daily_partials"
+
+PARTIALS_SCHEMA_POLARS = {
+    "lat": pl.String,
+    "lon": pl.String,
+    "date_no_time": pl.String,
+    "n_hours": pl.Int64,
+    "temp_sum": pl.Float64,
+    "temp_min": pl.Float64,
+    "temp_max": pl.Float64,
+    "precip_sum": pl.Float64,
+}
+
+# Días (localización y día) con alguna hora que ha cambiado: los apuntados por los triggers y
+# los de las capturas posteriores a la marca
+CHANGED_DAYS = """
+    SELECT lat, lon, day FROM stats_changed_days
+    UNION
+    SELECT lat, lon, substr(date, 1, 10)
+    FROM hourly_latest
+    WHERE fetch_id > ?
+"""
+
+ALL_DAYS = "SELECT DISTINCT lat, lon, substr(date, 1, 10) FROM hourly_latest"
+
+# Todas las horas de los días afectados (usa la clave primaria lat, lon, date de hourly_latest)
+AFFECTED_HOURS = """
+    SELECT h.fetch_id AS id, h.timestamp_captura, h.lat, h.lon, h.date, h.weather,
+           h.temperature, h.humidity, h.apparent_temp, h.precip_total, h.precip_type,
+           h.precip_prob, h.summary
+    FROM affected_days a
+    JOIN hourly_latest h
+      ON h.lat = a.lat AND h.lon = a.lon
+     AND h.date >= a.day AND h.date < date(a.day, '+1 day')
+    ORDER BY h.lat, h.lon, h.date
+"""
+
+
+def create_partials_schema(conn):
+    """Crea las tablas de agregados parciales (y la tabla temporal de días afectados)."""
+    create_normalized_schema(conn)
+    with transaction(conn=conn):
+        for statement in PARTIALS_SCHEMA.split(";"):
+            if statement.strip():
+                conn.execute(statement)
+        for trigger in CHANGE_TRIGGERS:
+            conn.execute(trigger)
+        conn.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS affected_days (lat TEXT, lon TEXT, day TEXT)"
+        )
+
+
+def get_watermark(conn):
+    """Id de la última captura incluida en los agregados parciales (0 si no hay ninguna)."""
+    row = conn.execute(
+        "SELECT fetch_id FROM stats_watermark WHERE name = ?", (WATERMARK_NAME,)
+    ).fetchone()
+    return row[0] if row else 0
+
+
+def update_daily_partials(full=False):
+    """
+    Actualiza los agregados parciales con las horas que han cambiado desde la última vez.
+    Con full=True los recalcula todos desde cero. Devuelve el número de días
+    (localización y día) recalculados.
+    """
+    conn = get_connection()
+    create_partials_schema(conn)
+
+    with transaction():
+        if full:
+            conn.execute("DELETE FROM daily_partials")
+            conn.execute("DELETE FROM stats_watermark WHERE name = ?", (WATERMARK_NAME,))
+
+        # Todo va en la misma transacción de escritura: nada puede cambiar hourly_latest
+        # mientras tanto, así que lo apuntado hasta aquí es exactamente lo que se recalcula
+        watermark = get_watermark(conn)
+        new_watermark = conn.execute("SELECT COALESCE(MAX(id), 0) FROM fetches").fetchone()[0]
+
+        conn.execute("DELETE FROM affected_days")
+        if watermark == 0:
+            # Primera vez (o full=True): todos los días
+            conn.execute(f"INSERT INTO affected_days (lat, lon, day) {ALL_DAYS}")
+        else:
+            conn.execute(
+                f"INSERT INTO affected_days (lat, lon, day) {CHANGED_DAYS}", (watermark,)
+            )
+        conn.execute("DELETE FROM stats_changed_days")
+        n_days = conn.execute("SELECT COUNT(*) FROM affected_days").fetchone()[0]
+
+        if n_days:
+            rows = _read_hourly_rows(AFFECTED_HOURS, [])
+            partials = daily_partials_plan(parse_hourly_dates(rows)).with_columns(
+                pl.col("date_no_time").cast(pl.String)
+            )
+
+            # Sustituimos los parciales de los días afectados (un día puede quedarse sin
+            # parcial si ya no tiene ninguna temperatura válida)
+            conn.execute(
+                """
+                DELETE FROM daily_partials
+                WHERE (lat, lon, day) IN (SELECT lat, lon, day FROM affected_days)
+                """
+            )
+            conn.executemany(
+                """
+                INSERT INTO daily_partials (lat, lon, day, n_hours, temp_sum, temp_min,
+                    temp_max, precip_sum)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                partials.select(PARTIALS_SCHEMA_POLARS.keys()).iter_rows(),
+            )
+
+        conn.execute(
+            """
+            INSERT INTO stats_watermark (name, fetch_id) VALUES (?, ?)
+            ON CONFLICT (name) DO UPDATE SET fetch_id = excluded.fetch_id
+            """,
+            (WATERMARK_NAME, new_watermark),
+        )
+
+    return n_days
+
+
+def read_daily_partials():
+    """Agregados parciales guardados, con las columnas de daily_partials_plan."""
+    df = pl.read_database(
+        query="""
+            SELECT lat, lon, day AS date_no_time, n_hours, temp_sum, temp_min, temp_max,
+                   precip_sum
+            FROM daily_partials
+        """,
+        connection=get_connection(),
+        schema_overrides=PARTIALS_SCHEMA_POLARS,
+    )
+    return df.with_columns(pl.col("date_no_time").str.to_date())
+
+
+def get_incremental_stats_dataframe(export=True, export_format="csv", full=False):
+    """
+    Estadísticas por día (las mismas columnas que get_stats_dataframe) a partir de los
+    agregados parciales, recalculando solo los días que han cambiado desde la última vez.
+    """
+    try:
+        n_days = update_daily_partials(full=full)
+        print(f"Estadísticas diarias: {n_days} días (por localización) recalculados.")
+        df_stats = merge_partials_plan(read_daily_partials())
+
+    except sqlite3.Error as e:
+        print(f"Error al actualizar las estadísticas en SQLite: {e}")
+        return None
+
+    if export:
+        export_table(df_stats, "Estadísticas_diarias", export_format)
+
+    return df_stats
+
+
+if __name__ == "__main__":
+    df_stats = get_incremental_stats_dataframe()
+
+    if df_stats is not None:
+        print(df_stats.head(10))
@@ -0,0 +1,203 @@
+"""
+Capas silver y gold en Parquet.
+
+Alternativa a export_to_csv: los dataframes se guardan en Parquet (comprimido con zstd y con
+los tipos de fecha ya convertidos) y particionados en carpetas estilo Hive
+(por ejemplo silver_layer/Tiempo_por_horas/location=Sevilla/day=2026-03-22/part-....parquet).
+
+Las tablas acumulativas (por horas y estadísticas diarias) no se reescriben enteras: cada
+exportación sustituye solo las particiones que trae (modo "overwrite", el pronóstico nuevo
+sustituye al antiguo) o añade ficheros nuevos (modo "append"). Para leerlas se usa
+scan_parquet, así que los filtros por localización o fecha solo abren las carpetas necesarias.
+"""
+
+import uuid
+from datetime import date, datetime
+from pathlib import Path
+
+import polars as pl
+from scripts_1_7_weather_apis.db_connection import BASE_DIR
+from scripts_1_7_weather_apis.locations import LOCATIONS
+
+COMPRESSION = "zstd"
+
+# Capa y columnas de partición de cada tabla. "day" se calcula a partir de la columna indicada.
+TABLES = {
+    "Tiempo_por_horas": {
+        "layer": "silver_layer",
+        "partition_by": ["location", "day"],
+        "day_from": "date",
+        "mode": "overwrite",
+    },
+    "Tiempo_actual": {
+        "layer": "silver_layer",
+        "partition_by": [],
+        "day_from": None,
+        "mode": "replace",  # No es acumulativa: siempre se sustituye entera
+    },
+    "Estadísticas_diarias": {
+        "layer": "gold_layer",
+        "partition_by": ["day"],
+        "day_from": "date_no_time",
+        "mode": "overwrite",
+    },
+    # Características de los modelos (ver scripts_3_3/feature_store.py)
+    "Características_por_horas": {
+        "layer": "feature_store",
+        "partition_by": ["location", "day"],
+        "day_from": "date",
+        "mode": "overwrite",
+    },
+}
+WRITE_MODES = ("append", "overwrite", "replace")
+
+# Nombre de cada localización a partir de sus coordenadas ("lat,lon")
+_LOCATION_NAMES = {f"{lat},{lon}": name for name, (lat, lon) in LOCATIONS.items()}
+
+
+def table_dir(filename):
+    """Carpeta del dataset Parquet de una tabla."""
+    layer = TABLES.get(filename, {}).get("layer", "silver_layer")
+    return Path(BASE_DIR) / "data_output" / layer / filename
+
+
+def with_location(df):
+    """
+    Añade la columna 'location' con el nombre registrado de las coordenadas
+    (o "lat_lon" si no están en el registro de localizaciones).
+    """
+    coords = pl.concat_str([pl.col("lat"), pl.col("lon")], separator=",")
+    return df.with_columns(
+        coords.replace_strict(
+            _LOCATION_NAMES,
+            default=pl.concat_str([pl.col("lat"), pl.col("lon")], separator="_"),
+            return_dtype=pl.String,
+        ).alias("location")
+    )
+
+
+def _write_part(df, directory, overwrite):
+    """Escribe un fichero Parquet en 'directory'; con 'overwrite' borra antes los que hubiera."""
+    directory.mkdir(parents=True, exist_ok=True)
+    old_files = list(directory.glob("*.parquet")) if overwrite else []
+
+    # Primero escribimos el fichero nuevo y después borramos los antiguos, para no dejar
+    # nunca la partición vacía si algo falla a mitad
+    df.write_parquet(
+        directory / f"part-{uuid.uuid4().hex}.parquet", compression=COMPRESSION
+    )
+    for old_file in old_files:
+        old_file.unlink()
+
+
+def export_to_parquet(df, filename, mode=None):
+    """
+    Exportar un DataFrame de Polars a Parquet particionado.
+    'mode' puede ser "append" (añade ficheros), "overwrite" (sustituye solo las particiones
+    que aparecen en 'df') o "replace" (sustituye la tabla entera); por defecto, el de TABLES.
+    """
+    spec = TABLES.get(
+        filename,
+        {"layer": "silver_layer", "partition_by": [], "day_from": None, "mode": "replace"},
+    )
+    mode = mode or spec["mode"]
+    if mode not in WRITE_MODES:
+        raise ValueError(f"mode debe ser uno de {WRITE_MODES}")
+
+    root = table_dir(filename)
+    keys = spec["partition_by"]
+
+    if "location" in keys:
+        df = with_location(df)
+    if "day" in keys:
+        df = df.with_columns(pl.col(spec["day_from"]).dt.date().alias("day"))
+
+    if mode == "replace" and root.exists():
+        for old_file in root.rglob("*.parquet"):
+            old_file.unlink()
+
+    if not keys:
+        _write_part(df, root, overwrite=mode != "append")
+    else:
+        # Las claves de partición van en la ruta, no dentro de los ficheros
+        for values, part in df.partition_by(keys, as_dict=True).items():
+            directory = root.joinpath(
+                *(f"{key}={value}" for key, value in zip(keys, values))
+            )
+            _write_part(part.drop(keys), directory, overwrite=mode != "append")
+
+    print(f"Archivo exportado correctamente: {root} (Parquet, {mode})")
+
+
+def has_parquet(filename):
+    """Indica si ya hay datos en Parquet para una tabla."""
+    root = table_dir(filename)
+    return root.exists() and any(root.rglob("*.parquet"))
+
+
+def scan_table(filename):
+    """
+    LazyFrame sobre el dataset Parquet de una tabla. Las columnas de partición (location, day)
+    vuelven como columnas, y filtrar por ellas evita abrir el resto de carpetas.
+    """
+    return pl.scan_parquet(
+        table_dir(filename) / "**" / "*.parquet",
+        hive_partitioning=True,
+    )
+
+
+def _as_date(value):
+    """Convierte un texto ISO, datetime o date en date (para filtrar por día)."""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def filter_table(lf, filename, start=None, end=None, locations=None, day=None):
+    """
+    Filtra un LazyFrame de una tabla por rango de días (start <= day < end) y por nombres de
+    localización. 'day' es la expresión con el día de cada fila (por defecto, la columna
+    'day_from' de TABLES convertida a fecha).
+    """
+    spec = TABLES.get(filename, {})
+    if day is None and spec.get("day_from"):
+        day = pl.col(spec["day_from"]).cast(pl.Date)
+
+    if day is not None:
+        if start is not None:
+            lf = lf.filter(day >= _as_date(start))
+        if end is not None:
+            lf = lf.filter(day < _as_date(end))
+
+    if locations:
+        if "location" not in lf.collect_schema().names():
+            lf = with_location(lf)
+        lf = lf.filter(pl.col("location").is_in(list(locations)))
+
+    return lf
+
+
+def load_table(filename, csv_path, start=None, end=None, locations=None):
+    """
+    LazyFrame de una tabla de las capas silver/gold, con las fechas ya tipadas.
+    Usa el dataset Parquet si existe y, si no, el CSV de siempre (con try_parse_dates).
+    Opcionalmente filtra por rango de días (start <= day < end) y por nombres de localización;
+    en Parquet esos filtros se resuelven con las carpetas de partición.
+    """
+    spec = TABLES.get(filename, {})
+
+    if has_parquet(filename):
+        lf = scan_table(filename)
+        day = pl.col("day") if "day" in spec.get("partition_by", []) else None
+    else:
+        # Leemos lat/lon como texto, igual que en la base de datos
+        lf = pl.scan_csv(
+            csv_path,
+            try_parse_dates=True,
+            schema_overrides={"lat": pl.String, "lon": pl.String},
+        )
+        day = None
+
+    return filter_table(lf, filename, start, end, locations, day=day)
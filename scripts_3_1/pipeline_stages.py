@@ -0,0 +1,298 @@
+"""
+Ejecución de main.py por etapas, con caché por contenido.
+
+La cadena de main.py se divide en cuatro etapas:
+    fetch (pedir datos nuevos) → decode (decodificar la última captura)
+    → silver (tablas por horas, actual y estadísticas) → dashboard (gráficos)
+
+Cada etapa tiene una huella de entrada (hash de la salida de la etapa anterior y de sus
+parámetros) y una huella de salida (hash de lo que produce). Las huellas se guardan en
+STAGE_CACHE_PATH; si la huella de entrada de una etapa no ha cambiado desde la última ejecución
+(y sus ficheros siguen ahí), la etapa se salta y se reutiliza su huella de salida, así que las
+siguientes también se saltan.
+
+Si una etapa que se ha saltado hace falta en memoria para una posterior (por ejemplo, con
+--only dashboard), se reconstruye su salida (load): decode vuelve a leer la última captura y
+silver lee las tablas exportadas. Los dataframes de silver pasan directamente al visualizador,
+sin volver a leer los CSV.
+
+Cada etapa importa lo que necesita al ejecutarse (Polars, Plotly...): una ejecución que solo
+pide datos nuevos (main.py fetch) no carga esas librerías. Los módulos de cada etapa están en
+STAGE_SPECS["modules"] (los usa benchmarks/bench_startup.py para medir el tiempo de carga).
+
+Cada etapa que se ejecuta se mide con metrics.stage (tiempo, filas de entrada y salida según
+STAGE_SPECS["rows"], bytes leídos y escritos y, si se pide, su perfil con cProfile); main.py
+guarda las métricas y los eventos en METRICS_DIR con --metrics y los perfiles con --profile.
+"""
+
+import hashlib
+import json
+import os
+
+from scripts_1_7_weather_apis import metrics
+from scripts_1_7_weather_apis.db_connection import BASE_DIR, get_connection
+
+STAGE_CACHE_PATH = os.path.join(BASE_DIR, "data_output", "stage_cache.json")
+METRICS_DIR = os.path.join(BASE_DIR, "data_output", "metrics")
+STAGES = ["fetch", "decode", "silver", "dashboard"]
+TABLE_NAME = "openmeteo"
+SILVER_TABLES = ["Tiempo_por_horas", "Tiempo_actual", "Estadísticas_diarias"]
+
+
+def hash_values(*values):
+    """Hash SHA-256 (hex) de una serie de valores serializables en JSON."""
+    raw = json.dumps(values, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def hash_frame(df):
+    """Huella del contenido de un DataFrame (esquema y hash de cada fila)."""
+    digest = hashlib.sha256(str(df.schema).encode("utf-8"))
+    digest.update(df.hash_rows(seed=0).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def database_fingerprint(table_name=TABLE_NAME):
+    """Huella barata del estado de la tabla de capturas (último id y número de filas)."""
+    try:
+        row = get_connection().execute(
+            f"SELECT MAX(id), COUNT(*) FROM {table_name}"
+        ).fetchone()
+    except Exception:
+        row = None
+    return hash_values(table_name, row)
+
+
+def load_stage_cache(path=None):
+    path = path or STAGE_CACHE_PATH
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_stage_cache(cache, path=None):
+    path = path or STAGE_CACHE_PATH
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(cache, f, indent=2)
+
+
+# --- Etapas ---
+# run(ctx) calcula la salida, la deja en 'ctx' y devuelve su huella; load(ctx) reconstruye en
+# 'ctx' la salida de una etapa que se ha saltado; outputs_exist(ctx) indica si sus ficheros siguen.
+# rows(ctx) devuelve las filas (entrada, salida) de la última ejecución para las métricas.
+
+
+def _height(df):
+    return df.height if df is not None else None
+
+
+def run_fetch(ctx):
+    from scripts_1_7_weather_apis.extract_openmeteo import get_open_meteo
+
+    ctx["documents"] = get_open_meteo()
+    return database_fingerprint()
+
+
+def fetch_rows(ctx):
+    documents = ctx.get("documents") or {}
+    return None, len(documents)
+
+
+def run_decode(ctx):
+    from .db_connector import get_polars_df_from_last_fetch
+
+    df = get_polars_df_from_last_fetch(TABLE_NAME)
+    ctx["df"] = df
+    return hash_frame(df) if df is not None else None
+
+
+def load_decode(ctx):
+    run_decode(ctx)
+
+
+def decode_rows(ctx):
+    return None, _height(ctx.get("df"))
+
+
+def run_silver(ctx):
+    from .data_processor import run_pipeline
+
+    if ctx.get("df") is None:
+        print("No hay datos decodificados: no se generan las tablas.")
+        return None
+    df_hourly, df_current, df_stats = run_pipeline(
+        ctx["df"], export_format=ctx["export_format"]
+    )
+    ctx.update(df_hourly=df_hourly, df_current=df_current, df_stats=df_stats)
+    return hash_values(hash_frame(df_hourly), hash_frame(df_current), hash_frame(df_stats))
+
+
+def load_silver(ctx):
+    from .parquet_store import load_table
+    from .visualizer import DIRS
+
+    ctx["df_hourly"] = load_table("Tiempo_por_horas", DIRS["HOURLY_WEATHER"]).collect()
+    ctx["df_stats"] = load_table("Estadísticas_diarias", DIRS["DAILY_STATS"]).collect()
+
+
+def silver_rows(ctx):
+    outputs = [_height(ctx.get(key)) for key in ("df_hourly", "df_current", "df_stats")]
+    return _height(ctx.get("df")), sum(n for n in outputs if n is not None)
+
+
+def silver_outputs_exist(ctx):
+    from .parquet_store import has_parquet
+    from .visualizer import DIRS
+
+    csv_ok = all(os.path.exists(path) for path in DIRS.values())
+    parquet_ok = all(has_parquet(filename) for filename in SILVER_TABLES)
+    return {"csv": csv_ok, "parquet": parquet_ok, "both": csv_ok and parquet_ok}[
+        ctx["export_format"]
+    ]
+
+
+def run_dashboard(ctx):
+    from .visualizer import plot_combined_dashboard
+
+    plot_combined_dashboard(df_hourly=ctx.get("df_hourly"), df_stats=ctx.get("df_stats"))
+    return None
+
+
+def dashboard_rows(ctx):
+    inputs = [_height(ctx.get(key)) for key in ("df_hourly", "df_stats")]
+    return sum(n for n in inputs if n is not None), None
+
+
+def dashboard_outputs_exist(ctx):
+    from .visualizer import OUTPUT_PLOTS_DIR
+
+    return os.path.exists(os.path.join(OUTPUT_PLOTS_DIR, "index.html"))
+
+
+STAGE_SPECS = {
+    "fetch": {
+        "modules": ["scripts_1_7_weather_apis.extract_openmeteo"],
+        "description": "Pedir nuevos datos a la API de OpenMeteo",
+        "run": run_fetch,
+        "rows": fetch_rows,
+        "load": None,
+        "outputs_exist": None,
+        "cacheable": False,  # Siempre se pide a la API (la caché HTTP evita repetir peticiones)
+    },
+    "decode": {
+        "modules": ["scripts_3_1.db_connector"],
+        "description": "Obtener un DataFrame de Polars con la última captura de 'openmeteo'",
+        "run": run_decode,
+        "rows": decode_rows,
+        "load": load_decode,
+        "outputs_exist": None,
+        "cacheable": True,
+    },
+    "silver": {
+        "modules": ["scripts_3_1.data_processor", "scripts_3_1.parquet_store"],
+        "description": "Limpiar y estructurar con Polars: tablas por horas, actual y diarias",
+        "run": run_silver,
+        "rows": silver_rows,
+        "load": load_silver,
+        "outputs_exist": silver_outputs_exist,
+        "cacheable": True,
+    },
+    "dashboard": {
+        "modules": ["scripts_3_1.visualizer", "scripts_3_1.dashboard_data"],
+        "description": "Generar el dashboard combinado con Plotly",
+        "run": run_dashboard,
+        "rows": dashboard_rows,
+        "load": None,
+        "outputs_exist": dashboard_outputs_exist,
+        "cacheable": True,
+    },
+}
+
+
+def select_stages(start_from=None, only=None):
+    """Etapas a ejecutar (en orden) según --from / --only."""
+    for name in [start_from, *(only or [])]:
+        if name is not None and name not in STAGES:
+            raise ValueError(f"Etapa desconocida: '{name}'. Disponibles: {', '.join(STAGES)}")
+    if only:
+        return [name for name in STAGES if name in only]
+    if start_from:
+        return STAGES[STAGES.index(start_from) :]
+    return list(STAGES)
+
+
+def run_stages(
+    start_from=None,
+    only=None,
+    force=False,
+    export_format="csv",
+    on_stage=None,
+    cache_path=None,
+):
+    """
+    Ejecuta las etapas seleccionadas saltando las que no tienen cambios en su entrada
+    (salvo con force=True). 'on_stage(nombre, descripción, saltada)' se llama antes de cada
+    etapa (main.py lo usa para imprimir las cabeceras). Devuelve el contexto con las salidas
+    en memoria (df, df_hourly, df_current, df_stats).
+    """
+    selected = select_stages(start_from, only)
+    cache = load_stage_cache(cache_path)
+    ctx = {"export_format": export_format}
+    upstream = None  # Huella de salida de la etapa anterior
+    missing = []  # Etapas saltadas cuya salida no está en memoria
+
+    for name in STAGES:
+        spec = STAGE_SPECS[name]
+        params = {"export_format": export_format} if name == "silver" else {}
+        input_hash = hash_values(name, upstream, params)
+        entry = cache.get(name, {})
+
+        if name not in selected:
+            # Fuera de la selección: la salida de fetch es el estado actual de la base de datos
+            # (puede haber capturas nuevas del servicio de ingesta); del resto, la última conocida
+            if name == "fetch":
+                upstream = database_fingerprint()
+            else:
+                upstream = entry.get("output_hash", upstream)
+            missing.append(name)
+            continue
+
+        up_to_date = (
+            spec["cacheable"]
+            and not force
+            and entry.get("input_hash") == input_hash
+            and "output_hash" in entry
+            and (spec["outputs_exist"] is None or spec["outputs_exist"](ctx))
+        )
+        if on_stage:
+            on_stage(name, spec["description"], up_to_date)
+        if up_to_date:
+            print(f"Etapa '{name}' sin cambios: se reutiliza su resultado anterior.")
+            metrics.skip_stage(name)
+            upstream = entry["output_hash"]
+            missing.append(name)
+            continue
+
+        # Si la etapa anterior se ha saltado, reconstruimos en memoria su salida
+        previous = STAGES[STAGES.index(name) - 1] if name != STAGES[0] else None
+        if previous in missing and STAGE_SPECS[previous]["load"] is not None:
+            with metrics.timer("stage_load_seconds", stage=previous):
+                STAGE_SPECS[previous]["load"](ctx)
+        missing = []
+
+        with metrics.stage(name) as info:
+            output_hash = spec["run"](ctx)
+            info["rows_in"], info["rows_out"] = spec["rows"](ctx)
+        upstream = output_hash if output_hash is not None else input_hash
+        cache[name] = {"input_hash": input_hash, "output_hash": upstream}
+        save_stage_cache(cache, cache_path)
+
+    return ctx
+
+
+if __name__ == "__main__":
+    ctx = run_stages(start_from="decode")
+    if ctx.get("df_stats") is not None:
+        print(ctx["df_stats"].head(10))
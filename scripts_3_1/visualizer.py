@@ -1,11 +1,8 @@
 import os
 
-import polars as pl
-import plotly.express as px
 from pathlib import Path
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
 from scripts_1_7_weather_apis.db_connection import BASE_DIR
+from .parquet_store import filter_table, load_table
 
 BASE_PATH = Path(BASE_DIR)
 
@@ -22,19 +19,37 @@ DIRS = {
 }
 
 OUTPUT_PLOTS_DIR = f"{BASE_PATH}/docs"
-os.makedirs(OUTPUT_PLOTS_DIR, exist_ok=True)
 
 
-def plot_combined_dashboard():
-    # Carga de datos
-    df_h = pl.read_csv(DIRS["HOURLY_WEATHER"])
-    df_d = pl.read_csv(DIRS["DAILY_STATS"])
-
-    # Procesamiento de fechas
-    df_h = df_h.with_columns(
-        pl.col("date").str.to_datetime().dt.hour().alias("hora"),
-        pl.col("date").str.to_datetime().dt.strftime("%d-%b").alias("dia"),
-    )
+def plot_combined_dashboard(
+    start=None, end=None, locations=None, df_hourly=None, df_stats=None
+):
+    """
+    Dashboard con los tres gráficos. Usa los dataframes 'df_hourly' y 'df_stats' si se pasan
+    (los que acaba de calcular run_pipeline, sin volver a leerlos de disco) y, si no, lee las
+    tablas en Parquet si existen (o los CSV). Opcionalmente se filtran por rango de días y
+    localizaciones.
+    """
+    # Plotly solo se importa al dibujar (importar este módulo para DIRS no lo carga)
+    from plotly.subplots import make_subplots
+
+    from .dashboard_data import daily_traces, heatmap_trace, humidity_scatter_trace
+
+    # Carga de datos (las fechas ya vienen tipadas)
+    if df_hourly is None:
+        df_h = load_table(
+            "Tiempo_por_horas", DIRS["HOURLY_WEATHER"], start, end, locations
+        ).collect()
+    else:
+        df_h = filter_table(
+            df_hourly.lazy(), "Tiempo_por_horas", start, end, locations
+        ).collect()
+    if df_stats is None:
+        df_d = load_table(
+            "Estadísticas_diarias", DIRS["DAILY_STATS"], start, end
+        ).collect()
+    else:
+        df_d = filter_table(df_stats.lazy(), "Estadísticas_diarias", start, end).collect()
 
     # --- CONFIGURACIÓN DE SUBPLOTS ---
     # Definimos 3 filas y 1 columna.
@@ -55,56 +70,19 @@ def plot_combined_dashboard():
         ],
     )
 
-    # 1. Heatmap
-    fig_heat = px.density_heatmap(
-        df_h,
-        x="dia",
-        y="hora",
-        z="temperature",
-        histfunc="avg",
-        color_continuous_scale="RdYlBu_r",
-    )
-    for trace in fig_heat.data:
-        fig.add_trace(trace, row=1, col=1)
-
-    # 2. Scatter
-    fig_scatter = px.scatter(
-        df_h,
-        x="humidity",
-        y="apparent_temp",
-        color="temperature",
-        size="precip_mm",
-        template="plotly_white",
-    )
-    for trace in fig_scatter.data:
-        fig.add_trace(trace, row=2, col=1)
-
-    # 3. Combinado (Gráfico Dual directamente en fig)
-    # Barras: Lluvia
-    fig.add_trace(
-        go.Bar(
-            x=df_d["date_no_time"],
-            y=df_d["precip_total_diaria"],
-            name="Lluvia (mm)",
-            marker_color="rgba(52, 152, 219, 0.6)",
-        ),
-        row=3,
-        col=1,
-        secondary_y=False,
-    )
+    # Los datos se agregan y reducen antes de dibujarlos (ver dashboard_data.py): lo que se
+    # dibuja tiene un tamaño acotado aunque crezca el histórico
 
-    # Línea: Temperatura
-    fig.add_trace(
-        go.Scatter(
-            x=df_d["date_no_time"],
-            y=df_d["temp_avg"],
-            name="Temp. Media (°C)",
-            line=dict(color="#e74c3c", width=4),
-        ),
-        row=3,
-        col=1,
-        secondary_y=True,
-    )
+    # 1. Heatmap (media por día y hora)
+    fig.add_trace(heatmap_trace(df_h), row=1, col=1)
+
+    # 2. Scatter (puntos originales o agrupados en celdas si hay demasiados)
+    fig.add_trace(humidity_scatter_trace(df_h), row=2, col=1)
+
+    # 3. Combinado (Gráfico Dual directamente en fig): barras de lluvia y línea de temperatura
+    bars, line = daily_traces(df_d)
+    fig.add_trace(bars, row=3, col=1, secondary_y=False)
+    fig.add_trace(line, row=3, col=1, secondary_y=True)
 
     # --- DISEÑO FINAL ---
     fig.update_layout(
@@ -120,11 +98,12 @@ def plot_combined_dashboard():
     fig.update_yaxes(title_text="Precipitación (mm)", row=3, col=1, secondary_y=False)
     fig.update_yaxes(title_text="Temp (°C)", row=3, col=1, secondary_y=True)
 
-    fig.update_xaxes(title_text="Día del Mes", row=1, col=1)
+    fig.update_xaxes(title_text="Día", row=1, col=1)
     fig.update_xaxes(title_text="Humedad Relativa (%)", row=2, col=1)
     fig.update_xaxes(title_text="Calendario Semanal", row=3, col=1)
 
     # Exportar un solo archivo
+    os.makedirs(OUTPUT_PLOTS_DIR, exist_ok=True)
     fig.write_html(OUTPUT_PLOTS_DIR + "/index.html")
     print(f"Reporte generado: {OUTPUT_PLOTS_DIR}/index.html")
 
@@ -0,0 +1,272 @@
+"""
+Segmentación del clima incremental (MiniBatchKMeans) con identidades de clúster estables.
+
+El KMeans que usaba main_3_3.py necesitaba todas las filas en memoria y numeraba los
+clústeres en un orden que podía cambiar de un entrenamiento a otro, así que los nombres
+fijos de 'clusters_names' podían acabar en el clúster equivocado. Aquí:
+- Las filas se leen por trozos (collect_batches de Polars, CHUNK_SIZE filas) y el modelo se
+  entrena con MiniBatchKMeans.partial_fit, así que la memoria no crece con el histórico.
+- El escalador se ajusta una sola vez (partial_fit en una primera pasada) y después se guarda
+  y se reutiliza siempre, para que los centroides de distintos entrenamientos estén en el mismo
+  espacio y se puedan comparar.
+- Cada clúster tiene un id estable: tras cada entrenamiento se emparejan los centroides nuevos
+  con los de referencia (los del entrenamiento anterior) con el algoritmo húngaro
+  (linear_sum_assignment) y se renumeran. Los nombres se asignan una sola vez, según los
+  centroides (ver name_clusters), y se mantienen con su id.
+- Las filas nuevas se asignan a un clúster con predict, sin volver a entrenar; update() añade
+  filas nuevas al modelo con partial_fit.
+- El modelo se guarda en el registro de modelos (ModelRegistry) con la huella de los datos,
+  calculada trozo a trozo; si no ha cambiado, se carga en lugar de entrenar.
+"""
+
+import hashlib
+import json
+import math
+
+import numpy as np
+import polars as pl
+import sklearn
+from scipy.optimize import linear_sum_assignment
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.preprocessing import StandardScaler
+
+from .training import CLUSTER_FEATURES, ModelRegistry
+
+MODEL_NAME = "weather_clusters_online"
+CHUNK_SIZE = 50_000
+N_CLUSTERS = 3
+MINIBATCH_PARAMS = {"n_clusters": N_CLUSTERS, "random_state": 42, "n_init": 3}
+MINIBATCH_SIZE = 1_024  # Filas de cada paso de partial_fit dentro de un trozo
+# Pasadas por los datos al entrenar desde cero: las necesarias para dar al menos MIN_STEPS
+# pasos de partial_fit (con poco histórico), como mucho MAX_EPOCHS
+MIN_STEPS = 200
+MAX_EPOCHS = 10
+
+RAIN_NAME = "Alta probabilidad de lluvia"
+WARM_NAME = "Cálido y seco"
+COLD_NAME = "Frío y muy húmedo"
+
+
+def iter_chunks(lf, chunk_size=CHUNK_SIZE):
+    """
+    Trozos de hasta 'chunk_size' filas (solo CLUSTER_FEATURES, sin nulos) de un LazyFrame.
+    Polars puede devolver lotes más pequeños; se juntan hasta llegar a 'chunk_size'.
+    """
+    lf = lf.lazy().select(pl.col(CLUSTER_FEATURES).cast(pl.Float64)).drop_nulls()
+    pending, n_pending = [], 0
+    for batch in lf.collect_batches(chunk_size=chunk_size):
+        pending.append(batch)
+        n_pending += batch.height
+        if n_pending >= chunk_size:
+            yield pl.concat(pending)
+            pending, n_pending = [], 0
+    if n_pending:
+        yield pl.concat(pending)
+
+
+def chunks_fingerprint(lf, chunk_size=CHUNK_SIZE):
+    """Huella de las filas de entrenamiento, calculada trozo a trozo (sin cargarlas enteras)."""
+    digest = hashlib.sha256(
+        json.dumps(
+            [
+                CLUSTER_FEATURES,
+                MINIBATCH_PARAMS,
+                MINIBATCH_SIZE,
+                MIN_STEPS,
+                MAX_EPOCHS,
+                sklearn.__version__,
+            ]
+        ).encode("utf-8")
+    )
+    n_rows = 0
+    for chunk in iter_chunks(lf, chunk_size):
+        digest.update(chunk.hash_rows(seed=0).to_numpy().tobytes())
+        n_rows += chunk.height
+    return digest.hexdigest(), n_rows
+
+
+def name_clusters(centroids):
+    """
+    Nombres de los clústeres a partir de sus centroides (en unidades originales, columnas de
+    CLUSTER_FEATURES): el de mayor probabilidad de lluvia, el más cálido y seco de los
+    restantes y el último. Con otro número de clústeres se numeran.
+    """
+    if len(centroids) != 3:
+        return [f"Clúster {i}" for i in range(len(centroids))]
+    temperature, humidity, precip_prob = (
+        centroids[:, CLUSTER_FEATURES.index(name)]
+        for name in ("temperature", "humidity", "precip_prob")
+    )
+    names = [None] * 3
+    rain = int(np.argmax(precip_prob))
+    names[rain] = RAIN_NAME
+    rest = [i for i in range(3) if i != rain]
+    # Más cálido y seco: mayor diferencia entre temperatura y humedad (cada una relativa a
+    # su rango entre los centroides)
+    score = temperature / (np.ptp(temperature) or 1) - humidity / (np.ptp(humidity) or 1)
+    warm = max(rest, key=lambda i: score[i])
+    names[warm] = WARM_NAME
+    names[next(i for i in rest if i != warm)] = COLD_NAME
+    return names
+
+
+class OnlineWeatherClusters:
+    """Escalador fijo, MiniBatchKMeans y correspondencia de sus etiquetas con ids estables."""
+
+    def __init__(self, scaler=None, model=None, reference=None, names=None, mapping=None):
+        self.scaler = scaler
+        self.model = model
+        self.reference = reference  # Centroides (escalados) en el orden de los ids estables
+        self.names = names
+        self.mapping = mapping  # mapping[etiqueta del modelo] = id estable
+
+    @classmethod
+    def from_previous(cls, previous):
+        """Modelo nuevo que reutiliza el escalador, la referencia y los nombres de 'previous'."""
+        if previous is None:
+            return cls()
+        return cls(previous.scaler, reference=previous.reference, names=previous.names)
+
+    def to_artifacts(self):
+        return {
+            "scaler": self.scaler,
+            "model": self.model,
+            "reference": self.reference,
+            "names": self.names,
+            "mapping": self.mapping,
+        }
+
+    def fit_scaler(self, chunks):
+        """Ajusta el escalador por trozos (solo si todavía no hay uno: después queda fijo)."""
+        if self.scaler is not None:
+            return
+        self.scaler = StandardScaler()
+        for chunk in chunks:
+            self.scaler.partial_fit(chunk.to_numpy())
+
+    def _transform(self, df):
+        return self.scaler.transform(df.select(CLUSTER_FEATURES).to_numpy())
+
+    def fit(self, make_chunks, n_rows):
+        """
+        Entrena desde cero con los trozos de 'make_chunks()' (se llama una vez por pasada) de
+        un total de 'n_rows' filas. Si hay centroides de referencia, el modelo empieza desde ellos.
+        Lanza ValueError si hay menos filas completas que clústeres.
+        """
+        if n_rows < MINIBATCH_PARAMS["n_clusters"]:
+            raise ValueError(
+                f"Hacen falta al menos {MINIBATCH_PARAMS['n_clusters']} filas con "
+                f"{', '.join(CLUSTER_FEATURES)} para entrenar los clústeres (hay {n_rows})"
+            )
+        self.fit_scaler(make_chunks())
+        steps_per_epoch = max(math.ceil(n_rows / MINIBATCH_SIZE), 1)
+        n_epochs = min(math.ceil(MIN_STEPS / steps_per_epoch), MAX_EPOCHS)
+        params = dict(MINIBATCH_PARAMS)
+        if self.reference is not None and len(self.reference) == params["n_clusters"]:
+            params.update(init=self.reference, n_init=1)
+        self.model = MiniBatchKMeans(**params)
+        for _ in range(n_epochs):
+            for chunk in make_chunks():
+                self._partial_fit(chunk)
+        self._match()
+        return self
+
+    def _partial_fit(self, chunk):
+        """Un paso de partial_fit por cada MINIBATCH_SIZE filas del trozo."""
+        X = self._transform(chunk)
+        for start in range(0, len(X), MINIBATCH_SIZE):
+            batch = X[start : start + MINIBATCH_SIZE]
+            # La primera llamada necesita al menos tantas filas como clústeres
+            if len(batch) >= self.model.n_clusters or hasattr(self.model, "cluster_centers_"):
+                self.model.partial_fit(batch)
+
+    def update(self, df):
+        """Añade filas nuevas al modelo (partial_fit) y mantiene los ids estables."""
+        for chunk in iter_chunks(df):
+            self._partial_fit(chunk)
+        self._match()
+        return self
+
+    def _match(self):
+        """Empareja los centroides del modelo con los de referencia y actualiza la referencia."""
+        centers = self.model.cluster_centers_
+        if self.reference is None or len(self.reference) != len(centers):
+            self.mapping = np.arange(len(centers))
+            self.names = name_clusters(self.scaler.inverse_transform(centers))
+        else:
+            distances = np.linalg.norm(
+                centers[:, None, :] - self.reference[None, :, :], axis=2
+            )
+            labels, stable_ids = linear_sum_assignment(distances)
+            self.mapping = np.empty(len(centers), dtype=np.int64)
+            self.mapping[labels] = stable_ids
+        # La referencia sigue a los centroides (en el orden de los ids estables), así que
+        # los desplazamientos lentos de un entrenamiento a otro no cambian los ids
+        reference = np.empty_like(centers)
+        reference[self.mapping] = centers
+        self.reference = reference
+
+    def predict(self, df):
+        """Id estable del clúster de cada fila (nulo si falta alguna variable), sin entrenar."""
+        X = df.select(pl.col(CLUSTER_FEATURES).cast(pl.Float64)).to_numpy()
+        valid = ~np.isnan(X).any(axis=1)
+        ids = np.full(len(X), -1, dtype=np.int64)
+        if valid.any():
+            ids[valid] = self.mapping[self.model.predict(self.scaler.transform(X[valid]))]
+        return pl.Series("cluster_clima", ids).replace(-1, None)
+
+    def describe(self, df):
+        """Columnas 'cluster_clima' (id estable) y 'cluster_descripcion' (nombre) para 'df'."""
+        ids = self.predict(df)
+        names = pl.Series(self.names, dtype=pl.String)
+        return df.with_columns(
+            ids,
+            ids.replace_strict(
+                list(range(len(names))), names, default=None, return_dtype=pl.String
+            ).alias("cluster_descripcion"),
+        )
+
+    def centroids(self):
+        """Centroides en unidades originales, uno por id estable, con su nombre."""
+        return pl.DataFrame(
+            self.scaler.inverse_transform(self.reference), schema=CLUSTER_FEATURES
+        ).with_columns(
+            pl.Series("cluster_descripcion", self.names),
+            pl.int_range(len(self.names)).alias("cluster_clima"),
+        )
+
+
+def train_online_clusters(lf, registry=None, chunk_size=CHUNK_SIZE, force=False):
+    """
+    Entrena (o carga) la segmentación incremental con las filas de 'lf' (LazyFrame o
+    DataFrame), leídas por trozos. Reutiliza el escalador y la referencia de ids del último
+    modelo guardado. Devuelve (OnlineWeatherClusters, status) con status "cached" o "trained".
+    """
+    registry = registry or ModelRegistry()
+    fingerprint, n_rows = chunks_fingerprint(lf, chunk_size)
+
+    entry = None if force else registry.find(MODEL_NAME, fingerprint)
+    artifacts = registry.load(entry) if entry else None
+    if artifacts is not None:
+        print(f"Clústeres sin cambios en los datos: se carga el modelo {fingerprint[:12]}.")
+        return OnlineWeatherClusters(**artifacts), "cached"
+
+    latest = registry.latest(MODEL_NAME)
+    previous = registry.load(latest) if latest else None
+    clusters = OnlineWeatherClusters.from_previous(
+        OnlineWeatherClusters(**previous) if previous else None
+    )
+    clusters.fit(lambda: iter_chunks(lf, chunk_size), n_rows)
+
+    registry.save(
+        MODEL_NAME,
+        fingerprint,
+        clusters.to_artifacts(),
+        status="trained",
+        n_rows=n_rows,
+        features=CLUSTER_FEATURES,
+        names=clusters.names,
+        sklearn=sklearn.__version__,
+    )
+    print(f"Clústeres entrenados por trozos ({n_rows} filas).")
+    return clusters, "trained"
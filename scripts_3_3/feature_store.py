@@ -0,0 +1,303 @@
+"""
+Almacén de características (feature store) por horas para los modelos de main_3_3.py.
+
+main_3_3.py calculaba en cada ejecución la hora, el día de la semana y el clima agrupado a
+partir del CSV, y el clasificador solo veía las cuatro variables de cada hora. Aquí se
+calculan una vez, por localización, también variables de serie temporal:
+- Diferencias con horas anteriores (DELTAS): temperature_delta_1h, humidity_delta_24h,
+  precip_prob_delta_3h (tendencia de la probabilidad de lluvia)...
+- Medias móviles de las últimas 3, 6 y 24 horas (ROLLING): temperature_mean_3h, ...
+
+Las ventanas son por tiempo, no por filas (rolling_mean_by sobre 'date', como
+LazyFrame.rolling), y las horas anteriores se buscan por fecha: si faltan horas en el
+histórico, la diferencia queda nula en lugar de compararse con otra hora.
+
+Las características se guardan en Parquet (tabla FEATURES_TABLE, particionada por
+localización y día como Tiempo_por_horas; ver parquet_store.py) y se actualizan de forma
+incremental: de cada partición (localización, día) de la tabla de origen se guarda una huella
+en el estado del almacén, y solo se recalculan los días nuevos o cambiados y el día siguiente
+a cada uno (sus ventanas miran hasta LOOKBACK_HOURS atrás). El entrenamiento y la inferencia
+leen solo las columnas que necesitan con read_features.
+
+Ejecución:
+    python -m scripts_3_3.feature_store [--force]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+from datetime import date, timedelta
+
+import polars as pl
+
+from scripts_1_7_weather_apis.db_connection import BASE_DIR
+from scripts_3_1.parquet_store import (
+    export_to_parquet,
+    filter_table,
+    has_parquet,
+    load_table,
+    scan_table,
+    table_dir,
+    with_location,
+)
+
+SOURCE_TABLE = "Tiempo_por_horas"
+SOURCE_CSV = os.path.join(BASE_DIR, "Tiempo_por_horas_3_3.csv")
+FEATURES_TABLE = "Características_por_horas"
+STATE_FILE = "state.json"
+
+# Claves de cada serie temporal (una por localización)
+FEATURE_KEYS = ("lat", "lon")
+# Columnas de la tabla de origen de las que dependen las características
+SOURCE_COLUMNS = ["lat", "lon", "date", "weather", "temperature", "humidity", "precip_prob"]
+
+# Variable -> horas hacia atrás con las que se calcula la diferencia ({variable}_delta_{h}h)
+DELTAS = {"temperature": (1, 24), "humidity": (1, 24), "precip_prob": (3,)}
+# Variable -> ventanas (horas) de las medias móviles ({variable}_mean_{h}h)
+ROLLING = {"temperature": (3, 6, 24), "humidity": (3, 6, 24), "precip_prob": (3, 6, 24)}
+
+# Variables de ventana (las que usa el clasificador además de las de cada hora)
+WINDOW_FEATURES = [
+    *(f"{column}_delta_{hours}h" for column, lags in DELTAS.items() for hours in lags),
+    *(f"{column}_mean_{hours}h" for column, windows in ROLLING.items() for hours in windows),
+]
+FEATURE_COLUMNS = ["hour", "day_of_week", "weather_clean", *WINDOW_FEATURES]
+
+LOOKBACK_HOURS = max(max(hours) for hours in (*DELTAS.values(), *ROLLING.values()))
+LOOKBACK_DAYS = -(-LOOKBACK_HOURS // 24)  # Días completos que hay que leer hacia atrás
+
+
+def prepare_features(df):
+    """
+    Columnas derivadas que usan los modelos: hora, día de la semana y clima agrupado (este
+    último solo si hay 'weather': en la inferencia las filas no traen la etiqueta).
+    """
+    columns = [
+        pl.col("date").dt.hour().alias("hour"),
+        pl.col("date").dt.weekday().alias("day_of_week"),  # Lunes=1, Domingo=7 en Polars
+    ]
+    if "weather" in df.collect_schema().names():
+        columns.append(pl.col("weather").replace({"rain_shower": "rain"}).alias("weather_clean"))
+    return df.with_columns(columns)
+
+
+def compute_features(rows, keys=FEATURE_KEYS):
+    """
+    Añade FEATURE_COLUMNS a las filas horarias de 'rows' (DataFrame o LazyFrame), calculadas
+    por separado para cada serie de 'keys' (por defecto, cada localización; en la inferencia,
+    cada captura). Si hay varias filas de la misma hora se queda la última.
+    """
+    keys = list(keys)
+    lf = rows.lazy().unique(subset=[*keys, "date"], keep="last", maintain_order=True)
+
+    # Valor de cada variable 'h' horas antes: se une por fecha, no por posición
+    for hours in sorted({h for lags in DELTAS.values() for h in lags}):
+        columns = [column for column, lags in DELTAS.items() if hours in lags]
+        previous = lf.select(
+            *keys,
+            (pl.col("date") + pl.duration(hours=hours)).alias("date"),
+            *(pl.col(column).alias(f"{column}_lag_{hours}h") for column in columns),
+        )
+        lf = lf.join(previous, on=[*keys, "date"], how="left")
+
+    lf = prepare_features(lf.sort([*keys, "date"])).with_columns(
+        *(
+            (pl.col(column) - pl.col(f"{column}_lag_{hours}h")).alias(
+                f"{column}_delta_{hours}h"
+            )
+            for column, lags in DELTAS.items()
+            for hours in lags
+        ),
+        *(
+            pl.col(column)
+            .cast(pl.Float64)
+            .rolling_mean_by("date", window_size=f"{hours}h")
+            .over(keys)
+            .alias(f"{column}_mean_{hours}h")
+            for column, windows in ROLLING.items()
+            for hours in windows
+        ),
+    )
+    lf = lf.drop(
+        [f"{column}_lag_{hours}h" for column, lags in DELTAS.items() for hours in lags]
+    )
+    return lf if isinstance(rows, pl.LazyFrame) else lf.collect()
+
+
+# --- Estado del almacén ---
+
+
+def features_version():
+    """
+    Huella de la definición de las características. Si cambia (o cambia la versión de Polars,
+    que calcula las huellas de las particiones), el almacén se reconstruye entero.
+    """
+    return hashlib.sha256(
+        json.dumps([SOURCE_COLUMNS, DELTAS, ROLLING, pl.__version__]).encode("utf-8")
+    ).hexdigest()
+
+
+def _state_path():
+    return table_dir(FEATURES_TABLE) / STATE_FILE
+
+
+def load_state():
+    path = _state_path()
+    if not path.exists():
+        return {"version": None, "partitions": {}}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_state(state):
+    path = _state_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _partition_key(location, day):
+    return f"{location}/{day.isoformat()}"
+
+
+def _split_key(key):
+    location, day = key.rsplit("/", 1)
+    return location, date.fromisoformat(day)
+
+
+# --- Actualización y lectura ---
+
+
+def source_rows(lf):
+    """Columnas de origen con 'location' y 'day' (las de las carpetas si es Parquet)."""
+    names = lf.collect_schema().names()
+    if "location" not in names:
+        lf = with_location(lf)
+    if "day" not in names:
+        lf = lf.with_columns(pl.col("date").dt.date().alias("day"))
+    return lf.select("location", "day", *SOURCE_COLUMNS)
+
+
+def partition_fingerprints(source):
+    """Huella de cada partición (localización, día) de la tabla de origen: {clave: huella}."""
+    df = (
+        source.group_by("location", "day")
+        .agg(
+            pl.len().alias("rows"),
+            # La suma (con desbordamiento) no depende del orden de las filas
+            pl.struct(SOURCE_COLUMNS).hash(seed=0).sum().alias("hash"),
+        )
+        .collect(engine="streaming")
+    )
+    return {
+        _partition_key(location, day): f"{rows}:{digest}"
+        for location, day, rows, digest in df.iter_rows()
+    }
+
+
+def affected_partitions(changed, existing):
+    """Particiones que hay que recalcular: las cambiadas y los días siguientes que existan."""
+    affected = set()
+    for key in changed:
+        location, day = _split_key(key)
+        for offset in range(LOOKBACK_DAYS + 1):
+            candidate = _partition_key(location, day + timedelta(days=offset))
+            if candidate in existing:
+                affected.add(candidate)
+    return affected
+
+
+def update_features(source=None, force=False):
+    """
+    Actualiza el almacén con las horas nuevas o cambiadas de 'source' (LazyFrame de
+    Tiempo_por_horas; por defecto, load_table). Con 'force' se reconstruye entero.
+    Devuelve el número de filas escritas.
+    """
+    if source is None:
+        source = load_table(SOURCE_TABLE, SOURCE_CSV)
+    source = source_rows(source.lazy())
+
+    state = load_state()
+    if force or state["version"] != features_version():
+        shutil.rmtree(table_dir(FEATURES_TABLE), ignore_errors=True)
+        state = {"version": features_version(), "partitions": {}}
+
+    fingerprints = partition_fingerprints(source)
+    stored = state["partitions"]
+    changed = {key for key, value in fingerprints.items() if stored.get(key) != value}
+    removed = set(stored) - set(fingerprints)
+
+    for key in removed:
+        location, day = _split_key(key)
+        shutil.rmtree(
+            table_dir(FEATURES_TABLE) / f"location={location}" / f"day={day}",
+            ignore_errors=True,
+        )
+        del stored[key]
+
+    pending = {}
+    for key in affected_partitions(changed | removed, fingerprints):
+        location, day = _split_key(key)
+        pending.setdefault(location, set()).add(day)
+
+    # Una localización cada vez, leyendo solo sus días pendientes y LOOKBACK_DAYS antes
+    written = 0
+    for location, days in sorted(pending.items()):
+        rows = source.filter(
+            (pl.col("location") == location)
+            & pl.col("day").is_between(
+                min(days) - timedelta(days=LOOKBACK_DAYS), max(days)
+            )
+        )
+        features = compute_features(rows).filter(pl.col("day").is_in(list(days)))
+        df = features.collect()
+        export_to_parquet(df.drop("location", "day"), FEATURES_TABLE)
+        written += df.height
+
+        # El estado se guarda después de escribir cada localización
+        for day in days:
+            key = _partition_key(location, day)
+            stored[key] = fingerprints[key]
+        save_state(state)
+
+    save_state(state)
+    print(
+        f"Almacén de características: {sum(len(d) for d in pending.values())} días "
+        f"recalculados ({written} filas), {len(fingerprints)} días en total."
+    )
+    return written
+
+
+def read_features(columns=None, start=None, end=None, locations=None):
+    """
+    LazyFrame del almacén con solo las columnas 'columns' (por defecto, todas), filtrado
+    opcionalmente por rango de días (start <= day < end) y por localizaciones. Al ser
+    Parquet particionado, solo se leen esas columnas y las carpetas de esos días.
+    """
+    if not has_parquet(FEATURES_TABLE):
+        raise FileNotFoundError(
+            "El almacén de características está vacío: ejecuta antes update_features"
+        )
+    lf = filter_table(
+        scan_table(FEATURES_TABLE), FEATURES_TABLE, start, end, locations, day=pl.col("day")
+    )
+    return lf.select(columns) if columns else lf
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Actualizar el almacén de características por horas"
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="recalcular todas las características"
+    )
+    args = parser.parse_args(argv)
+    update_features(force=args.force)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+"""
+Inferencia del clasificador del clima por lotes y en streaming.
+
+WeatherClassifier carga una sola vez el escalador, el codificador y el RandomForest guardados
+en el registro de modelos (training.py) y predice el clima de filas horarias con las columnas
+de CLASSIFIER_FEATURES (si no vienen, se calculan con compute_features del almacén de
+características, por separado para cada captura; no hace falta la etiqueta 'weather', y sin
+'date' se predice solo con las variables de la hora):
+- predict(datos): DataFrame/LazyFrame de Polars o RecordBatch/Table de Arrow; se predice por
+  trozos de 'batch_size' filas (vectorizado con predict_proba) y se devuelven las filas con
+  'weather_pred' y 'weather_prob' (probabilidad de la clase predicha).
+- predict_stream(lotes): lo mismo para un iterable de lotes (por ejemplo iter_history_batches),
+  devolviendo un lote etiquetado por cada lote de entrada.
+
+label_new_hours etiqueta las horas de las capturas que todavía no se han etiquetado (las de id
+mayor que la marca de 'prediction_watermark') y guarda las predicciones en la tabla
+'weather_predictions'. Se puede ejecutar después de get_open_meteo o, con --follow, como etapa
+del servicio de ingesta: cada lote que guarda el escritor se etiqueta justo después.
+
+Ejecución:
+    python -m scripts_3_3.inference [--follow]
+"""
+
+import argparse
+
+import numpy as np
+import polars as pl
+import pyarrow as pa
+
+from scripts_1_7_weather_apis.db_connection import get_connection, transaction
+from scripts_3_1.data_processor import hourly_plan, hourly_rows, parse_hourly_dates
+from scripts_3_1.db_connector import HISTORY_BATCH_SIZE, iter_history_batches
+
+from .feature_store import FEATURE_KEYS, compute_features
+from .training import CLASSIFIER_FEATURES, HOURLY_FEATURES, ModelRegistry
+
+BATCH_SIZE = 10_000  # Filas por llamada a predict_proba
+MODEL_NAME = "weather_classifier"
+
+PREDICTIONS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS weather_predictions (
+    fetch_id INTEGER NOT NULL,
+    lat TEXT NOT NULL,
+    lon TEXT NOT NULL,
+    date TEXT NOT NULL,
+    weather_pred TEXT NOT NULL,
+    weather_prob REAL NOT NULL,
+    model TEXT NOT NULL,  -- huella del modelo que hizo la predicción
+    PRIMARY KEY (fetch_id, lat, lon, date)
+);
+
+CREATE TABLE IF NOT EXISTS prediction_watermark (
+    name TEXT PRIMARY KEY,
+    fetch_id INTEGER NOT NULL  -- última captura ya etiquetada
+);
+"""
+
+
+def to_frame(data):
+    """DataFrame de Polars a partir de un DataFrame, LazyFrame, RecordBatch o Table de Arrow."""
+    if isinstance(data, pl.LazyFrame):
+        return data.collect()
+    if isinstance(data, (pa.RecordBatch, pa.Table)):
+        return pl.from_arrow(data)
+    if isinstance(data, pl.DataFrame):
+        return data
+    raise TypeError(f"Tipo de datos no soportado: {type(data).__name__}")
+
+
+class WeatherClassifier:
+    """Clasificador cargado del registro de modelos, listo para predecir muchas filas."""
+
+    def __init__(
+        self, scaler, encoder, model, fingerprint=None, n_jobs=None, feature_names=None
+    ):
+        self.scaler = scaler
+        self.encoder = encoder
+        self.model = model
+        self.fingerprint = fingerprint
+        # Los modelos antiguos del registro se entrenaron con otras variables
+        self.feature_names = feature_names or CLASSIFIER_FEATURES
+        if n_jobs is not None:
+            self.model.set_params(n_jobs=n_jobs)
+
+    @classmethod
+    def from_registry(cls, registry=None, fingerprint=None, n_jobs=None):
+        """
+        Carga el clasificador con esa huella o, si no se indica, el último entrenado.
+        'n_jobs' cambia los hilos que usa el RandomForest al predecir.
+        """
+        registry = registry or ModelRegistry()
+        entry = (
+            registry.find(MODEL_NAME, fingerprint)
+            if fingerprint is not None
+            else registry.latest(MODEL_NAME)
+        )
+        artifacts = registry.load(entry) if entry else None
+        if artifacts is None:
+            raise FileNotFoundError(
+                "No hay ningún clasificador guardado: ejecuta antes main_3_3.py"
+            )
+        return cls(
+            artifacts["scaler"],
+            artifacts["encoder"],
+            artifacts["model"],
+            entry["fingerprint"],
+            n_jobs,
+            entry.get("features"),
+        )
+
+    def prepare(self, df):
+        """
+        Añade a 'df' las variables que le falten: las de compute_features, calculadas por
+        captura ('id') y localización si vienen. Basta con las variables de la hora
+        (HOURLY_FEATURES): sin 'date' no hay ventanas y esas variables quedan nulas.
+        """
+        missing = [name for name in self.feature_names if name not in df.columns]
+        if not missing:
+            return df
+        if "date" not in df.columns:
+            return df.with_columns(pl.lit(None, dtype=pl.Float64).alias(name) for name in missing)
+        if df.schema["date"] == pl.String:
+            df = df.with_columns(pl.col("date").str.to_datetime(strict=False))
+        keys = [key for key in ("id", *FEATURE_KEYS) if key in df.columns]
+        if keys:
+            return compute_features(df, keys)
+        # Sin claves, todas las filas son una misma serie
+        return compute_features(df.with_columns(pl.lit(0).alias("_serie")), ["_serie"]).drop(
+            "_serie"
+        )
+
+    def features(self, df):
+        """
+        Matriz de variables (float64) y máscara de las filas con todas las variables de la
+        hora (las de ventana pueden ser nulas: el RandomForest admite NaN).
+        """
+        X = df.select(pl.col(self.feature_names).cast(pl.Float64)).to_numpy()
+        required = [self.feature_names.index(name) for name in HOURLY_FEATURES]
+        return X, ~np.isnan(X[:, required]).any(axis=1)
+
+    def predict(self, data, batch_size=BATCH_SIZE):
+        """
+        Filas de 'data' con las columnas 'weather_pred' y 'weather_prob' (nulas en las filas
+        a las que les falta alguna variable de la hora). Si hay que calcular las variables de
+        ventana, las filas vuelven ordenadas por serie y fecha.
+        """
+        df = self.prepare(to_frame(data))
+        X, valid = self.features(df)
+        labels = np.full(df.height, None, dtype=object)
+        probs = np.full(df.height, np.nan)
+
+        rows = np.flatnonzero(valid)
+        for start in range(0, len(rows), batch_size):
+            chunk = rows[start : start + batch_size]
+            proba = self.model.predict_proba(self.scaler.transform(X[chunk]))
+            best = proba.argmax(axis=1)
+            labels[chunk] = self.encoder.inverse_transform(self.model.classes_[best])
+            probs[chunk] = proba[np.arange(len(chunk)), best]
+
+        return df.with_columns(
+            pl.Series("weather_pred", labels, dtype=pl.String),
+            pl.Series("weather_prob", probs).fill_nan(None),
+        )
+
+    def predict_stream(self, batches, batch_size=BATCH_SIZE):
+        """Etiqueta un iterable de lotes (DataFrame o Arrow) y devuelve un lote por cada uno."""
+        for batch in batches:
+            yield self.predict(batch, batch_size)
+
+
+def create_predictions_schema(conn):
+    with transaction(conn=conn):
+        for statement in PREDICTIONS_SCHEMA.split(";"):
+            if statement.strip():
+                conn.execute(statement)
+
+
+def get_prediction_watermark(conn):
+    row = conn.execute(
+        "SELECT fetch_id FROM prediction_watermark WHERE name = ?", (MODEL_NAME,)
+    ).fetchone()
+    return row[0] if row else 0
+
+
+def label_new_hours(
+    classifier=None,
+    table_name="openmeteo",
+    batch_size=BATCH_SIZE,
+    fetch_batch_size=HISTORY_BATCH_SIZE,
+):
+    """
+    Etiqueta las horas de las capturas de 'table_name' que aún no tienen predicción y guarda
+    el resultado en 'weather_predictions'. Las capturas se leen por lotes de
+    'fetch_batch_size' (iter_history_batches). Devuelve el número de horas etiquetadas.
+    """
+    classifier = classifier or WeatherClassifier.from_registry()
+    conn = get_connection()
+    create_predictions_schema(conn)
+
+    watermark = get_prediction_watermark(conn)
+    last_id = conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table_name}").fetchone()[0]
+    if last_id <= watermark:
+        return 0
+
+    batches = (
+        # Mismas filas horarias (y mismo filtro de temperaturas) que la tabla de entrenamiento
+        hourly_plan(
+            parse_hourly_dates(hourly_rows(pl.from_arrow(batch), keys=("id", "lat", "lon")))
+        )
+        for batch in iter_history_batches(
+            table_name, fetch_ids=(watermark + 1, last_id), batch_size=fetch_batch_size
+        )
+    )
+
+    labelled = 0
+    for df in classifier.predict_stream(batches, batch_size):
+        rows = df.drop_nulls("weather_pred").select(
+            "id",
+            "lat",
+            "lon",
+            pl.col("date").dt.strftime("%Y-%m-%dT%H:%M"),
+            "weather_pred",
+            "weather_prob",
+            pl.lit(classifier.fingerprint or "").alias("model"),
+        )
+        with transaction():
+            conn.executemany(
+                """
+                INSERT OR REPLACE INTO weather_predictions (fetch_id, lat, lon, date,
+                    weather_pred, weather_prob, model)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                rows.iter_rows(),
+            )
+        labelled += rows.height
+
+    with transaction():
+        conn.execute(
+            """
+            INSERT INTO prediction_watermark (name, fetch_id) VALUES (?, ?)
+            ON CONFLICT (name) DO UPDATE SET fetch_id = excluded.fetch_id
+            """,
+            (MODEL_NAME, last_id),
+        )
+    return labelled
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Etiquetar las horas capturadas con el clasificador")
+    parser.add_argument(
+        "--follow",
+        action="store_true",
+        help="seguir en marcha con el servicio de ingesta y etiquetar cada lote que guarde",
+    )
+    args = parser.parse_args(argv)
+
+    classifier = WeatherClassifier.from_registry()
+    print(f"Horas etiquetadas: {label_new_hours(classifier)}")
+
+    if args.follow:
+        from scripts_1_7_weather_apis.ingestion_daemon import IngestionDaemon
+
+        def on_flush(documents):
+            print(f"Horas etiquetadas: {label_new_hours(classifier)}")
+
+        IngestionDaemon(on_flush=on_flush).run_forever()
+
+
+if __name__ == "__main__":
+    main()
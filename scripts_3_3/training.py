@@ -0,0 +1,257 @@
+"""
+Entrenamiento de los modelos de main_3_3.py con artefactos reutilizables.
+
+main_3_3.py entrenaba desde cero el RandomForest en cada ejecución (en un solo núcleo) y
+luego lo descartaba. Aquí:
+- Cada entrenamiento se guarda en un registro de modelos (ModelRegistry, en MODELS_DIR): el
+  escalador, el codificador de etiquetas y el modelo, con la huella de los datos de entrada
+  (data_fingerprint: columnas usadas, contenido y parámetros del modelo).
+- Si la huella coincide con la de un modelo ya guardado, no se vuelve a entrenar: se carga.
+- Si los datos han cambiado y hay un RandomForest anterior compatible (mismas variables y
+  clases), se reutiliza con warm_start: se le añaden WARM_START_TREES árboles entrenados con
+  los datos nuevos en lugar de empezar de cero (hasta MAX_TREES; después se reentrena entero).
+  La división entrenamiento/test es fija para cada fila (hash de SPLIT_KEYS, ver
+  split_dataset): los árboles anteriores tampoco han visto las filas de test de ahora.
+- El RandomForest usa todos los núcleos (n_jobs=-1).
+- Los clústeres del clima se entrenan por trozos en clustering.py (train_online_clusters),
+  que usa este mismo registro y CLUSTER_FEATURES.
+- Además de las variables de cada hora, el clasificador usa las de ventana del almacén de
+  características (diferencias y medias móviles, ver feature_store.py). Pueden ser nulas (al
+  principio de cada serie o si faltan horas): el RandomForest admite valores NaN.
+"""
+
+import hashlib
+import json
+import os
+from datetime import datetime
+
+import joblib
+import polars as pl
+import sklearn
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import LabelEncoder, StandardScaler
+
+from scripts_1_7_weather_apis.db_connection import BASE_DIR
+
+from .feature_store import WINDOW_FEATURES
+
+MODELS_DIR = os.path.join(BASE_DIR, "data_output", "models")
+REGISTRY_FILE = "registry.json"
+MAX_VERSIONS = 5  # Entradas que se conservan de cada modelo (se borran las más antiguas)
+
+# Variables de cada hora (sin ellas no se predice) y las de ventana del almacén
+HOURLY_FEATURES = ["temperature", "humidity", "precip_prob", "hour"]
+CLASSIFIER_FEATURES = [*HOURLY_FEATURES, *WINDOW_FEATURES]
+CLASSIFIER_TARGET = "weather_clean"
+CLUSTER_FEATURES = ["temperature", "humidity", "precip_prob"]
+# Identifican cada hora: de su hash depende si la fila es de entrenamiento o de test
+SPLIT_KEYS = ["lat", "lon", "date"]
+# Columnas que main_3_3.py lee del almacén de características
+TRAINING_COLUMNS = list(
+    dict.fromkeys([*SPLIT_KEYS, *CLASSIFIER_FEATURES, CLASSIFIER_TARGET, *CLUSTER_FEATURES])
+)
+
+CLASSIFIER_PARAMS = {"n_estimators": 150, "max_depth": 10, "random_state": 42}
+SPLIT_PARAMS = {"test_size": 0.3, "seed": 42}
+SPLIT_BUCKETS = 1_000
+
+N_JOBS = -1  # Todos los núcleos
+WARM_START_TREES = 50  # Árboles que se añaden al reutilizar un RandomForest
+MAX_TREES = 500
+
+
+def data_fingerprint(df, columns, params=None):
+    """
+    Huella (SHA-256 hex) de los datos de entrenamiento: nombres y tipos de 'columns', hash de
+    cada fila y parámetros del modelo. Si no cambia nada, el modelo entrenado sería el mismo.
+    """
+    data = df.select(columns)
+    digest = hashlib.sha256(
+        json.dumps(
+            [str(data.schema), params or {}, sklearn.__version__],
+            sort_keys=True,
+            default=str,
+        ).encode("utf-8")
+    )
+    digest.update(data.hash_rows(seed=0).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+class ModelRegistry:
+    """
+    Registro de modelos entrenados en disco. Cada entrada guarda sus artefactos (diccionario
+    con escalador, codificador, modelo...) en un fichero joblib y sus metadatos en el índice
+    REGISTRY_FILE: {nombre: [entradas, de la más antigua a la más reciente]}.
+    """
+
+    def __init__(self, root=None):
+        self.root = root or MODELS_DIR
+
+    def _index_path(self):
+        return os.path.join(self.root, REGISTRY_FILE)
+
+    def _read_index(self):
+        if not os.path.exists(self._index_path()):
+            return {}
+        with open(self._index_path(), encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_index(self, index):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = self._index_path() + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self._index_path())
+
+    def entries(self, name):
+        return self._read_index().get(name, [])
+
+    def find(self, name, fingerprint):
+        """Entrada de 'name' con esa huella (o None)."""
+        for entry in reversed(self.entries(name)):
+            if entry["fingerprint"] == fingerprint:
+                return entry
+        return None
+
+    def latest(self, name):
+        entries = self.entries(name)
+        return entries[-1] if entries else None
+
+    def load(self, entry):
+        """Artefactos de una entrada (None si el fichero ya no existe)."""
+        path = os.path.join(self.root, entry["path"])
+        if not os.path.exists(path):
+            return None
+        return joblib.load(path)
+
+    def save(self, name, fingerprint, artifacts, **metadata):
+        """Guarda los artefactos y añade (o sustituye) su entrada en el índice."""
+        path = os.path.join(name, f"{fingerprint[:16]}.joblib")
+        os.makedirs(os.path.join(self.root, name), exist_ok=True)
+        joblib.dump(artifacts, os.path.join(self.root, path))
+
+        entry = {
+            "fingerprint": fingerprint,
+            "path": path,
+            "created": datetime.now().isoformat(timespec="seconds"),
+            **metadata,
+        }
+        index = self._read_index()
+        entries = [
+            old for old in index.get(name, []) if old["fingerprint"] != fingerprint
+        ] + [entry]
+        index[name] = entries[-MAX_VERSIONS:]
+        self._write_index(index)
+
+        for old in entries[:-MAX_VERSIONS]:
+            old_path = os.path.join(self.root, old["path"])
+            if os.path.exists(old_path):
+                os.remove(old_path)
+        return entry
+
+
+def test_mask(df):
+    """
+    Máscara (array booleano) de las filas de test. Cada fila va a test según el hash de sus
+    SPLIT_KEYS, no según las demás filas: aunque el histórico crezca, una hora que fue de
+    test lo sigue siendo (en proporción 'test_size').
+    """
+    buckets = df.select(
+        pl.struct(SPLIT_KEYS).hash(seed=SPLIT_PARAMS["seed"]) % SPLIT_BUCKETS
+    ).to_series()
+    return (buckets < SPLIT_PARAMS["test_size"] * SPLIT_BUCKETS).to_numpy()
+
+
+def split_dataset(df, encoder):
+    """
+    Variables, etiquetas codificadas y división entrenamiento/test (test_mask, fija para cada
+    fila): devuelve X_train, X_test, y_train, y_test.
+    """
+    test = test_mask(df)
+    X = df.select(CLASSIFIER_FEATURES).to_numpy()
+    y = encoder.transform(df.select(CLASSIFIER_TARGET).to_series().to_list())
+    return X[~test], X[test], y[~test], y[test]
+
+
+def _warm_start_candidate(registry, name, classes):
+    """RandomForest anterior al que se le pueden añadir árboles (o None)."""
+    entry = registry.latest(name)
+    if (
+        entry is None
+        or entry.get("features") != CLASSIFIER_FEATURES
+        or entry.get("classes") != classes
+        or entry.get("sklearn") != sklearn.__version__
+        # El hash de test_mask puede cambiar con la versión de Polars
+        or entry.get("polars") != pl.__version__
+    ):
+        return None
+    artifacts = registry.load(entry)
+    if artifacts is None or artifacts["model"].n_estimators + WARM_START_TREES > MAX_TREES:
+        return None
+    return artifacts
+
+
+def train_classifier(df, registry=None, n_jobs=N_JOBS, warm_start=True, force=False):
+    """
+    Entrena (o carga) el clasificador del clima. 'df' debe traer SPLIT_KEYS,
+    CLASSIFIER_FEATURES y CLASSIFIER_TARGET (las columnas de compute_features). Devuelve un
+    diccionario con 'scaler', 'encoder', 'model', 'fingerprint' y 'status' ("cached",
+    "warm_start" o "trained").
+    """
+    registry = registry or ModelRegistry()
+    name = "weather_classifier"
+    fingerprint = data_fingerprint(
+        df,
+        [*SPLIT_KEYS, *CLASSIFIER_FEATURES, CLASSIFIER_TARGET],
+        {**CLASSIFIER_PARAMS, **SPLIT_PARAMS},
+    )
+
+    entry = None if force else registry.find(name, fingerprint)
+    artifacts = registry.load(entry) if entry else None
+    if artifacts is not None:
+        print(f"Clasificador sin cambios en los datos: se carga el modelo {fingerprint[:12]}.")
+        return {**artifacts, "fingerprint": fingerprint, "status": "cached"}
+
+    classes = sorted(df.select(CLASSIFIER_TARGET).to_series().unique().to_list())
+    previous = None if force or not warm_start else _warm_start_candidate(
+        registry, name, classes
+    )
+
+    if previous is not None:
+        # Mismo escalador y codificador que los árboles que ya tiene el modelo
+        scaler, encoder, model = previous["scaler"], previous["encoder"], previous["model"]
+        X_train, _, y_train, _ = split_dataset(df, encoder)
+        model.set_params(
+            warm_start=True,
+            n_estimators=model.n_estimators + WARM_START_TREES,
+            n_jobs=n_jobs,
+        )
+        model.fit(scaler.transform(X_train), y_train)
+        status = "warm_start"
+    else:
+        encoder = LabelEncoder().fit(classes)
+        X_train, _, y_train, _ = split_dataset(df, encoder)
+        scaler = StandardScaler().fit(X_train)
+        model = RandomForestClassifier(**CLASSIFIER_PARAMS, n_jobs=n_jobs)
+        model.fit(scaler.transform(X_train), y_train)
+        status = "trained"
+
+    artifacts = {"scaler": scaler, "encoder": encoder, "model": model}
+    registry.save(
+        name,
+        fingerprint,
+        artifacts,
+        status=status,
+        n_rows=df.height,
+        n_estimators=model.n_estimators,
+        features=CLASSIFIER_FEATURES,
+        classes=classes,
+        sklearn=sklearn.__version__,
+        polars=pl.__version__,
+    )
+    print(
+        f"Clasificador {'ampliado con warm_start' if status == 'warm_start' else 'entrenado'}"
+        f" ({model.n_estimators} árboles, {df.height} filas)."
+    )
+    return {**artifacts, "fingerprint": fingerprint, "status": status}
+
@@ -0,0 +1,145 @@
+"""
+Pruebas de scripts_3_1/backfill.py contra un servidor local que imita la API histórica de
+Open-Meteo (sin red). Ejecución:
+    python -m unittest discover tests
+"""
+
+import json
+import os
+import tempfile
+import threading
+import unittest
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
+
+from scripts_3_1 import backfill, parquet_store
+
+
+class ArchiveStub(BaseHTTPRequestHandler):
+    """Responde como la API histórica: una hora por cada hora de [start_date, end_date]."""
+
+    requests = []  # (latitude, start_date) de cada petición
+    fail = set()  # (latitude, start_date) que responden 404
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        query = {name: values[0] for name, values in parse_qs(urlsplit(self.path).query).items()}
+        key = (query["latitude"], query["start_date"])
+        ArchiveStub.requests.append(key)
+        if key in ArchiveStub.fail:
+            self.send_response(404)
+            self.end_headers()
+            return
+
+        start = date.fromisoformat(query["start_date"])
+        end = date.fromisoformat(query["end_date"])
+        hours = ((end - start).days + 1) * 24
+        first = datetime(start.year, start.month, start.day)
+        times = [first + timedelta(hours=h) for h in range(hours)]
+        body = json.dumps(
+            {
+                "latitude": float(query["latitude"]),
+                "longitude": float(query["longitude"]),
+                "hourly": {
+                    "time": [t.strftime("%Y-%m-%dT%H:%M") for t in times],
+                    "temperature_2m": [15.0 + h % 10 for h in range(hours)],
+                    "relative_humidity_2m": [50 + h % 40 for h in range(hours)],
+                    "apparent_temperature": [14.0 + h % 10 for h in range(hours)],
+                    # Llueve una de cada cuatro horas
+                    "precipitation": [0.5 if h % 4 == 0 else 0.0 for h in range(hours)],
+                    "weather_code": [61 if h % 4 == 0 else 1 for h in range(hours)],
+                },
+            }
+        ).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class BackfillTest(unittest.TestCase):
+    START = date(2024, 1, 1)
+    END = date(2024, 3, 31)  # 91 días: dos tramos de 60 días por localización
+    LOCATIONS = ["Sevilla", "Malaga"]
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), ArchiveStub)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = f"http://127.0.0.1:{cls.server.server_address[1]}/v1/archive"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        ArchiveStub.requests = []
+        ArchiveStub.fail = set()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.checkpoint = os.path.join(tmp.name, "checkpoint.json")
+        patcher = mock.patch.object(parquet_store, "BASE_DIR", tmp.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_backfill(self):
+        return backfill.backfill(
+            self.START,
+            self.END,
+            locations=self.LOCATIONS,
+            chunk_days=60,
+            max_workers=2,
+            batch_chunks=1,
+            url=self.url,
+            checkpoint_path=self.checkpoint,
+        )
+
+    def stored(self):
+        return parquet_store.scan_table(backfill.TABLE_NAME).collect()
+
+    def test_backfill_stores_every_hour_and_resumes(self):
+        rows, failed = self.run_backfill()
+
+        hours = ((self.END - self.START).days + 1) * 24 * len(self.LOCATIONS)
+        self.assertEqual(failed, [])
+        self.assertEqual(rows, hours)
+        self.assertEqual(len(ArchiveStub.requests), 4)
+        df = self.stored()
+        self.assertEqual(df.height, hours)
+        self.assertEqual(df["date"].dt.date().min(), self.START)
+        self.assertEqual(df["date"].dt.date().max(), self.END)
+
+        # La API histórica no tiene precip_prob; lo observado queda en precip_mm
+        self.assertEqual(df["precip_prob"].null_count(), hours)
+        self.assertEqual(df.filter(df["precip_mm"] > 0).height, hours // 4)
+
+        # Con todo en el checkpoint, relanzarlo no pide nada
+        self.assertEqual(self.run_backfill(), (0, []))
+        self.assertEqual(len(ArchiveStub.requests), 4)
+
+    def test_failed_chunk_is_fetched_again(self):
+        sevilla = backfill.resolve_locations(["Sevilla"])[0]
+        ArchiveStub.fail = {(sevilla[1], "2024-03-01")}
+
+        rows, failed = self.run_backfill()
+        self.assertEqual([chunk[0] for chunk in failed], ["Sevilla"])
+        self.assertEqual(rows, (91 - 31) * 24 * 2 + 31 * 24)
+
+        # La segunda ejecución solo pide el tramo que falló
+        ArchiveStub.fail = set()
+        ArchiveStub.requests = []
+        rows, failed = self.run_backfill()
+        self.assertEqual(failed, [])
+        self.assertEqual(rows, 31 * 24)
+        self.assertEqual(ArchiveStub.requests, [(sevilla[1], "2024-03-01")])
+        self.assertEqual(self.stored().height, 91 * 24 * 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
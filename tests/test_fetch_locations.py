@@ -0,0 +1,170 @@
+"""
+Pruebas de fetch_locations (scripts_1_7_weather_apis/extract_openmeteo.py) contra un servidor
+local que imita la API de pronóstico de Open-Meteo (sin red): límite de peticiones
+simultáneas, timeout, reintentos con espera exponencial ante 5xx y fallos aislados por
+localización. Ejecución:
+    python -m unittest discover tests
+"""
+
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
+
+from scripts_1_7_weather_apis import extract_openmeteo, http_cache, http_client
+
+LOCATIONS = [(f"Loc{i}", f"{37 + i / 10:.4f}", "-5.9823") for i in range(8)]
+HOURS = 24
+
+
+def forecast(lat, lon):
+    """Respuesta de la API de pronóstico para unas coordenadas."""
+    return {
+        "latitude": float(lat),
+        "longitude": float(lon),
+        "current": {
+            "temperature_2m": 16.1,
+            "weather_code": 3,
+            "wind_speed_10m": 8.2,
+            "wind_direction_10m": 151,
+            "precipitation": 0.0,
+            "cloud_cover": 100,
+        },
+        "hourly": {
+            "time": [f"2026-03-16T{h:02d}:00" for h in range(HOURS)],
+            "temperature_2m": [15.0 + h % 10 for h in range(HOURS)],
+            "relative_humidity_2m": [50 + h for h in range(HOURS)],
+            "apparent_temperature": [14.0 + h % 10 for h in range(HOURS)],
+            "precipitation": [0.5 if h % 4 == 0 else 0.0 for h in range(HOURS)],
+            "precipitation_probability": [h * 4 for h in range(HOURS)],
+            "weather_code": [61 if h % 4 == 0 else 1 for h in range(HOURS)],
+        },
+    }
+
+
+class ForecastStub(BaseHTTPRequestHandler):
+    """Servidor de pruebas: cada latitud puede responder con retraso o con errores."""
+
+    delay = 0.0  # segundos que tarda cada respuesta
+    slow = {}  # latitud -> segundos que tarda (para provocar timeouts)
+    errors = {}  # latitud -> lista de códigos de error de las siguientes respuestas
+    requests = []  # latitud de cada petición recibida
+    in_flight = 0
+    max_in_flight = 0
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        query = {name: values[0] for name, values in parse_qs(urlsplit(self.path).query).items()}
+        lat = query["latitude"]
+        cls = ForecastStub
+        with cls.lock:
+            cls.requests.append(lat)
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+            status = cls.errors[lat].pop(0) if cls.errors.get(lat) else 200
+        try:
+            # Event().wait en lugar de time.sleep: las pruebas sustituyen time.sleep
+            threading.Event().wait(cls.slow.get(lat, cls.delay))
+            if status != 200:
+                self.send_response(status)
+                self.end_headers()
+                return
+            body = json.dumps(forecast(lat, query["longitude"])).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # El cliente ya se ha ido (timeout)
+        finally:
+            with cls.lock:
+                cls.in_flight -= 1
+
+
+class FetchLocationsTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), ForecastStub)
+        cls.server.daemon_threads = True
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = f"http://127.0.0.1:{cls.server.server_address[1]}/v1/forecast"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        ForecastStub.delay = 0.0
+        ForecastStub.slow = {}
+        ForecastStub.errors = {}
+        ForecastStub.requests = []
+        ForecastStub.max_in_flight = 0
+        # Sin la caché HTTP en disco: cada prueba va al servidor
+        patcher = mock.patch.object(http_cache, "CACHE_ENABLED", False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Las esperas entre reintentos se registran en lugar de dormir
+        patcher = mock.patch.object(http_client.time, "sleep")
+        self.sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fetch(self, locations=LOCATIONS, **kwargs):
+        session = http_client.create_session()
+        self.addCleanup(session.close)
+        return extract_openmeteo.fetch_locations(locations, url=self.url, session=session, **kwargs)
+
+    def test_returns_every_location_in_order(self):
+        documents = self.fetch(max_workers=4)
+        self.assertEqual(list(documents), [name for name, _, _ in LOCATIONS])
+        for name, lat, lon in LOCATIONS:
+            self.assertEqual((documents[name]["lat"], documents[name]["lon"]), (lat, lon))
+            self.assertEqual(len(documents[name]["hourly"]["data"]), HOURS)
+
+    def test_limits_requests_in_flight(self):
+        ForecastStub.delay = 0.2
+        self.fetch(max_workers=3)
+        self.assertEqual(len(ForecastStub.requests), len(LOCATIONS))
+        self.assertEqual(ForecastStub.max_in_flight, 3)
+
+    def test_retries_5xx_with_backoff(self):
+        lat = LOCATIONS[0][1]
+        ForecastStub.errors = {lat: [503, 502]}
+        documents = self.fetch(max_workers=2)
+        self.assertEqual(len(documents), len(LOCATIONS))
+        self.assertEqual(ForecastStub.requests.count(lat), 3)
+        waits = [call.args[0] for call in self.sleep.call_args_list]
+        self.assertEqual(waits, [http_client.BACKOFF_FACTOR, http_client.BACKOFF_FACTOR * 2])
+
+    def test_timeout_only_drops_that_location(self):
+        lat = LOCATIONS[1][1]
+        ForecastStub.slow = {lat: 1.0}
+        documents = self.fetch(max_workers=4, timeout=0.2)
+        self.assertNotIn(LOCATIONS[1][0], documents)
+        self.assertEqual(len(documents), len(LOCATIONS) - 1)
+        # La petición que no responde se reintenta MAX_RETRIES veces antes de darla por perdida
+        self.assertEqual(ForecastStub.requests.count(lat), http_client.MAX_RETRIES + 1)
+
+    def test_failed_location_does_not_affect_the_rest(self):
+        failing = {LOCATIONS[2][1]: [404], LOCATIONS[5][1]: [500] * 10}
+        ForecastStub.errors = failing
+        documents = self.fetch(max_workers=4)
+        self.assertEqual(
+            list(documents),
+            [name for name, lat, _ in LOCATIONS if lat not in failing],
+        )
+        # El 404 no se reintenta; el 500 sí, hasta agotar los reintentos
+        self.assertEqual(ForecastStub.requests.count(LOCATIONS[2][1]), 1)
+        self.assertEqual(
+            ForecastStub.requests.count(LOCATIONS[5][1]), http_client.MAX_RETRIES + 1
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+"""
+Pruebas de scripts_3_3/inference.py: el clasificador predice filas horarias sin la etiqueta
+('weather'), con o sin fecha y localización. Ejecución:
+    python -m unittest discover tests
+"""
+
+import random
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+import polars as pl
+
+from scripts_3_3.feature_store import compute_features
+from scripts_3_3.inference import WeatherClassifier
+from scripts_3_3.training import ModelRegistry, train_classifier
+
+WEATHERS = ["sunny", "overcast", "rain", "rain_shower"]
+
+
+def hourly_rows(hours=24 * 14, seed=42):
+    """Filas de Tiempo_por_horas sintéticas de dos localizaciones."""
+    rng = random.Random(seed)
+    start = datetime(2026, 3, 16)
+    return pl.DataFrame(
+        [
+            {
+                "lat": lat,
+                "lon": lon,
+                "date": start + timedelta(hours=h),
+                "weather": rng.choice(WEATHERS),
+                "temperature": round(rng.uniform(0, 35), 1),
+                "humidity": rng.randint(10, 100),
+                "precip_prob": rng.randint(0, 100),
+            }
+            for lat, lon in (("37.3886", "-5.9823"), ("36.7213", "-4.4214"))
+            for h in range(hours)
+        ]
+    )
+
+
+class UnlabelledInferenceTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.root = tempfile.TemporaryDirectory()
+        cls.rows = hourly_rows()
+        train_classifier(compute_features(cls.rows), ModelRegistry(cls.root.name))
+        cls.classifier = WeatherClassifier.from_registry(ModelRegistry(cls.root.name))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.root.cleanup()
+
+    def assert_all_labelled(self, result, height):
+        self.assertEqual(result.height, height)
+        self.assertEqual(result["weather_pred"].null_count(), 0)
+        self.assertTrue(set(result["weather_pred"]) <= {"sunny", "overcast", "rain"})
+
+    def test_predicts_hourly_features_only(self):
+        df = self.rows.select(
+            "temperature", "humidity", "precip_prob", pl.col("date").dt.hour().alias("hour")
+        )
+        self.assert_all_labelled(self.classifier.predict(df), df.height)
+
+    def test_predicts_rows_without_label(self):
+        df = self.rows.drop("weather")
+        result = self.classifier.predict(df)
+        self.assert_all_labelled(result, df.height)
+        self.assertNotIn("weather_clean", result.columns)
+        # Con fecha y localización se calculan las variables de ventana
+        self.assertEqual(result["temperature_mean_24h"].null_count(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()